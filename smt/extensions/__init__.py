@@ -2,4 +2,5 @@ from .vfm import VFM
 from .moe import MOE
 from .mfk import MFK 
 from .mfkpls import MFKPLS
-from .mfkplsk import MFKPLSK
\ No newline at end of file
+from .mfkplsk import MFKPLSK
+from .ego import EGO
@@ -0,0 +1,268 @@
+"""
+This package is distributed under New BSD license.
+
+Efficient global optimization (EGO): the minimum of an expensive function is
+searched by the sequential enrichment of a kriging model, q points being
+proposed per iteration with the kriging believer or constant liar strategies
+and evaluated concurrently.
+"""
+
+from __future__ import division
+import sys
+import multiprocessing
+import numpy as np
+from scipy import linalg
+from scipy.optimize import minimize
+from scipy.stats import norm
+
+from smt.extensions.extensions import Extensions
+from smt.sampling_methods import LHS
+from smt.utils.checks import check_2d_array
+
+# Function read by the forked processes evaluating the points of an iteration
+_pool_fun = None
+
+def _evaluate_point(x, fun=None):
+    """
+    Evaluates the function at one point [nx] and returns its outputs [ny].
+    """
+    if fun is None:
+        fun = _pool_fun
+    return np.asarray(fun(x[np.newaxis, :])).reshape(-1)
+
+
+class EGO(Extensions):
+
+    def _initialize(self):
+        super(EGO, self)._initialize()
+        declare = self.options.declare
+
+        declare('fun', None, desc='Function to minimize, e.g. a Problem, returning the '
+                'outputs [n, 1] at the inputs [n, nx]')
+        declare('xlimits', None, types=np.ndarray, desc='Bounds of the inputs [nx, 2]; the '
+                'xlimits of fun if None')
+        declare('xdoe', None, types=np.ndarray, desc='Inputs of the initial design')
+        declare('ydoe', None, types=np.ndarray, desc='Outputs of the initial design; fun is '
+                'evaluated at xdoe if None')
+        declare('n_doe', None, types=int, desc='Number of points of the initial LHS design '
+                'when xdoe is not given; nx + 1 if None')
+        declare('n_iter', 10, types=int, desc='Number of iterations')
+        declare('n_parallel', 1, types=int, desc='Number of points proposed and evaluated '
+                'per iteration')
+        declare('qEI', 'KB', types=str, values=('KB', 'CLmin', 'CLmean', 'CLmax'),
+                desc='Virtual outputs of the points already proposed in an iteration: kriging '
+                'believer, or constant liar with the minimum, mean or maximum output')
+        declare('criterion', 'EI', types=str, values=('EI', 'LCB'), desc='Infill criterion: '
+                'expected improvement or lower confidence bound')
+        declare('surrogate', 'KRG', types=str, values=('KRG', 'KPLS', 'KPLSK'),
+                desc='Name of the kriging model')
+        declare('surrogate_options', {}, types=dict, desc='Options of the kriging model')
+        declare('n_start', 20, types=int, desc='Number of starting points of the maximization '
+                'of the infill criterion')
+        declare('n_jobs', 1, types=int, desc='Number of processes evaluating the points of an '
+                'iteration; -1 means all the processors')
+        declare('seed', None, types=int, desc='Seed of the initial design and of the '
+                'starting points of the infill search; the global numpy random state is '
+                'used if None')
+
+    def _apply(self):
+        """
+        Algorithm of the EGO method
+        """
+        fun = self.options['fun']
+        if fun is None:
+            raise ValueError('fun must be given')
+        xlimits = self.options['xlimits']
+        if xlimits is None:
+            xlimits = fun.xlimits
+        xlimits = np.atleast_2d(np.asarray(xlimits, dtype=float))
+        self._check_param()
+        seed = self.options['seed']
+        self._seeds = None if seed is None else np.random.RandomState(seed)
+
+        # Initial design
+        x_data = self.options['xdoe']
+        if x_data is None:
+            n_doe = self.options['n_doe']
+            if n_doe is None:
+                n_doe = xlimits.shape[0] + 1
+            x_data = LHS(xlimits=xlimits, criterion='m',
+                             random_state=self._next_seed())(n_doe)
+        x_data = check_2d_array(x_data, 'xdoe')
+        y_data = self.options['ydoe']
+        if y_data is None:
+            y_data = self._evaluate(x_data)
+        y_data = check_2d_array(y_data, 'ydoe')
+
+        q = self.options['n_parallel']
+        hyperparameters = None
+        for k in range(self.options['n_iter']):
+            # Refit on the evaluated points, starting from the last hyperparameters
+            sm = self._train(x_data, y_data, hyperparameters)
+            hyperparameters = sm.get_hyperparameters()
+
+            # Propose q points, adding each one to the model with a virtual output
+            # while the hyperparameters are kept fixed
+            y_min = np.min(y_data)
+            x_new = np.zeros((q, x_data.shape[1]))
+            y_virtual = np.zeros((q - 1, 1))
+            for i in range(q):
+                x_new[i] = self._find_point(sm, y_min, xlimits)
+                if np.any(np.all(np.vstack((x_data, x_new[:i])) == x_new[i], axis=1)):
+                    # A point of the model, whose output is known or believed:
+                    # the next points would be the same
+                    x_new = x_new[:i]
+                    break
+                if i < q - 1:
+                    y_virtual[i] = self._virtual_output(sm, x_new[[i]], y_data)
+                    try:
+                        sm.add_training_points(x_new[[i]], y_virtual[[i]])
+                    except linalg.LinAlgError:
+                        # Too close to a point of the model for the update of the
+                        # factorizations: retrain with the same hyperparameters
+                        sm = self._train(np.vstack((x_data, x_new[:i + 1])),
+                                         np.vstack((y_data, y_virtual[:i + 1])),
+                                         hyperparameters, optimize=False)
+                    y_min = min(y_min, y_virtual[i, 0])
+            if x_new.shape[0] == 0:
+                # The search has converged to an evaluated point
+                break
+
+            y_new = self._evaluate(x_new)
+            x_data = np.vstack((x_data, x_new))
+            y_data = np.vstack((y_data, y_new))
+
+        self.x_data = x_data
+        self.y_data = y_data
+        self.ind_best = np.argmin(y_data[:, 0])
+        self.x_opt = x_data[self.ind_best]
+        self.y_opt = y_data[self.ind_best]
+
+    def _analyse_results(self):
+        """
+        Returns the best point found, its output, its index and all the evaluated points.
+        """
+        return self.x_opt, self.y_opt, self.ind_best, self.x_data, self.y_data
+
+    def _check_param(self):
+        """
+        This function checks some parameters of the method.
+        """
+        if self.options['n_parallel'] < 1:
+            raise ValueError('n_parallel must be a positive integer')
+        if self.options['n_parallel'] > 1 and \
+                self.options['surrogate_options'].get('shared_theta', True) is False:
+            raise ValueError('n_parallel > 1 requires shared hyperparameters')
+
+    def _next_seed(self):
+        """
+        Seed of the next LHS design, drawn from the seed option, or None.
+        """
+        if self._seeds is None:
+            return None
+        return int(self._seeds.randint(2**31 - 1))
+
+    def _train(self, x_data, y_data, hyperparameters, optimize=True):
+        """
+        Trains the kriging model on the evaluated points, only evaluating the
+        given hyperparameters if optimize is False.
+        """
+        name = self.options['surrogate']
+        options = dict(self.options['surrogate_options'])
+        options['print_global'] = False
+        if hyperparameters is not None:
+            options['hyperparameters'] = hyperparameters
+        if not optimize:
+            options['optimize_theta'] = False
+        sm = self._surrogate_type[name](**options)
+        if options.get('theta0') is None:
+            # One hyperparameter per input, or per principal component for KPLS
+            # and KPLSK
+            if sm.options.is_declared('n_comp'):
+                sm.options['theta0'] = [1e-2] * sm.options['n_comp']
+            else:
+                sm.options['theta0'] = [1e-2] * x_data.shape[1]
+        sm.set_training_values(x_data, y_data)
+        sm.train()
+        return sm
+
+    def _virtual_output(self, sm, x, y_data):
+        """
+        Output given to a proposed point before its evaluation.
+        """
+        qEI = self.options['qEI']
+        if qEI == 'KB':
+            return sm.predict_values(x)
+        elif qEI == 'CLmin':
+            return np.array([[np.min(y_data)]])
+        elif qEI == 'CLmean':
+            return np.array([[np.mean(y_data)]])
+        return np.array([[np.max(y_data)]])
+
+    def _criterion(self, x, sm, y_min, gradient):
+        """
+        Infill criterion to minimize at a point x [nx]: minus the expected
+        improvement or the lower confidence bound, with its gradient.
+        """
+        x = x[np.newaxis, :]
+        if gradient:
+            y, s2, dy_dx = sm.predict_all(x)
+            ds2_dx = sm.predict_variance_derivatives(x)[:, :, 0]
+        else:
+            y, s2 = sm.predict_all(x, gradients=False)
+        y, s2 = y[0, 0], s2[0, 0]
+        s = np.sqrt(max(s2, 0.))
+
+        if self.options['criterion'] == 'LCB':
+            value, dvalue_dy, dvalue_ds = y - 3. * s, 1., -3.
+        elif s < 1e-12:
+            value, dvalue_dy, dvalue_ds = min(y - y_min, 0.), float(y < y_min), 0.
+        else:
+            z = (y_min - y) / s
+            value = - (y_min - y) * norm.cdf(z) - s * norm.pdf(z)
+            dvalue_dy, dvalue_ds = norm.cdf(z), - norm.pdf(z)
+        if not gradient:
+            return value
+
+        ds_dx = ds2_dx[0] / (2. * s) if s > 1e-12 else np.zeros(x.shape[1])
+        return value, dvalue_dy * dy_dx[0, :, 0] + dvalue_ds * ds_dx
+
+    def _find_point(self, sm, y_min, xlimits):
+        """
+        Maximizes the infill criterion from several starting points.
+        """
+        # The analytic gradients need the square exponential correlation function
+        gradient = sm.options['corr'].__name__ == 'squar_exp' and \
+            sm.options['poly'].__name__ in ['constant', 'linear']
+
+        x_start = LHS(xlimits=xlimits, random_state=self._next_seed())(self.options['n_start'])
+        x_best, f_best = None, np.inf
+        for x0 in x_start:
+            res = minimize(self._criterion, x0, args=(sm, y_min, gradient), jac=gradient,
+                           method='L-BFGS-B', bounds=xlimits)
+            if x_best is None or res.fun < f_best:
+                x_best, f_best = res.x, res.fun
+        return x_best
+
+    def _evaluate(self, x):
+        """
+        Evaluates the function at the points x [n, nx], in parallel if n_jobs > 1.
+        """
+        fun = self.options['fun']
+        n_jobs = self.options['n_jobs']
+        if n_jobs < 0:
+            n_jobs = multiprocessing.cpu_count()
+        n = x.shape[0]
+        if n_jobs == 1 or n == 1 or sys.platform.startswith('win'):
+            return np.asarray(fun(x)).reshape((n, -1))
+
+        global _pool_fun
+        _pool_fun = fun
+        pool = multiprocessing.Pool(min(n_jobs, n))
+        try:
+            y = pool.map(_evaluate_point, list(x))
+        finally:
+            pool.close()
+            pool.join()
+            _pool_fun = None
+        return np.array(y)
@@ -10,9 +10,10 @@ order 1 (AR1)
 from __future__ import division
 import numpy as np
 from smt.surrogate_models.krg_based import KrgBased
+from smt.utils.checks import check_2d_array, check_nx
 from types import FunctionType
 from smt.utils.kriging_utils import l1_cross_distances, componentwise_distance,\
-    standardization
+    standardization, row_index
 from scipy.linalg import solve_triangular
 from scipy import linalg
 from sklearn.metrics.pairwise import manhattan_distances
@@ -92,15 +93,26 @@ class MFK(KrgBased):
         self.y = y[:]
         
     
-    def _new_train(self):
+    def _new_train(self, refit=False):
         """
         Overrides KrgBased implementation
         Trains the Multi-Fidelity model
+
+        Arguments
+        ---------
+        refit : bool
+            Whether the model is retrained on new output values at the same inputs,
+            the distances between the training points being kept and the optimization
+            of each level starting from its current hyperparameters.
         """
         
         xt =[]
         yt = []
         i=0
+        # PLS coefficients of the highest fidelity level (MFKPLS and MFKPLSK)
+        self._compute_pls(self.training_points[None][0][0].copy(),
+                          self.training_points[None][0][1].copy())
+
         while(self.training_points.get(i, None) is not None):
             xt.append(self.training_points[i][0][0])
             yt.append(self.training_points[i][0][1])
@@ -114,17 +126,16 @@ class MFK(KrgBased):
         X = self.X
         y = self.y
         
-        _, _, self.X_mean, self.y_mean, self.X_std, \
-            self.y_std = standardization(np.concatenate(xt,axis=0), np.concatenate(yt,axis=0))
-        
-#         self.X_mean, self.y_mean, self.X_std, \
-#             self.y_std = 0.,0.,1.,1.
+        self._compute_standardization(np.concatenate(xt,axis=0), np.concatenate(yt,axis=0))
         nlevel = self.nlvl
-        n_samples = self.nt_all
 
         # initialize lists
+        if refit:
+            theta_start = self.optimal_theta
+        else:
+            # The distances between the training points are computed by _train_level
+            self.D_all = nlevel*[None]
         self.noise = nlevel*[0]
-        self.D_all = nlevel*[0]
         self.F_all = nlevel*[0]
         self.p_all = nlevel*[0]
         self.q_all = nlevel*[0]
@@ -133,68 +144,255 @@ class MFK(KrgBased):
         self.optimal_theta = nlevel*[0]
         self.X_norma_all = [(x-self.X_mean)/self.X_std for x in X] 
         self.y_norma_all = [(f-self.y_mean)/self.y_std for f in y] 
+        self.X_index_all = [row_index(x) for x in self.X_norma_all]
 
         for lvl in range(nlevel):
-            self.X_norma = self.X_norma_all[lvl]
-            self.y_norma = self.y_norma_all[lvl]
-            # Calculate matrix of distances D between samples
-            self.D_all[lvl] = l1_cross_distances(self.X_norma)
+            # Warm start from the hyperparameters of the previous training
+            self._train_level(lvl, theta_start[lvl] if refit else None, refit=refit)
+
+        self._compute_prediction_terms()
+
+        if self.options['eval_noise'] and self.options['optim_var']:
+            # Predictors of the levels at their own training points
+            y_pred = [self.y_mean + self.y_std * self._lower_level_values(x, lvl+1)
+                      for lvl, x in enumerate(self.X_norma_all)]
+            for lvl in range(self.nlvl-1):
+                self.set_training_values(X[lvl], y_pred[lvl], name = lvl)
+            self.set_training_values(X[-1], y_pred[-1])
+            self.options['eval_noise'] = False
+            self._new_train(refit=True)
             
+    def _componentwise_distance(self,dx,opt=0):
+        d = componentwise_distance(dx,self.options['corr'].__name__,
+                                   self.nx)
+        return d
 
-            # Regression matrix and parameters
-            self.F_all[lvl] = self.options['poly'](self.X_norma)
-            self.p_all[lvl] = self.F_all[lvl].shape[1]
+    def _compute_pls(self,X,y):
+        return X,y
 
-            # Concatenate the autoregressive part for levels > 0
-            if lvl > 0:
-                F_rho = self.options['rho_regr'](self.X_norma)
-                self.q_all[lvl] = F_rho.shape[1]
-                self.F_all[lvl] = np.hstack((F_rho*np.dot(self._predict_intermediate_values(self.X_norma, lvl, descale=False),
-                                              np.ones((1,self.q_all[lvl]))), self.F_all[lvl]))
-            else:
-                self.q_all[lvl] = 0
+    def _compute_standardization(self, X, y):
+        """
+        Sets the means and the standard deviations centering and scaling the
+        inputs and the outputs of all the levels.
 
-            n_samples_F_i = self.F_all[lvl].shape[0]
+        Arguments
+        ---------
+        X : np.ndarray [n_samples, dim]
+            Inputs of all the levels
+        y : np.ndarray [n_samples, 1]
+            Outputs of all the levels
+        """
+        _, _, self.X_mean, self.y_mean, self.X_std, \
+            self.y_std = standardization(X, y)
 
-            if n_samples_F_i != n_samples[lvl]:
-                raise Exception("Number of rows in F and X do not match. Most "
-                                "likely something is going wrong with the "
-                                "regression model.")
+    def _train_level(self, lvl, theta=None, optimize=True, refit=False):
+        """
+        Trains the level lvl of the model, the lower levels being trained.
 
-            if int(self.p_all[lvl] + self.q_all[lvl]) >= n_samples_F_i:
-                raise Exception(("Ordinary least squares problem is undetermined "
-                                 "n_samples=%d must be greater than the regression"
-                                 " model size p+q=%d.")
-                                 % (n_samples[i], self.p_all[lvl]+self.q_all[lvl]))
+        Arguments
+        ---------
+        lvl : int
+            The level of fidelity.
+        theta : np.ndarray or None
+            The hyperparameters the optimization starts from instead of theta0, the
+            noise of the level being kept if eval_noise is used.
+        optimize : bool
+            Whether the hyperparameters theta are optimized or only evaluated.
+        refit : bool
+            Whether the level is fitted again without the noise term, from the
+            hyperparameters theta found with it.
+        """
+        self.X_norma = self.X_norma_all[lvl]
+        self.y_norma = self.y_norma_all[lvl]
+        n_samples = self.nt_all
 
-       
-            # Determine Gaussian Process model parameters
-            self.F = self.F_all[lvl]
-            D, self.ij = self.D_all[lvl]
+        # Regression matrix and parameters
+        self.F_all[lvl] = self.options['poly'](self.X_norma)
+        self.p_all[lvl] = self.F_all[lvl].shape[1]
+
+        # Concatenate the autoregressive part for levels > 0
+        if lvl > 0:
+            F_rho = self.options['rho_regr'](self.X_norma)
+            self.q_all[lvl] = F_rho.shape[1]
+            self.F_all[lvl] = np.hstack((F_rho*np.dot(self._lower_level_values(self.X_norma, lvl),
+                                          np.ones((1,self.q_all[lvl]))), self.F_all[lvl]))
+        else:
+            self.q_all[lvl] = 0
+
+        n_samples_F_i = self.F_all[lvl].shape[0]
+
+        if n_samples_F_i != n_samples[lvl]:
+            raise Exception("Number of rows in F and X do not match. Most "
+                            "likely something is going wrong with the "
+                            "regression model.")
+
+        if int(self.p_all[lvl] + self.q_all[lvl]) >= n_samples_F_i:
+            raise Exception(("Ordinary least squares problem is undetermined "
+                             "n_samples=%d must be greater than the regression"
+                             " model size p+q=%d.")
+                             % (n_samples[lvl], self.p_all[lvl]+self.q_all[lvl]))
+
+        # Determine Gaussian Process model parameters
+        self.F = self.F_all[lvl]
+        if self.D_all[lvl] is None:
+            # Calculate matrix of distances D between samples
+            if self.options['low_memory']:
+                self.D_all[lvl] = (None, None)
+            else:
+                self.D_all[lvl] = l1_cross_distances(self.X_norma)
+        D, self.ij = self.D_all[lvl]
+        self._lvl = lvl
+        self.nt = self.nt_all[lvl]
+        self.q = self.q_all[lvl]
+        self.p = self.p_all[lvl]
+        hyperparameters = self.options['hyperparameters']
+        optimize_theta = self.options['optimize_theta']
+        if theta is not None:
+            noise = self.noise[lvl] if self.options['eval_noise'] else None
+            self.options['hyperparameters'] = {'name': self.name,
+                'corr': self.options['corr'].__name__, 'theta': theta, 'noise': noise}
+            self.options['optimize_theta'] = optimize
+        try:
+            self.optimal_rlf_value[lvl], self.optimal_par[lvl], self.optimal_theta[lvl] = \
+                self._optimize_hyperparam(D, refit=refit)
+        finally:
+            self.options['hyperparameters'] = hyperparameters
+            self.options['optimize_theta'] = optimize_theta
+        if self.options['eval_noise']:
+            tmp_list = self.optimal_theta[lvl]
+            self.optimal_theta[lvl] = tmp_list[:-1]
+            self.noise[lvl] = tmp_list[-1]
+        del self.y_norma, self.D
+        self._r_pairs = None
+
+    def add_training_points(self, x_new, y_new, reoptimize=False, name=None):
+        """
+        Add training points to a level of fidelity of a trained model.
+
+        The lower levels are kept. With the hyperparameters kept fixed, the
+        decompositions of the level of the new points are extended by blocks as in
+        KrgBased, and the higher levels, whose regression matrices contain the
+        predictor of this level, are factorized again. The normalization of the
+        inputs and outputs is kept, so that the points of the lower levels only
+        enter the evaluation of their predictors at the new points, which is not
+        needed for the points of the level below (nested designs).
+
+        Parameters
+        ----------
+        x_new : np.ndarray[k, nx] or np.ndarray[k]
+            The input values of the new training points.
+        y_new : np.ndarray[k, 1] or np.ndarray[k]
+            The output values of the new training points.
+        reoptimize : bool
+            If True, the hyperparameters of the level of the new points and of the
+            higher levels are optimized again, starting from their current values.
+        name : int or None
+            The level of fidelity of the new points, None for the highest one.
+        """
+        if name is None:
+            lvl = self.nlvl - 1
+        elif name in range(self.nlvl - 1):
+            lvl = name
+        else:
+            raise ValueError('name must be None or the index of a lower fidelity level')
+
+        x_new = check_2d_array(x_new, 'x_new')
+        y_new = check_2d_array(y_new, 'y_new')
+        check_nx(self.nx, x_new)
+        if x_new.shape[0] != y_new.shape[0]:
+            raise ValueError('the first dimension of x_new and y_new must have the same length')
+
+        xt, yt = self.training_points[name][0]
+        self.X[lvl] = np.vstack((xt, x_new))
+        self.y[lvl] = np.vstack((yt, y_new))
+        self.training_points[name][0] = [self.X[lvl], self.y[lvl]]
+
+        X_new = (x_new - self.X_mean) / self.X_std
+        y_new = (y_new - self.y_mean) / self.y_std
+        X_norma = self.X_norma_all[lvl]
+        self.X_norma_all[lvl] = np.vstack((X_norma, X_new))
+        self.X_index_all[lvl].update(row_index(X_new, X_norma.shape[0]))
+        self.y_norma_all[lvl] = np.vstack((self.y_norma_all[lvl], y_new))
+        self.nt_all[lvl] += x_new.shape[0]
+
+        # The distances between the training points of the level are computed
+        # again by _train_level when it is trained
+        self.D_all[lvl] = None
+        if reoptimize:
+            self._train_level(lvl, self.optimal_theta[lvl])
+        else:
+            F_new = self.options['poly'](X_new)
+            if lvl > 0:
+                F_rho = self.options['rho_regr'](X_new)
+                F_new = np.hstack((F_rho*self._lower_level_values(X_new, lvl), F_new))
             self._lvl = lvl
             self.nt = self.nt_all[lvl]
             self.q = self.q_all[lvl]
             self.p = self.p_all[lvl]
-            self.optimal_rlf_value[lvl], self.optimal_par[lvl], self.optimal_theta[lvl] = \
-                self._optimize_hyperparam(D)
-            if self.options['eval_noise']:
-                tmp_list = self.optimal_theta[lvl]
-                self.optimal_theta[lvl] = tmp_list[:-1]
-                self.noise[lvl] = tmp_list[-1]
-            del self.y_norma, self.D
-        
-        if self.options['eval_noise'] and self.options['optim_var']:
-            for lvl in range(self.nlvl-1):
-                self.set_training_values(X[lvl], self._predict_intermediate_values(X[lvl], lvl+1), name = lvl)
-            self.set_training_values(X[-1], self._predict_intermediate_values(X[-1], self.nlvl))   
-            self.options['eval_noise'] = False
-            self._new_train()
-            
-    def _componentwise_distance(self,dx,opt=0):
-        d = componentwise_distance(dx,self.options['corr'].__name__,
-                                   self.nx)
-        return d
+            self.optimal_rlf_value[lvl], self.optimal_par[lvl] = self._extend_factorization(
+                self.optimal_par[lvl], X_norma, X_new, F_new, y_new,
+                self.optimal_theta[lvl], self.noise[lvl])
+            self.F_all[lvl] = np.vstack((self.F_all[lvl], F_new))
+
+        for i in range(lvl + 1, self.nlvl):
+            self._train_level(i, self.optimal_theta[i], optimize=reoptimize)
+
+        self._compute_prediction_terms(lvl)
+
+    def _compute_prediction_terms(self, lvl=0):
+        """
+        Stores in optimal_par the terms of each level from lvl that do not depend
+        on the prediction points: Ft = C^-1 F, the variance sigma2_r of the
+        difference between the levels and the matrix of the quadratic form in the
+        rho regression terms giving the variance of rho.
+        """
+        for i in range(lvl, self.nlvl):
+            par = self.optimal_par[i]
+            C, G, beta = par['C'], par['G'], par['beta']
+            par['Ft'] = solve_triangular(C, self.F_all[i], lower=True)
+            if i > 0:
+                p, q = self.p_all[i], self.q_all[i]
+                yt = solve_triangular(C, self.y_norma_all[i], lower=True)
+                Q_ = ((yt - np.dot(par['Ft'], beta))**2).sum()
+                par['sigma2_r'] = Q_/(2*(self.nt_all[i]-p-q))
+                G_inv = solve_triangular(G, np.eye(G.shape[0]))
+                par['sigma2_rho'] = par['sigma2'] * np.dot(G_inv, G_inv.T)[:q, :q] \
+                    + np.dot(beta[:q], beta[:q].T)
     
+    def _lower_level_values(self, X, lvl):
+        """
+        Evaluates the scaled predictor of the level lvl - 1 at the normalized
+        points X. For nested designs, the points of X which are training points of
+        the level lvl - 1 are found through the hashed index of its rows, and the
+        predictor at these points is y - noise * gamma up to the nugget, since
+        R gamma = y - F beta with the noise on the diagonal of R; the other points
+        are evaluated with _predict_intermediate_values.
+
+        Arguments
+        ---------
+        X : np.ndarray [n_evals, dim]
+            Normalized evaluation point input variable values
+        lvl : int
+            The level above the evaluated one, from 1 to the number of levels.
+
+        Returns
+        -------
+        mu : np.ndarray [n_evals, 1]
+            Scaled predictor of the level lvl - 1
+        """
+        index = self.X_index_all[lvl-1]
+        rows = np.array([index.get(x.tobytes(), -1) for x in np.ascontiguousarray(X)],
+                        dtype=int)
+        nested = rows >= 0
+        mu = np.empty((X.shape[0], 1))
+        if np.any(nested):
+            gamma = self.optimal_par[lvl-1]['gamma']
+            mu[nested] = self.y_norma_all[lvl-1][rows[nested]] \
+                - self.noise[lvl-1] * gamma[rows[nested]]
+        if not np.all(nested):
+            mu[~nested] = self._predict_intermediate_values(X[~nested], lvl, descale=False)
+        return mu
+
     def _predict_intermediate_values(self, X, lvl, descale = True):
         """
         Evaluates the model at a set of points.
@@ -227,12 +425,7 @@ class MFK(KrgBased):
         dx = manhattan_distances(X, Y=self.X_norma_all[0], sum_over_features=False)
         d = self._componentwise_distance(dx)
         # Get regression function and correlation
-        F = self.F_all[0]
-        C = self.optimal_par[0]['C']
-
         beta = self.optimal_par[0]['beta']
-        Ft = solve_triangular(C, F, lower=True)
-        yt = solve_triangular(C, self.y_norma_all[0], lower=True)
         r_ = self.options['corr'](self.optimal_theta[0], d).reshape(n_eval, self.nt_all[0])
         gamma = self.optimal_par[0]['gamma']
         
@@ -242,15 +435,11 @@ class MFK(KrgBased):
 
         # Calculate recursively kriging mean and variance at level i
         for i in range(1,lvl):
-            F = self.F_all[i]
-            C = self.optimal_par[i]['C']
             g = self.options['rho_regr'](X)
             dx = manhattan_distances(X, Y=self.X_norma_all[i], sum_over_features=False)
             d = self._componentwise_distance(dx)
             r_ = self.options['corr'](self.optimal_theta[i], d).reshape(n_eval, self.nt_all[i])
             f = np.vstack((g.T*mu[:,i-1], f0.T))
-            Ft = solve_triangular(C, F, lower=True)
-            yt = solve_triangular(C, self.y_norma_all[i], lower=True)
             beta = self.optimal_par[i]['beta']
             gamma = self.optimal_par[i]['gamma']
             # scaled predictor
@@ -303,7 +492,7 @@ class MFK(KrgBased):
         
     def predict_variances_all_levels(self, X):
         """
-        Evaluates the model at a set of points.
+        Evaluates the variances of all the levels at a set of points.
 
         Arguments
         ---------
@@ -312,89 +501,229 @@ class MFK(KrgBased):
 
         Returns
         -------
-        y : np.ndarray
-            Evaluation point output variable values
+        MSE : np.ndarray [n_evals, nlevel]
+            Variances of the levels
+        sigma2_rhos : list of np.ndarray [n_evals]
+            Variances of the scaling factors rho of the levels > 0
+        """
+        _, MSE, sigma2_rhos, _ = self._predict_levels(X)
+        return MSE, sigma2_rhos
+
+    def predict_values_and_variances(self, x, all_levels=False):
+        """
+        Predict the output values and the variances at a set of points in a
+        single pass of the recursion over the fidelity levels.
+
+        Parameters
+        ----------
+        x : np.ndarray[n, nx] or np.ndarray[n]
+            Input values for the prediction points.
+        all_levels : bool
+            Whether the values and the variances of all the levels are returned
+            instead of those of the highest fidelity level.
+
+        Returns
+        -------
+        y : np.ndarray[n, 1] or np.ndarray[n, nlevel]
+            Output values at the prediction points.
+        s2 : np.ndarray[n, 1] or np.ndarray[n, nlevel]
+            Variances at the prediction points.
+        """
+        x = check_2d_array(x, 'x')
+        check_nx(self.nx, x)
+        y, s2 = self._predict_chunked(lambda x_chunk: self._predict_levels(x_chunk)[:2], x,
+                                      [(self.nlvl,), (self.nlvl,)])
+
+        if all_levels:
+            return y, s2
+        return y[:, -1:], s2[:, -1:]
+
+    def _predict_levels(self, X, variances=True, gradients=False):
+        """
+        Evaluates the predictors and, optionally, the variances of all the levels
+        and the derivatives of the highest level at a set of points, the
+        correlation with the training points of each level being evaluated once.
+
+        Arguments
+        ---------
+        x : np.ndarray [n_evals, dim]
+            Evaluation point input variable values
+        variances : bool
+            Whether the variances are computed.
+        gradients : bool
+            Whether the derivatives are computed.
+
+        Returns
+        -------
+        mu : np.ndarray [n_evals, nlevel]
+            Predictors of the levels
+        MSE : np.ndarray [n_evals, nlevel] or None
+            Variances of the levels
+        sigma2_rhos : list of np.ndarray [n_evals]
+            Variances of the scaling factors rho of the levels > 0
+        dy_dx : np.ndarray [n_evals, dim] or None
+            Derivative values of the highest level.
         """
-        # Initialization X = atleast_2d(X)
         nlevel = self.nlvl
-        sigma2_rhos =[]
         n_eval, n_features_X = X.shape
-#        if n_features_X != self.n_features:
-#            raise ValueError("Design must be an array of n_features columns.")
         X = (X - self.X_mean) / self.X_std
-        # Calculate kriging mean and variance at level 0
-        mu = np.zeros((n_eval, nlevel))
-#        if self.normalize:
-        f = self.options['poly'](X)
+        if gradients and self.options['rho_regr'].__name__ != 'constant':
+            raise ValueError(
+                'The derivative is only available for regression rho constant')
+
         f0 = self.options['poly'](X)
-        dx = manhattan_distances(X, Y=self.X_norma_all[0], sum_over_features=False)
-        d = self._componentwise_distance(dx)
-        # Get regression function and correlation
-        F = self.F_all[0]
-        C = self.optimal_par[0]['C']
+        g = self.options['rho_regr'](X)
+        mu = np.zeros((n_eval, nlevel))
+        MSE = np.zeros((n_eval, nlevel)) if variances else None
+        sigma2_rhos = []
+        dy_dx = None
 
-        beta = self.optimal_par[0]['beta']
-        Ft = solve_triangular(C, F, lower=True)
-        yt = solve_triangular(C, self.y_norma_all[0], lower=True)
-        r_ = self.options['corr'](self.optimal_theta[0], d).reshape(n_eval, self.nt_all[0])
-        gamma = self.optimal_par[0]['gamma']
+        for i in range(nlevel):
+            par = self.optimal_par[i]
+            r_ = self._correlation_vector(X, self.X_norma_all[i], self.optimal_theta[i])
+            if i == 0:
+                f = f0
+            else:
+                f = np.hstack((g * mu[:, i-1:i], f0))
 
-        # Scaled predictor
-        mu[:,0]= (np.dot(f, beta) + np.dot(r_,gamma)).ravel()
+            # scaled predictor
+            mu[:, i] = (np.dot(f, par['beta']) + np.dot(r_, par['gamma'])).ravel()
+
+            if variances:
+                r_t = solve_triangular(par['C'], r_.T, lower=True)
+                u_ = solve_triangular(par['G'].T, f.T - np.dot(par['Ft'].T, r_t), lower=True)
+                if i == 0:
+                    MSE[:, 0] = par['sigma2'] * (1 + self.noise[0]
+                                                 - (r_t**2).sum(axis=0) + (u_**2).sum(axis=0))
+                else:
+                    sigma2_rho = (np.dot(g, par['sigma2_rho']) * g).sum(axis=1)
+                    sigma2_rhos.append(sigma2_rho)
+                    MSE[:, i] = sigma2_rho * MSE[:, i-1] \
+                        + par['sigma2_r'] * (1 + self.noise[i] - (r_t**2).sum(axis=0)) \
+                        + par['sigma2'] * (u_**2).sum(axis=0)
+
+            if gradients:
+                dr_dx = self._correlation_derivatives(X, r_, par['gamma'], self.X_norma_all[i],
+                                                      self.optimal_theta[i])[:, :, 0]
+                df_dx = self._trend_derivatives(par['beta'])[:, 0]
+                if i == 0:
+                    dy_dx = df_dx + dr_dx
+                else:
+                    dy_dx = par['beta'][0] * dy_dx + df_dx + dr_dx
+
+        mu = self.y_mean + self.y_std * mu
+        if variances:
+            MSE = self.y_std**2 * MSE
+        if gradients:
+            dy_dx = dy_dx * self.y_std / self.X_std
+        return mu, MSE, sigma2_rhos, dy_dx
+
+    def _predict_all(self, X, variances, gradients):
+        """
+        Evaluates the model, and optionally its variances and derivatives, at a set of points,
+        from the highest level of the recursion of _predict_levels.
 
-    
-        self.sigma2_rho = nlevel*[None]
-        MSE = np.zeros((n_eval,nlevel))
-        r_t = solve_triangular(C, r_.T, lower=True)
-        G = self.optimal_par[0]['G']
-
-        u_ = solve_triangular(G.T, f.T - np.dot(Ft.T, r_t), lower=True)
-        MSE[:,0] = self.optimal_par[0]['sigma2'] * (1 + self.noise[0]\
-                            - (r_t**2).sum(axis=0) + (u_**2).sum(axis=0))
-        
+        Arguments
+        ---------
+        x : np.ndarray [n_evals, dim]
+            Evaluation point input variable values
+        variances : bool
+            Whether the variances are computed.
+        gradients : bool
+            Whether the derivatives are computed.
 
-        # Calculate recursively kriging variance at level i
-        for i in range(1,nlevel):
-            F = self.F_all[i]
-            C = self.optimal_par[i]['C']
-            g = self.options['rho_regr'](X)
-            dx = manhattan_distances(X, Y=self.X_norma_all[i], sum_over_features=False)
-            d = self._componentwise_distance(dx)
-            r_ = self.options['corr'](self.optimal_theta[i], d).reshape(n_eval, self.nt_all[i])
-            f = np.vstack((g.T*mu[:,i-1], f0.T))
+        Returns
+        -------
+        y : np.ndarray
+            Evaluation point output variable values
+        s2 : np.ndarray or None
+            Variances
+        dy_dx : np.ndarray [n_evals, dim] or None
+            Derivative values.
+        """
+        mu, MSE, _, dy_dx = self._predict_levels(X, variances, gradients)
+        s2 = MSE[:, -1] if variances else None
+        return mu[:, -1], s2, dy_dx
 
-            Ft = solve_triangular(C, F, lower=True)
-            yt = solve_triangular(C, self.y_norma_all[i], lower=True)
-            r_t = solve_triangular(C,r_.T, lower=True)
+    def _predict_variance_derivatives(self, X):
+        """
+        Evaluates the derivatives of the variances at a set of points, the
+        variances and the predictor of the levels being differentiated along
+        the recursion of _predict_all.
+
+        Arguments
+        ---------
+        x : np.ndarray [n_evals, dim]
+            Evaluation point input variable values
+
+        Returns
+        -------
+        ds2_dx : np.ndarray [n_evals, dim]
+            Derivative values.
+        """
+        nlevel = self.nlvl
+        n_eval, n_features_X = X.shape
+        X = (X - self.X_mean) / self.X_std
+        if self.options['rho_regr'].__name__ != 'constant':
+            raise ValueError(
+                'The derivative is only available for regression rho constant')
+
+        f0 = self.options['poly'](X)
+        g = self.options['rho_regr'](X)
+        q = g.shape[1]
+        mu = np.zeros(n_eval)
+        dy_dx = np.zeros((n_eval, self.nx))
+        dMSE = np.zeros((n_eval, self.nx))
+
+        for i in range(nlevel):
+            C = self.optimal_par[i]['C']
             G = self.optimal_par[i]['G']
             beta = self.optimal_par[i]['beta']
+            gamma = self.optimal_par[i]['gamma']
+            sigma2 = self.optimal_par[i]['sigma2']
+            r_ = self._correlation_vector(X, self.X_norma_all[i], self.optimal_theta[i])
+            Ft = self.optimal_par[i]['Ft']
+            r_t = solve_triangular(C, r_.T, lower=True)
+            if i == 0:
+                f = f0
+                sigma2_r = sigma2
+            else:
+                f = np.hstack((g * mu[:, np.newaxis], f0))
+                sigma2_r = self.optimal_par[i]['sigma2_r']
+                sigma2_rho = np.dot(g, self.optimal_par[i]['sigma2_rho'])
+                sigma2_rho = (sigma2_rho * g).sum(axis=1)
+            u_ = solve_triangular(G.T, f.T - np.dot(Ft.T, r_t), lower=True)
+
+            # With v = G^-1 u, the derivatives of sigma2_r (1 - r R^-1 r^T) and
+            # sigma2 u^T u are those of the correlation vector weighted by
+            # R^-1 (sigma2_r r^T + sigma2 F v), plus those of the regression terms
+            v = solve_triangular(G, u_)
+            c = solve_triangular(C.T, sigma2_r * r_t + sigma2 * np.dot(Ft, v))
+            dr_dx = self._correlation_derivatives(X, r_ * c.T, np.ones((r_.shape[1], 1)),
+                                                  self.X_norma_all[i],
+                                                  self.optimal_theta[i])[:, :, 0]
+            df_dx = self._trend_derivatives(v).T
+            if i == 0:
+                dMSE = -2. * dr_dx + 2. * sigma2 * df_dx
+            else:
+                # The first regression term is rho times the lower level predictor
+                df_dx += (v[:q].T * g).sum(axis=1)[:, np.newaxis] * dy_dx
+                dMSE = sigma2_rho[:, np.newaxis] * dMSE - 2. * dr_dx + 2. * sigma2 * df_dx
+
+            # Derivatives of the predictor of the level
+            dr_dx = self._correlation_derivatives(X, r_, gamma, self.X_norma_all[i],
+                                                  self.optimal_theta[i])[:, :, 0]
+            df_dx = self._trend_derivatives(beta)[:, 0]
+            if i == 0:
+                dy_dx = df_dx + dr_dx
+            else:
+                dy_dx = beta[0] * dy_dx + df_dx + dr_dx
 
             # scaled predictor
-            sigma2 = self.optimal_par[i]['sigma2'] 
-            q = self.q_all[i]
-            p = self.p_all[i]
-            Q_ = (np.dot((yt-np.dot(Ft,beta)).T, yt-np.dot(Ft,beta)))[0,0]
-            u_ = solve_triangular(G.T, f - np.dot(Ft.T, r_t), lower=True)
-            sigma2_rho = np.dot(g, \
-                sigma2*linalg.inv(np.dot(G.T,G))[:q,:q] \
-                    + np.dot(beta[:q], beta[:q].T))
-            sigma2_rho = (sigma2_rho * g).sum(axis=1)
-            sigma2_rhos.append(sigma2_rho)
-            
-            MSE[:,i] = sigma2_rho * MSE[:,i-1] \
-                            + Q_/(2*(self.nt_all[i]-p-q)) \
-                            * (1 + self.noise[i] - (r_t**2).sum(axis=0)) \
-                            + sigma2 * (u_**2).sum(axis=0)
+            mu = (np.dot(f, beta) + np.dot(r_, gamma)).ravel()
 
-                
+        return self.y_std**2 * dMSE / self.X_std
 
-        # scaled predictor
-        for i in range(nlevel):# Predictor
-            MSE[:,i] = self.y_std**2 * MSE[:,i]
-      
-        return MSE, sigma2_rhos
-    
-    
     def _predict_derivatives(self, x, kx):
         """
         Evaluates the derivatives at a set of points.
@@ -428,7 +757,7 @@ class MFK(KrgBased):
             df = np.zeros([n_eval,1])
         elif self.options['poly'].__name__ == 'linear':
             df = np.zeros((n_eval, self.nx + 1))
-            df[:,1:] = 1
+            df[:,1+kx] = 1
         else:
             raise ValueError(
                 'The derivative is only available for ordinary kriging or '+
@@ -450,7 +779,7 @@ class MFK(KrgBased):
 
         df_dx = np.dot(df, beta)
         d_dx=x[:,kx].reshape((n_eval,1))-self.X_norma_all[0][:,kx].reshape((1,self.nt_all[0]))
-        theta = self.optimal_theta[0]
+        theta = self._componentwise_distance(np.eye(self.nx)).dot(self.optimal_theta[0])
 
         dy_dx[:,0] = np.ravel((df_dx-2*theta[kx]*np.dot(d_dx*r_,gamma)))
 
@@ -458,22 +787,18 @@ class MFK(KrgBased):
 
         # Calculate recursively derivative at level i
         for i in range(1,lvl):
-            F = self.F_all[i]
-            C = self.optimal_par[i]['C']
             g = self.options['rho_regr'](x)
             dx = manhattan_distances(x, Y=self.X_norma_all[i], sum_over_features=False)
             d = self._componentwise_distance(dx)
             r_ = self.options['corr'](self.optimal_theta[i], d).reshape(n_eval, self.nt_all[i])
             df = np.vstack((g.T*dy_dx[:,i-1], df0.T))
 
-            Ft = solve_triangular(C, F, lower=True)
-            yt = solve_triangular(C, self.y_norma_all[i], lower=True)
             beta = self.optimal_par[i]['beta']
             gamma = self.optimal_par[i]['gamma']
             
             df_dx = np.dot(df.T, beta)
             d_dx=x[:,kx].reshape((n_eval,1))-self.X_norma_all[i][:,kx].reshape((1,self.nt_all[i]))
-            theta = self.optimal_theta[i]
+            theta = self._componentwise_distance(np.eye(self.nx)).dot(self.optimal_theta[i])
             # scaled predictor
             dy_dx[:,i] = np.ravel(df_dx-2*theta[kx]*np.dot(d_dx*r_,gamma))
        
@@ -354,35 +354,28 @@ class MOE(Extensions):
             best trained surrogate model
 
         """
-        dim = self.ndim
         clustered_values = np.array(clustered_values)
-        
-        scores = {}
-        sms = {}
 
-        # validation with 10% of the training data
+        # The candidates are scored on the same errors: the leave-one-out errors
+        # on all the training data when they all compute them without retraining,
+        # the errors on 10% of the training data held out otherwise. The kriging
+        # and RBF leave-one-out errors cost O(nt^3) operations and O(nt^2) memory
+        # per candidate, which stays cheap only for the small clusters of MOE
+        sm_classes = [(name, sm_class) for name, sm_class in six.iteritems(self._surrogate_type)
+                      if name not in ['RMTC', 'RMTB', 'GEKPLS', 'KRG']]
+        #TODO: RMTC, RMTB, GEKPLS and KRG not used for now as they require some parameterization
+        loo = all(hasattr(sm_class, 'compute_loo_errors') for _, sm_class in sm_classes)
         test_values, training_values = self._extract_part(clustered_values, 10)
-        
-        for name, sm_class in six.iteritems(self._surrogate_type):
-            if name in ['RMTC', 'RMTB', 'GEKPLS', 'KRG']:  
-                #TODO: SMs not used for now as it require some parameterization
-                continue
-            
-            sm = sm_class()
-            sm.options['print_global']=False
-            sm.set_training_values(training_values[:, 0:dim], training_values[:, dim])
-            sm.train()
-            
-            expected = test_values[:, dim]
-            actual = sm.predict_values(test_values[:, 0:dim])
-            l_two = np.linalg.norm(expected - actual, 2)
-            # l_two_rel = l_two / np.linalg.norm(expected, 2)
-            # mse = (l_two**2) / len(expected)
-            # rmse = mse ** 0.5
-            scores[sm.name] = l_two
-            print(sm.name, l_two)
-            sms[sm.name] = sm
-            
+        if loo:
+            try:
+                scores, sms = self._score_models(sm_classes, clustered_values)
+            except ValueError:
+                # Leave-one-out errors not defined on this cluster, e.g. for
+                # repeated inputs or training points of leverage 1
+                loo = False
+        if not loo:
+            scores, sms = self._score_models(sm_classes, training_values, test_values)
+
         best_name=None
         best_score=None
         for name, rmse in six.iteritems(scores):
@@ -392,6 +385,47 @@ class MOE(Extensions):
         print("Best expert = {}".format(best_name))
         return sms[best_name]
 
+    def _score_models(self, sm_classes, training_values, test_values=None):
+        """
+        Train the candidate models and compute their root mean square errors.
+
+        Arguments :
+        ------------
+        - sm_classes: list of (str, class)
+            names and classes of the candidate models
+        - training_values: array_like
+            training samples [[X1,X2, ..., Xn, Y], ... ]
+        - test_values: array_like or None
+            test samples; the leave-one-out errors are used if None
+
+        Returns :
+        ---------
+        - scores : dict
+            root mean square errors of the models
+        - sms : dict
+            trained models
+        """
+        dim = self.ndim
+        scores = {}
+        sms = {}
+        for name, sm_class in sm_classes:
+            sm = sm_class()
+            sm.options['print_global']=False
+            sm.set_training_values(training_values[:, 0:dim], training_values[:, dim])
+            sm.train()
+
+            if test_values is None:
+                errors = sm.compute_loo_errors()[:, 0]
+            else:
+                expected = test_values[:, dim]
+                actual = sm.predict_values(test_values[:, 0:dim])[:, 0]
+                errors = expected - actual
+            rmse = np.sqrt(np.mean(errors ** 2))
+            scores[sm.name] = rmse
+            print(sm.name, rmse)
+            sms[sm.name] = sm
+        return scores, sms
+
     def _find_best_heaviside_factor(self, x, y):
         """
         Find the best heaviside factor to smooth approximated values.
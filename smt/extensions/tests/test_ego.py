@@ -0,0 +1,141 @@
+'''
+This package is distributed under New BSD license.
+'''
+
+import unittest
+import numpy as np
+import matplotlib
+matplotlib.use('Agg')
+from scipy import linalg
+
+from smt.problems import Branin, Sphere
+from smt.surrogate_models import KRG
+from smt.extensions import EGO
+
+
+class SamePointEGO(EGO):
+
+    # Always proposes the same point
+    def _find_point(self, sm, y_min, xlimits):
+        return np.array([3., 3.])
+
+
+class SingularKRG(KRG):
+
+    # The update of the factorizations always fails
+    def add_training_points(self, x_new, y_new, reoptimize=False):
+        raise linalg.LinAlgError('Singular matrix')
+
+
+class TestEGO(unittest.TestCase):
+
+    def test_criterion_gradient(self):
+        np.random.seed(0)
+        fun = Branin()
+        xt = fun.xlimits[:, 0] + np.random.rand(10, 2) * (fun.xlimits[:, 1] - fun.xlimits[:, 0])
+        yt = fun(xt)
+        sm = KRG(theta0=[1e-2] * 2, print_global=False)
+        sm.set_training_values(xt, yt)
+        sm.train()
+
+        x, h = np.array([2., 5.]), 1e-5
+        for criterion in ['EI', 'LCB']:
+            ego = EGO(fun=fun, criterion=criterion)
+            value, gradient = ego._criterion(x, sm, np.min(yt), True)
+            self.assertAlmostEqual(value, ego._criterion(x, sm, np.min(yt), False))
+            for kx in range(2):
+                dx = h * np.eye(2)[kx]
+                fd = (ego._criterion(x + dx, sm, np.min(yt), False)
+                      - ego._criterion(x - dx, sm, np.min(yt), False)) / (2 * h)
+                self.assertAlmostEqual(gradient[kx], fd, delta=1e-4 * (1 + abs(fd)))
+
+    def test_ego_parallel(self):
+        fun = Branin()
+        for qEI in ['KB', 'CLmin']:
+            np.random.seed(0)
+            ego = EGO(fun=fun, n_iter=4, n_parallel=3, qEI=qEI, n_doe=6, n_jobs=3)
+            ego.apply_method()
+            x_opt, y_opt, ind_best, x_data, y_data = ego.analyse_results()
+
+            self.assertEqual(x_data.shape, (6 + 4 * 3, 2))
+            self.assertTrue(np.allclose(y_data, fun(x_data)))
+            self.assertEqual(y_opt[0], np.min(y_data))
+            # The global minimum of the Branin function is 0.397887
+            self.assertLess(y_opt[0], 2.)
+
+    def test_ego_pls(self):
+        fun = Sphere(ndim=3)
+        for surrogate in ['KPLS', 'KPLSK']:
+            np.random.seed(0)
+            ego = EGO(fun=fun, n_iter=2, n_parallel=2, n_doe=5, surrogate=surrogate,
+                      surrogate_options={'n_comp': 2})
+            ego.apply_method()
+            x_opt, y_opt, ind_best, x_data, y_data = ego.analyse_results()
+            self.assertEqual(x_data.shape, (5 + 2 * 2, 3))
+
+    def test_ego_same_points(self):
+        fun = Branin()
+        np.random.seed(0)
+        # the point proposed again is dropped, the next iteration proposing none
+        ego = SamePointEGO(fun=fun, n_iter=3, n_parallel=3, n_doe=6)
+        ego.apply_method()
+        x_opt, y_opt, ind_best, x_data, y_data = ego.analyse_results()
+        self.assertEqual(x_data.shape, (6 + 1, 2))
+        self.assertTrue(np.array_equal(x_data[-1], [3., 3.]))
+
+        # a singular update of the model falls back to a training
+        np.random.seed(0)
+        ego = EGO(fun=fun, n_iter=2, n_parallel=3, n_doe=6)
+        ego._surrogate_type = dict(EGO._surrogate_type, KRG=SingularKRG)
+        ego.apply_method()
+        x_opt, y_opt, ind_best, x_data, y_data = ego.analyse_results()
+        self.assertEqual(x_data.shape, (6 + 2 * 3, 2))
+        self.assertTrue(np.allclose(y_data, fun(x_data)))
+
+    def test_ego_seed(self):
+        fun = Branin()
+        x_datas = []
+        for i in range(2):
+            np.random.seed(i)
+            ego = EGO(fun=fun, n_iter=2, n_parallel=2, n_doe=5, n_start=5, seed=42)
+            ego.apply_method()
+            x_datas.append(ego.analyse_results()[3])
+        self.assertTrue(np.array_equal(x_datas[0], x_datas[1]))
+
+    @staticmethod
+    def run_ego_example(self):
+        import numpy as np
+        import matplotlib.pyplot as plt
+
+        from smt.problems import Branin
+        from smt.extensions import EGO
+
+        fun = Branin()
+
+        # 5 iterations of 4 points evaluated by 4 processes
+        ego = EGO(fun=fun, n_doe=5, n_iter=5, n_parallel=4, qEI='KB', n_jobs=4,
+                  criterion='EI', surrogate='KRG', seed=0)
+        ego.apply_method()
+        x_opt, y_opt, ind_best, x_data, y_data = ego.analyse_results()
+
+        print('Minimum found: f(%.4f, %.4f) = %.4f' % (x_opt[0], x_opt[1], y_opt[0]))
+        print('Global minimum: f(3.1416, 2.2750) = 0.3979')
+
+        num = 100
+        x1 = np.linspace(fun.xlimits[0, 0], fun.xlimits[0, 1], num)
+        x2 = np.linspace(fun.xlimits[1, 0], fun.xlimits[1, 1], num)
+        X1, X2 = np.meshgrid(x1, x2)
+        Y = fun(np.vstack((X1.ravel(), X2.ravel())).T).reshape(num, num)
+
+        plt.contour(X1, X2, Y, 40)
+        plt.plot(x_data[:5, 0], x_data[:5, 1], 'ko')
+        plt.plot(x_data[5:, 0], x_data[5:, 1], 'r.')
+        plt.plot(x_opt[0], x_opt[1], 'b*', markersize=12)
+        plt.xlabel('x1')
+        plt.ylabel('x2')
+        plt.legend(['Initial design', 'Infill points', 'Best point'])
+        plt.show()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -9,6 +9,7 @@ import numpy as np
 from sys import argv
 
 from smt.extensions import MOE
+from smt.surrogate_models import LS
 from smt.utils.sm_test_case import SMTestCase
 from smt.problems import Branin, LpNorm
 from smt.sampling_methods import FullFactorial
@@ -32,6 +33,18 @@ class TestMOE(SMTestCase):
         y[x>=0.8] = np.sin(10*x[x>=0.8])
         return y.reshape((-1, 1))
 
+    def test_find_best_model_leverage_one(self):
+        # the last point has leverage 1 in the linear fit: the leave-one-out
+        # errors are not defined and the held-out errors are used instead
+        x = np.vstack([np.array([np.linspace(0., 1., 10), np.zeros(10)]).T, [[0.5, 1.]]])
+        values = np.hstack([x, x.dot([1., 2.])[:, np.newaxis]])
+        moe = MOE()
+        moe.ndim = 2
+        moe._surrogate_type = {'LS': LS}
+        sm = moe._find_best_model(values)
+        self.assertEqual(sm.name, 'LS')
+        self.assertEqual(sm.training_points[None][0][0].shape[0], 9)
+
     #@unittest.skip('disabled')
     def test_1d_50(self):
         self.ndim = 1
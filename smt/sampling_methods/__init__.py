@@ -1,3 +1,4 @@
 from .random import Random
 from .lhs import LHS
 from .full_factorial import FullFactorial
+from .nested_lhs import NestedLHS
@@ -20,6 +20,8 @@ class LHS(SamplingMethod):
                                                        'correlation', 'c', 'm', 'cm', 'corr','ese'],
                              types=str, desc='criterion used to construct the LHS design '+
                              'c, m, cm and corr are abbreviation of center, maximin, centermaximin and correlation, respectively')
+        self.options.declare('random_state', None, types=int,
+                             desc='Seed of the random numbers; the global numpy random state is used if None')
 
     def _compute(self, n):
         """
@@ -37,6 +39,20 @@ class LHS(SamplingMethod):
         """
         xlimits = self.options['xlimits']
         nx = xlimits.shape[0]
+        random_state = self.options['random_state']
+        if random_state is None:
+            return self._lhs(nx, n)
+
+        # pyDOE draws from the global numpy random state, which is only seeded
+        # for this design
+        state = np.random.get_state()
+        np.random.seed(random_state)
+        try:
+            return self._lhs(nx, n)
+        finally:
+            np.random.set_state(state)
+
+    def _lhs(self, nx, n):
         if self.options['criterion'] != 'ese':
             return pyDOE.lhs(nx, samples=n, criterion=self.options['criterion'])
         elif self.options['criterion'] == 'ese':
@@ -0,0 +1,112 @@
+"""
+This package is distributed under New BSD license.
+
+Nested LHS sampling for multi-fidelity models.
+"""
+from __future__ import division
+from six.moves import range
+from scipy.spatial.distance import cdist
+import numpy as np
+
+from smt.sampling_methods.sampling_method import SamplingMethod
+from smt.sampling_methods.lhs import LHS
+
+class NestedLHS(SamplingMethod):
+
+    """
+    Nested LHS designs of several levels of fidelity.
+
+    Unlike the other sampling methods, which return one ndarray[n, nx], calling
+    NestedLHS returns a list with one ndarray[n_i, nx] per level, and n may give
+    the number of points of each level. The designs are computed in the unit
+    hypercube by _compute and scaled by SamplingMethod.__call__ like the others.
+    """
+
+    def _initialize(self):
+        self.options.declare('nlevel', 2, types=int, desc='Number of levels of fidelity')
+        self.options.declare('criterion', 'ese', values=['center', 'maximin', 'centermaximin',
+                                                         'correlation', 'c', 'm', 'cm', 'corr',
+                                                         'ese'],
+                             types=str, desc='criterion used to construct the LHS design '+
+                             'of each level, as in LHS')
+        self.options.declare('random_state', None, types=int,
+                             desc='Seed of the random numbers; the global numpy random state is used if None')
+
+    def __call__(self, n):
+        """
+        Compute nested sampling points: the points of each level of fidelity are
+        points of the level below.
+
+        The lowest fidelity level is a LHS design. For each higher level, a LHS design
+        is drawn and each of its points is replaced by the nearest point of the level
+        below not already selected.
+
+        Arguments
+        ---------
+        n : int or list of int
+            Number of points of the highest fidelity level, the number of points doubling
+            from one level to the level below, or numbers of points of the levels from
+            the lowest to the highest fidelity.
+
+        Returns
+        -------
+        list of ndarray[n_i, nx]
+            The sampling locations in the input space of the levels, from the lowest to
+            the highest fidelity.
+        """
+        n = self._level_sizes(n)
+        x = super(NestedLHS, self).__call__(n)
+        return np.split(x, np.cumsum(n)[:-1])
+
+    def _level_sizes(self, n):
+        """
+        Numbers of points of the levels, from the lowest to the highest fidelity.
+        """
+        nlevel = self.options['nlevel']
+        if isinstance(n, int):
+            n = [n * 2 ** (nlevel - 1 - i) for i in range(nlevel)]
+        if len(n) != nlevel or np.any(np.diff(n) > 0):
+            raise ValueError('n must give non-increasing numbers of points for the %i levels'
+                             % nlevel)
+        return list(n)
+
+    def _compute(self, n):
+        """
+        Compute the nested designs of the levels in the unit hypercube.
+
+        Arguments
+        ---------
+        n : list of int
+            Numbers of points of the levels from the lowest to the highest fidelity.
+
+        Returns
+        -------
+        ndarray[sum(n), nx]
+            The sampling locations of the levels in the unit hypercube, stacked from
+            the lowest to the highest fidelity.
+        """
+        nx = self.options['xlimits'].shape[0]
+        nlevel = self.options['nlevel']
+
+        # One seed per level, drawn from random_state
+        random_state = self.options['random_state']
+        if random_state is None:
+            seeds = [None] * nlevel
+        else:
+            seeds = np.random.RandomState(random_state).randint(2**31 - 1, size=nlevel)
+
+        # Designs in the unit hypercube, for distances independent of the scaling
+        def sampling(n_i, seed):
+            return LHS(xlimits=np.array([[0., 1.]] * nx), criterion=self.options['criterion'],
+                       random_state=None if seed is None else int(seed))(n_i)
+
+        x = [sampling(n[0], seeds[0])]
+        for i in range(1, nlevel):
+            d = cdist(sampling(n[i], seeds[i]), x[-1])
+            ind = []
+            for j in range(n[i]):
+                d[j, ind] = np.inf
+                ind.append(np.argmin(d[j]))
+            x.append(x[-1][ind])
+
+        return np.vstack(x)
@@ -72,5 +72,33 @@ class Test(unittest.TestCase):
         plt.ylabel('y')
         plt.show()
 
+    def test_nested_lhs(self):
+        import numpy as np
+        import matplotlib.pyplot as plt
+
+        from smt.sampling_methods import NestedLHS
+
+        xlimits = np.array([
+            [0., 4.],
+            [0., 3.],
+        ])
+        sampling = NestedLHS(nlevel=2, xlimits=xlimits, random_state=0)
+
+        num = 10
+        x_lf, x_hf = sampling(num)
+
+        print(x_lf.shape, x_hf.shape)
+
+        # the high fidelity points are points of the low fidelity design
+        for x in x_hf:
+            assert np.any(np.all(x_lf == x, axis=1))
+
+        plt.plot(x_lf[:, 0], x_lf[:, 1], 'o')
+        plt.plot(x_hf[:, 0], x_hf[:, 1], 'x', markersize=10)
+        plt.xlabel('x')
+        plt.ylabel('y')
+        plt.legend(['Low fidelity', 'High fidelity'])
+        plt.show()
+
 if __name__ == '__main__':
     unittest.main()
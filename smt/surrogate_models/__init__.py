@@ -3,7 +3,11 @@ from .qp import QP
 from .kpls import KPLS
 from .krg import KRG
 from .gekpls import GEKPLS
+from .gek import GEK
 from .kplsk import KPLSK
+from .sgp import SGP
+from .lkrg import LocalKRG
+from .gridkrg import GridKRG
 try:
     from .idw import IDW
     from .rbf import RBF
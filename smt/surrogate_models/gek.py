@@ -0,0 +1,346 @@
+'''
+This package is distributed under New BSD license.
+'''
+
+from __future__ import division
+import numpy as np
+from scipy import linalg
+
+from smt.surrogate_models.krg_based import KrgBased
+from smt.utils.kriging_utils import standardization, componentwise_distance, \
+    componentwise_distance_PLS, ge_compute_pls
+
+"""
+The gradient-enhanced kriging class.
+"""
+
+class GEK(KrgBased):
+
+    """
+    - GEK
+    """
+    def _initialize(self):
+        super(GEK, self)._initialize()
+        declare = self.options.declare
+        declare('theta0', None, types=(list, np.ndarray), desc='Initial hyperparameters')
+        declare('n_comp', None, types=int,
+                desc='Number of principal components of the gradient-enhanced PLS reduction '
+                'of the hyperparameters; one hyperparameter per input variable if None')
+        self.supports['training_derivatives'] = True
+        self.name = 'GEK'
+
+    def _new_train(self):
+
+        """
+        Train the model: the observations of the kriging system are the training
+        values followed by the training derivatives with respect to each input
+        variable, at the same training points.
+        """
+        self._check_param()
+
+        X, y = self.training_points[None][0]
+        dy_dx = []
+        for kx in range(self.nx):
+            xd, yd = self.training_points[None][kx + 1]
+            if not np.array_equal(xd, X):
+                raise ValueError("The training derivatives should be given at the "
+                                 "training inputs of the values.")
+            dy_dx.append(yd)
+
+        # Center and scale X and y, the derivatives being those of the
+        # normalized outputs with respect to the normalized inputs
+        self.X_norma, y_norma, self.X_mean, self.y_mean, self.X_std, \
+            self.y_std = standardization(X, y, copy=True)
+        dy_dx = [yd * self.X_std[kx] / self.y_std for kx, yd in enumerate(dy_dx)]
+
+        if self.options['n_comp'] is not None:
+            # PLS-coefficients of the normalized derivatives, the local designs
+            # having the same unit step in all the directions
+            pts = {None: dict([(0, [self.X_norma, y_norma])] +
+                              [(kx + 1, [self.X_norma, yd]) for kx, yd in enumerate(dy_dx)])}
+            self.coeff_pls = ge_compute_pls(self.X_norma, y_norma, self.options['n_comp'],
+                                            pts, 1., np.array([[0., 1.]] * self.nx), 0)[0]
+
+        # Componentwise differences x_i - x_j of the pairs i < j of training
+        # points, from which all the blocks of [R] are computed
+        self.ij = np.array(np.triu_indices(self.nt, 1)).T
+        self._dx_pairs = self.X_norma[self.ij[:, 0]] - self.X_norma[self.ij[:, 1]]
+        if self.nt > 1 and np.min(np.abs(self._dx_pairs).sum(axis=1)) == 0.:
+            raise Exception("Multiple input features cannot have the same value.")
+
+        # Regression matrix of the values and of the derivatives
+        F = self.options['poly'](self.X_norma)
+        dF = np.zeros((self.nx, self.nt, F.shape[1]))
+        if self.options['poly'].__name__ == 'linear':
+            # Columns [1, x_1, ..., x_nx]
+            dF[np.arange(self.nx), :, 1 + np.arange(self.nx)] = 1.
+        self.F = np.vstack([F] + list(dF))
+        self.y_norma = np.vstack([y_norma] + dy_dx)
+
+        # Optimization
+        self.optimal_rlf_value, self.optimal_par, self.optimal_theta = \
+                self._optimize_hyperparam(None)
+        self.optimal_noise = 0.
+        if self.options['eval_noise']:
+            self.optimal_noise = self.optimal_theta[..., -1]
+            self.optimal_theta = self.optimal_theta[..., :-1]
+        del self.y_norma, self.D, self._dx_pairs
+
+    def _componentwise_distance(self,dx,opt=0):
+        if self.options['n_comp'] is None:
+            d = componentwise_distance(dx,self.options['corr'].__name__,
+                                       self.nx)
+        else:
+            d = componentwise_distance_PLS(dx,self.options['corr'].__name__,
+                                           self.options['n_comp'],self.coeff_pls)
+        return d
+
+    def _check_param(self):
+        super(GEK, self)._check_param()
+
+        if self.options['corr'].__name__ != 'squar_exp':
+            raise ValueError("The derivatives of the correlation function are only "
+                             "available for the square exponential kernel, "
+                             "%s was given." % self.options['corr'].__name__)
+        if self.options['poly'].__name__ not in ['constant', 'linear']:
+            raise ValueError("The regression term of GEK should be constant or linear, "
+                             "%s was given." % self.options['poly'].__name__)
+        if self.options['hyper_opt'] != 'Cobyla':
+            raise ValueError("The likelihood gradient is not available for GEK, "
+                             "%s was given." % self.options['hyper_opt'])
+        for kx in range(self.nx):
+            if kx + 1 not in self.training_points[None]:
+                raise Exception('The derivatives with respect to all the input variables '
+                                'are needed for using the GEK model.')
+
+    def _gek_correlation_matrix(self, weights, diag, noise):
+
+        """
+        Correlation matrix of the training values and derivatives, by blocks
+        [[R, dR/dx'], [dR/dx, d2R/dxdx']] computed from the componentwise
+        differences of the pairs of training points.
+
+        Arguments
+        ---------
+        weights : np.ndarray [dim]
+            Weights of the squared componentwise distances in the correlation function
+        diag : float
+            Relative value added to the diagonal
+        noise : float
+            Noise of the training values
+
+        Returns
+        -------
+        R : np.ndarray [(dim + 1) * nt, (dim + 1) * nt]
+            Correlation matrix, the rows of the values being followed by those of
+            the derivatives with respect to each input variable
+        """
+        nt, nx = self.nt, self.nx
+        i, j = self.ij[:, 0], self.ij[:, 1]
+        r = np.exp(-np.dot(self._dx_pairs ** 2., weights))
+        # corr(y_i, dy_j/dx_l) = 2 w_l (x_i - x_j)_l r_ij = - corr(dy_i/dx_l, y_j)
+        a = 2. * weights * self._dx_pairs
+        ar = a * r[:, np.newaxis]
+        # corr(dy_i/dx_k, dy_j/dx_l) = (2 w_k delta_kl - a_k a_l) r_ij
+        H = - a[:, :, np.newaxis] * ar[:, np.newaxis, :]
+        H[:, np.arange(nx), np.arange(nx)] += 2. * weights * r[:, np.newaxis]
+
+        R = np.zeros((nx + 1, nt, nx + 1, nt))
+        R[0, i, 0, j] = R[0, j, 0, i] = r
+        R[0, i, 1:, j] = ar
+        R[0, j, 1:, i] = - ar
+        R[1:, j, 0, i] = ar.T
+        R[1:, i, 0, j] = - ar.T
+        R[1:, i, 1:, j] = R[1:, j, 1:, i] = H
+        diagonal = np.arange(nt)
+        R[0, diagonal, 0, diagonal] = diag + noise
+        R[1:, diagonal, 1:, diagonal] = np.diag(2. * weights * diag)
+
+        return R.reshape(((nx + 1) * nt, (nx + 1) * nt))
+
+    def _reduced_likelihood_function(self, theta):
+
+        """
+        This function determines the BLUP parameters and evaluates the reduced
+        likelihood function for the given autocorrelation parameters theta,
+        the observations being the training values and derivatives.
+
+        Parameters
+        ----------
+        theta: list(n_comp) or list(dim)
+            - An array containing the autocorrelation parameters at which the
+              Gaussian Process model parameters should be determined, the
+              last one being the noise of the values when eval_noise is used.
+
+        Returns
+        -------
+        reduced_likelihood_function_value: real
+            - The value of the reduced likelihood function associated to the
+              given autocorrelation parameters theta.
+
+        par: dict()
+            - A dictionary containing the requested Gaussian Process model
+              parameters:
+
+            sigma2
+            Gaussian Process variance.
+            beta
+            Generalized least-squares regression weights.
+            gamma
+            Gaussian Process weights of the values and of the derivatives.
+            C
+            Cholesky decomposition of the correlation matrix [R].
+            Ft
+            Solution of the linear equation system : [R] x Ft = F
+            G
+            QR decomposition of the matrix Ft.
+        """
+        # Initialize output
+        reduced_likelihood_function_value = - np.inf
+        par = {}
+        MACHINE_EPSILON = np.finfo(np.double).eps
+        nugget = 10.*MACHINE_EPSILON
+        noise = 0.
+        tmp_var = theta
+        if self.options['eval_noise']:
+            theta = tmp_var[:-1]
+            noise = tmp_var[-1]
+
+        R = self._gek_correlation_matrix(self._corr_map.dot(theta), 1. + nugget, noise)
+        n_obs = R.shape[0]
+
+        # Cholesky decomposition of R
+        try:
+            C = linalg.cholesky(R, lower=True, overwrite_a=True)
+        except (linalg.LinAlgError, ValueError):
+            return reduced_likelihood_function_value, par
+
+        # Get generalized least squares solution
+        Ft = linalg.solve_triangular(C, self.F, lower=True)
+        Q, G = linalg.qr(Ft, mode='economic')
+        sv = linalg.svd(G, compute_uv=False)
+        rcondG = sv[-1] / sv[0]
+        if rcondG < 1e-10:
+            # Check F
+            sv = linalg.svd(self.F, compute_uv=False)
+            condF = sv[0] / sv[-1]
+            if condF > 1e15:
+                raise Exception("F is too ill conditioned. Poor combination "
+                                "of regression model and observations.")
+
+            else:
+                # Ft is too ill conditioned, get out (try different theta)
+                return reduced_likelihood_function_value, par
+
+        Yt = linalg.solve_triangular(C, self.y_norma, lower=True)
+        beta = linalg.solve_triangular(G, np.dot(Q.T, Yt))
+        rho = Yt - np.dot(Ft, beta)
+
+        # The determinant of R is equal to the squared product of the diagonal
+        # elements of its Cholesky decomposition C
+        detR = (np.diag(C) ** (2. / n_obs)).prod()
+
+        # Compute/Organize output
+        sigma2 = (rho ** 2.).sum(axis=0) / n_obs
+        reduced_likelihood_function_value = - self._shared_variance(sigma2) * detR
+        par['sigma2'] = sigma2 * self.y_std ** 2.
+        par['beta'] = beta
+        par['gamma'] = linalg.solve_triangular(C.T, rho)
+        par['C'] = C
+        par['Ft'] = Ft
+        par['G'] = G
+
+        # A particular case when f_min_cobyla fail
+        self._update_best_iteration(reduced_likelihood_function_value, tmp_var)
+
+        return reduced_likelihood_function_value, par
+
+    def _observation_correlation(self, x):
+        """
+        Evaluates the correlation between a set of normalized points and the
+        training values and derivatives.
+
+        Returns
+        -------
+        dx : np.ndarray [n_evals, nt, dim]
+            Componentwise differences between the points and the training points
+        r : np.ndarray [n_evals, nt]
+            Correlation between the points and the training points
+        r_obs : np.ndarray [n_evals, (dim + 1) * nt]
+            Correlation between the points and the observations
+        """
+        weights = self._componentwise_distance(np.eye(self.nx)).dot(self.optimal_theta)
+        dx = x[:, np.newaxis, :] - self.X_norma[np.newaxis, :, :]
+        r = np.exp(-np.dot(dx ** 2., weights))
+        # corr(y(x), dy_j/dx_l) = 2 w_l (x - x_j)_l r_j
+        dr = 2. * weights * dx * r[:, :, np.newaxis]
+        r_obs = np.hstack([r, dr.transpose(0, 2, 1).reshape((x.shape[0], -1))])
+        return dx, r, r_obs
+
+    def _gek_derivatives(self, dx, r, kx=None):
+        """
+        Evaluates the derivatives of the predictor with respect to the input
+        variables from the differences and correlations of _observation_correlation.
+
+        Returns
+        -------
+        dy_dx : np.ndarray [n_evals, dim or 1, ny]
+            Derivative values.
+        """
+        par = self.optimal_par
+        weights = self._componentwise_distance(np.eye(self.nx)).dot(self.optimal_theta)
+        gamma = par['gamma'].reshape((self.nx + 1, self.nt, -1))
+        a = 2. * weights * dx
+        # The correlation part of the predictor is sum_j r_j s_j, with
+        # s_j = gamma_j + sum_l a_jl gamma_lj and da_jl/dx_k = 2 w_k delta_kl
+        s = gamma[0] + np.einsum('njl,ljy->njy', a, gamma[1:])
+        kxs = range(self.nx) if kx is None else [kx]
+        dy_dx = - np.einsum('njk,njy->nky', a[:, :, kxs] * r[:, :, np.newaxis], s)
+        for i, k in enumerate(kxs):
+            dy_dx[:, i, :] += 2. * weights[k] * np.dot(r, gamma[1 + k])
+
+        df_dx = self._trend_derivatives(par['beta'], kx)
+        X_std = np.reshape(self.X_std, (-1, 1)) if kx is None else self.X_std[kx]
+        return (df_dx + dy_dx) * self.y_std / X_std
+
+    def _predict_all(self, x, variances, gradients):
+        # Initialization
+        x = (x - self.X_mean) / self.X_std
+        dx, r, r_obs = self._observation_correlation(x)
+
+        y = self._values_from_correlation(x, r_obs)
+        s2 = dy_dx = None
+        if variances:
+            s2 = self._variances_from_correlation(x, r_obs)
+        if gradients:
+            dy_dx = self._gek_derivatives(dx, r)
+
+        return y, s2, dy_dx
+
+    def _predict_values(self, x):
+        return self._predict_all(x, False, False)[0]
+
+    def _predict_derivatives(self, x, kx):
+        """
+        Evaluates the derivatives at a set of points.
+
+        Arguments
+        ---------
+        x : np.ndarray [n_evals, dim]
+            Evaluation point input variable values
+        kx : int
+            The 0-based index of the input variable with respect to which derivatives are desired.
+
+        Returns
+        -------
+        y : np.ndarray
+            Derivative values.
+        """
+        # Initialization
+        x = (x - self.X_mean) / self.X_std
+        dx, r, _ = self._observation_correlation(x)
+
+        return self._gek_derivatives(dx, r, kx)[:, 0, :]
+
+    def _predict_variances(self, x):
+        return self._predict_all(x, True, False)[1]
@@ -0,0 +1,399 @@
+'''
+This package is distributed under New BSD license.
+'''
+
+from __future__ import division
+import numpy as np
+from scipy import linalg
+from types import FunctionType
+
+from smt.surrogate_models.krg_based import KrgBased
+from smt.utils.kriging_utils import componentwise_distance, kronecker_product_dot, \
+    kronecker_rows_dot
+
+"""
+The grid kriging class.
+"""
+
+class GridKRG(KrgBased):
+
+    """
+    - GridKRG
+    """
+    def _initialize(self):
+        super(GridKRG, self)._initialize()
+        declare = self.options.declare
+        declare('theta0', None, types=(list, np.ndarray), desc='Initial hyperparameters')
+        declare('corr', 'squar_exp', types=FunctionType,
+                values=('abs_exp', 'squar_exp', 'wendland_c2', 'wendland_c4'),
+                desc='type of corr. func.')
+        declare('grid_tol', 1e-4, types=float,
+                desc='Distance, relative to the range of each input variable, below which '
+                'the values of the training inputs are merged into one node of the grid')
+        self.name = 'GridKRG'
+
+    def _compute_pls(self,X,y):
+        # No PLS projection: the training inputs are moved to the nodes of the
+        # axes of the grid, within grid_tol, and sorted in the order of the
+        # Kronecker product of the axes, the last one varying the fastest
+        self.axes, nodes = [], []
+        for k in range(self.nx):
+            order = np.argsort(X[:, k])
+            x_sorted = X[order, k]
+            tol = self.options['grid_tol'] * (x_sorted[-1] - x_sorted[0])
+            node = np.empty(X.shape[0], dtype=int)
+            node[order] = np.concatenate([[0], np.cumsum(np.diff(x_sorted) > tol)])
+            self.axes.append(np.bincount(node, weights=X[:, k]) / np.bincount(node))
+            nodes.append(node)
+            X[:, k] = self.axes[k][node]
+        self.grid_shape = tuple(len(axis) for axis in self.axes)
+        index = np.ravel_multi_index(nodes, self.grid_shape)
+        if np.prod(self.grid_shape) != X.shape[0] or \
+                np.any(np.bincount(index, minlength=X.shape[0]) != 1):
+            raise ValueError("The training inputs do not form a full-factorial grid.")
+
+        # Position of each training point in the grid
+        self._grid_index = index
+        order = np.argsort(index)
+        return X[order],y[order]
+
+    def _componentwise_distance(self,dx,opt=0):
+        d = componentwise_distance(dx,self.options['corr'].__name__,
+                                   self.nx)
+        return d
+
+    def _normalized_axis(self, k):
+        """
+        Normalized nodes of the k-th axis of the grid.
+        """
+        return (self.axes[k] - self.X_mean[k]) / self.X_std[k]
+
+    def _axis_distance(self, x, k):
+        """
+        Componentwise distances between values of the k-th input variable and the
+        nodes of the k-th axis of the grid, the other input variables being equal.
+
+        Arguments
+        ---------
+        x : np.ndarray [n_evals]
+            Normalized values of the k-th input variable
+        k : int
+            The 0-based index of the input variable.
+
+        Returns
+        -------
+        d : np.ndarray [n_evals * n_k, dim]
+            Componentwise distances, zero for the other input variables
+        """
+        axis = self._normalized_axis(k)
+        dx = np.zeros((x.shape[0] * axis.shape[0], self.nx))
+        dx[:, k] = np.abs(np.subtract.outer(x, axis)).ravel()
+        return self._componentwise_distance(dx)
+
+    def _axis_correlation(self, x, k, theta):
+        """
+        Evaluates the correlation between values of the k-th input variable and
+        the nodes of the k-th axis of the grid: the correlation between two
+        points is the product of these one-dimensional correlations.
+
+        Returns
+        -------
+        r : np.ndarray [n_evals, n_k]
+            Correlation with the nodes of the axis
+        """
+        d = self._axis_distance(x, k)
+        return self.options['corr'](theta, d).reshape(x.shape[0], -1)
+
+    def _reduced_likelihood_function(self, theta):
+
+        """
+        This function determines the BLUP parameters and evaluates the reduced
+        likelihood function for the given autocorrelation parameters theta,
+        the training points forming a full-factorial grid: [R] is the Kronecker
+        product R_1 x ... x R_d of the correlation matrices of the axes, whose
+        eigendecompositions give the one of [R] + (nugget + noise) I.
+        The cost is O(sum_k n_k^3 + nt sum_k n_k).
+
+        Parameters
+        ----------
+        theta: list(dim)
+            - An array containing the autocorrelation parameters at which the
+              Gaussian Process model parameters should be determined, the
+              last one being the noise when eval_noise is used.
+
+        Returns
+        -------
+        reduced_likelihood_function_value: real
+            - The value of the reduced likelihood function associated to the
+              given autocorrelation parameters theta.
+
+        par: dict()
+            - A dictionary containing the requested Gaussian Process model
+              parameters:
+
+            sigma2
+            Gaussian Process variance.
+            beta
+            Generalized least-squares regression weights.
+            gamma
+            Gaussian Process weights.
+            U
+            Eigenvectors of the correlation matrices of the axes.
+            Lambda
+            Eigenvalues of [R] + (nugget + noise) I, in the order of U_1 x ... x U_d.
+            RinvF
+            Solution of the linear equation system : [R] x RinvF = F
+            G
+            Cholesky decomposition of F^T [R]^-1 F.
+        """
+        # Initialize output
+        reduced_likelihood_function_value = - np.inf
+        par = {}
+        MACHINE_EPSILON = np.finfo(np.double).eps
+        nugget = 10.*MACHINE_EPSILON
+        noise = 0.
+        tmp_var = theta
+        if self.options['eval_noise']:
+            theta = tmp_var[:-1]
+            noise = tmp_var[-1]
+
+        U, Lambda = [], np.ones(1)
+        for k in range(self.nx):
+            try:
+                eigvals, eigvecs = linalg.eigh(
+                    self._axis_correlation(self._normalized_axis(k), k, theta))
+            except (linalg.LinAlgError, ValueError):
+                return reduced_likelihood_function_value, par
+            # The correlation matrices of the axes are positive semi-definite
+            Lambda = np.kron(Lambda, np.maximum(eigvals, 0.))
+            U.append(eigvecs)
+        Lambda += nugget + noise
+        Ut = [eigvecs.T for eigvecs in U]
+
+        # Get generalized least squares solution in the basis of the eigenvectors
+        UtF = kronecker_product_dot(Ut, self.F)
+        Uty = kronecker_product_dot(Ut, self.y_norma)
+        FRF = np.dot(UtF.T, UtF / Lambda[:, np.newaxis])
+        try:
+            G = linalg.cholesky(FRF)
+        except (linalg.LinAlgError, ValueError):
+            return reduced_likelihood_function_value, par
+        sv = linalg.svd(G, compute_uv=False)
+        rcondG = sv[-1] / sv[0]
+        if rcondG < 1e-10:
+            # Check F
+            sv = linalg.svd(self.F, compute_uv=False)
+            condF = sv[0] / sv[-1]
+            if condF > 1e15:
+                raise Exception("F is too ill conditioned. Poor combination "
+                                "of regression model and observations.")
+
+            else:
+                # Ft is too ill conditioned, get out (try different theta)
+                return reduced_likelihood_function_value, par
+
+        beta = linalg.cho_solve((G, False), np.dot(UtF.T, Uty / Lambda[:, np.newaxis]))
+        Utrho = (Uty - np.dot(UtF, beta)) / np.sqrt(Lambda)[:, np.newaxis]
+
+        # The determinant of R is the product of its eigenvalues
+        detR = np.exp(np.log(Lambda).mean())
+
+        # Compute/Organize output
+        sigma2 = (Utrho ** 2.).sum(axis=0) / self.nt
+        reduced_likelihood_function_value = - self._shared_variance(sigma2) * detR
+        par['sigma2'] = sigma2 * self.y_std ** 2.
+        par['beta'] = beta
+        par['gamma'] = kronecker_product_dot(U, Utrho / np.sqrt(Lambda)[:, np.newaxis])
+        par['U'] = U
+        par['Lambda'] = Lambda
+        par['RinvF'] = kronecker_product_dot(U, UtF / Lambda[:, np.newaxis])
+        par['G'] = G
+
+        # A particular case when f_min_cobyla fail
+        self._update_best_iteration(reduced_likelihood_function_value, tmp_var)
+
+        return reduced_likelihood_function_value, par
+
+    def _reduced_likelihood_gradient(self, theta):
+
+        """
+        This function evaluates the reduced likelihood function and its
+        gradient with respect to log10(theta), the last component being the
+        noise hyperparameter when eval_noise is used.
+
+        The derivative of [R] with respect to theta_k is the Kronecker product
+        of the correlation matrices of the axes, the k-th one being replaced by
+        its derivative: the traces and quadratic forms are computed with the
+        eigendecompositions of _reduced_likelihood_function in O(nt sum_k n_k)
+        operations per hyperparameter.
+
+        Parameters
+        ----------
+        theta: list(dim)
+            - An array containing the autocorrelation parameters at which the
+              Gaussian Process model parameters should be determined.
+
+        Returns
+        -------
+        reduced_likelihood_function_value: real
+            - The value of the reduced likelihood function associated to the
+              given autocorrelation parameters theta.
+
+        grad: np.ndarray[len(theta)]
+            - The gradient of the reduced likelihood function with respect to
+              log10(theta).
+
+        par: dict()
+            - A dictionary containing the requested Gaussian Process model
+              parameters (see _reduced_likelihood_function).
+        """
+        reduced_likelihood_function_value, par = \
+            self._reduced_likelihood_function(theta)
+        grad = np.zeros(len(theta))
+        if not par:
+            return reduced_likelihood_function_value, grad, par
+
+        theta = np.array(theta, dtype=float)
+        noise = 0.
+        if self.options['eval_noise']:
+            noise = theta[-1]
+            theta = theta[:-1]
+
+        U, Lambda, gamma = par['U'], par['Lambda'], par['gamma']
+        sigma2 = par['sigma2'] / self.y_std ** 2.
+        # sigma2_mean is the geometric mean of the output variances
+        sigma2_mean = self._shared_variance(sigma2)
+        gamma_w = gamma * self._shared_variance_weights(sigma2)
+        Lambda_inv = 1. / Lambda[:, np.newaxis]
+
+        R_axes, dR_axes = [], []
+        for k in range(self.nx):
+            axis = self._normalized_axis(k)
+            d = self._axis_distance(axis, k)
+            R_k = self.options['corr'](theta, d).reshape(axis.shape[0], -1)
+            R_axes.append(R_k)
+            # dR_k / dlog10(theta_k) = - ln(10) * theta_k * D_k * R_k
+            dR_axes.append(- np.log(10.) * theta[k] * d[:, k].reshape(R_k.shape) * R_k)
+
+        trace, quad = np.zeros(len(theta)), np.zeros(len(theta))
+        for k in range(self.nx):
+            factors = list(R_axes)
+            factors[k] = dR_axes[k]
+            # tr(R^-1 dR) from the diagonal terms of U^T dR U, Kronecker product
+            # of the diagonals of the U_k^T dR_k U_k
+            diags = [(U_k * np.dot(A, U_k)).sum(axis=0)[np.newaxis, :]
+                     for U_k, A in zip(U, factors)]
+            trace[k] = kronecker_rows_dot(diags, Lambda_inv)[0, 0]
+            quad[k] = (gamma_w * kronecker_product_dot(factors, gamma)).sum()
+        if self.options['eval_noise']:
+            # dR / dlog10(noise) = ln(10) * noise * I
+            trace = np.append(trace, np.log(10.) * noise * Lambda_inv.sum())
+            quad = np.append(quad, np.log(10.) * noise * (gamma_w * gamma).sum())
+
+        detR = np.exp(np.log(Lambda).mean())
+        grad = detR / self.nt * (quad - sigma2_mean * trace)
+
+        return reduced_likelihood_function_value, grad, par
+
+    def _loo_errors(self, par):
+        """
+        Leave-one-out errors of the normalized outputs for the parameters par
+        of _reduced_likelihood_function, in the order of the training points.
+        """
+        # diag([R]^-1) = (U_1**2 x ... x U_d**2) Lambda^-1
+        diag_Rinv = kronecker_product_dot([U_k ** 2. for U_k in par['U']],
+                                          1. / par['Lambda'][:, np.newaxis])[:, 0]
+
+        # G^T G = F^T [R]^-1 F
+        W = linalg.solve_triangular(par['G'], par['RinvF'].T, trans='T')
+        Q_diag = diag_Rinv - (W ** 2.).sum(axis=0)
+
+        return (par['gamma'] / Q_diag[:, np.newaxis])[self._grid_index]
+
+    def _grid_derivatives(self, x, r, kx):
+        """
+        Evaluates the derivatives with respect to the kx-th input variable at a
+        set of normalized points from their correlations r with the axes.
+        """
+        if self.options['corr'].__name__ != 'squar_exp':
+            raise ValueError(
+            'The derivative is only available for square exponential kernel')
+
+        par = self.optimal_par
+        df_dx = self._trend_derivatives(par['beta'], kx)
+        # dr_k / dx_k = - 2 theta_k (x_k - xt_k) r_k
+        dr = list(r)
+        dr[kx] = -2. * self.optimal_theta[kx] * \
+            np.subtract.outer(x[:, kx], self._normalized_axis(kx)) * r[kx]
+        return (df_dx + kronecker_rows_dot(dr, par['gamma'])) * self.y_std / self.X_std[kx]
+
+    def _predict_all(self, x, variances, gradients):
+        # Initialization
+        x = (x - self.X_mean) / self.X_std
+        r = [self._axis_correlation(x[:, k], k, self.optimal_theta) for k in range(self.nx)]
+        par = self.optimal_par
+
+        # Scaled predictor
+        y_ = np.dot(self.options['poly'](x), par['beta']) + kronecker_rows_dot(r, par['gamma'])
+        y = (self.y_mean + self.y_std * y_).ravel()
+        s2 = dy_dx = None
+        if variances:
+            # r R^-1 r^T = sum (U^T r^T)^2 / Lambda, U^T r^T being the Kronecker
+            # product of the U_k^T r_k^T
+            rt = [np.dot(r_k, U_k) ** 2. for r_k, U_k in zip(r, par['U'])]
+            rRr = kronecker_rows_dot(rt, 1. / par['Lambda'][:, np.newaxis])[:, 0]
+            u = linalg.solve_triangular(par['G'].T, kronecker_rows_dot(r, par['RinvF']).T -
+                                        self.options['poly'](x).T, lower=True)
+
+            s2 = np.outer(1.-rRr+(u ** 2.).sum(axis=0), par['sigma2'])
+            # Mean Squared Error might be slightly negative depending on
+            # machine precision: force to zero!
+            s2[s2 < 0.] = 0.
+        if gradients:
+            dy_dx = np.empty((x.shape[0], self.nx, self.ny))
+            for kx in range(self.nx):
+                dy_dx[:, kx, :] = self._grid_derivatives(x, r, kx)
+
+        return y, s2, dy_dx
+
+    def _predict_values(self, x):
+        """
+        Evaluates the model at a set of points, in O(nt) operations per point
+        without forming the correlation with the training points.
+
+        Arguments
+        ---------
+        x : np.ndarray [n_evals, dim]
+            Evaluation point input variable values
+
+        Returns
+        -------
+        y : np.ndarray
+            Evaluation point output variable values
+        """
+        return self._predict_all(x, False, False)[0]
+
+    def _predict_derivatives(self, x, kx):
+        """
+        Evaluates the derivatives at a set of points.
+
+        Arguments
+        ---------
+        x : np.ndarray [n_evals, dim]
+            Evaluation point input variable values
+        kx : int
+            The 0-based index of the input variable with respect to which derivatives are desired.
+
+        Returns
+        -------
+        y : np.ndarray
+            Derivative values.
+        """
+        # Initialization
+        x = (x - self.X_mean) / self.X_std
+        r = [self._axis_correlation(x[:, k], k, self.optimal_theta) for k in range(self.nx)]
+
+        return self._grid_derivatives(x, r, kx)
+
+    def _predict_variances(self, x):
+        return self._predict_all(x, True, False)[1]
@@ -9,6 +9,7 @@ from __future__ import division
 
 import numpy as np
 from scipy.sparse import csc_matrix
+from scipy.spatial.distance import cdist
 from smt.surrogate_models.surrogate_model import SurrogateModel
 from smt.utils.caching import cached_operation
 
@@ -76,6 +77,29 @@ class IDW(SurrogateModel):
                 self._new_train()
                 #outputs['sol'] = self.sol
 
+    def compute_loo_errors(self):
+        """
+        Compute the leave-one-out cross-validation errors at the training points.
+
+        The error at the i-th training point is the difference between its output
+        and the prediction of the model without it, the weighted mean of the other
+        outputs with the weights ||x_i - x_j||^-p. A ValueError is raised if two
+        training points have the same inputs, their weights being infinite.
+
+        Returns
+        -------
+        errors : np.ndarray[nt, ny]
+            The leave-one-out errors y_i - y_-i(x_i).
+        """
+        xt, yt = self.training_points[None][0]
+        r2 = cdist(xt, xt, 'sqeuclidean')
+        np.fill_diagonal(r2, np.inf)
+        if np.any(r2 == 0.):
+            raise ValueError('The leave-one-out errors are not defined for repeated '
+                             'training inputs')
+        w = r2 ** (-self.options['p'] / 2.)
+        return yt - w.dot(yt) / np.sum(w, axis=1)[:, np.newaxis]
+
     def _predict_values(self,x):
         """
         This function is used by _predict function. See _predict for more details.
@@ -7,6 +7,7 @@ This package is distributed under New BSD license.
 from __future__ import division
 import warnings
 import numpy as np
+from types import FunctionType
 
 from smt.surrogate_models.krg_based import KrgBased
 from smt.utils.kriging_utils import componentwise_distance
@@ -21,6 +22,11 @@ class KRG(KrgBased):
         super(KRG, self)._initialize()
         declare = self.options.declare
         declare('theta0', None, types=(list, np.ndarray), desc='Initial hyperparameters')
+        # The compactly supported correlation functions need the componentwise
+        # distances of the input variables
+        declare('corr', 'squar_exp', types=FunctionType,
+                values=('abs_exp', 'squar_exp', 'wendland_c2', 'wendland_c4'),
+                desc='type of corr. func.')
         self.name = 'Kriging'
 
     def _componentwise_distance(self,dx,opt=0):
@@ -16,17 +16,26 @@ TODO:
 
 from __future__ import division
 import warnings
+import copy
 warnings.filterwarnings("ignore")
 
+import sys
+import multiprocessing
 import numpy as np
-from scipy import linalg, optimize
+from scipy import linalg, optimize, sparse
+from scipy.sparse.linalg import splu
 from types import FunctionType
 from smt.utils.caching import cached_operation
 
 from smt.surrogate_models.surrogate_model import SurrogateModel
+from smt.utils.checks import check_support, check_nx, check_2d_array
 from sklearn.metrics.pairwise import manhattan_distances
 from sklearn.gaussian_process.regression_models import constant, linear, quadratic
-from smt.utils.kriging_utils import abs_exp, squar_exp, standardization, l1_cross_distances
+from smt.utils.kriging_utils import abs_exp, squar_exp, wendland_c2, wendland_c4, \
+    standardization, l1_cross_distances, lower_correlation_matrix, correlation_pair_sums, \
+    compact_correlation_pairs
+
+from smt.sampling_methods import LHS
 
 from scipy.optimize import minimize
 """
@@ -34,6 +43,21 @@ The kriging class.
 
 """
 
+# Model read by the forked processes of the multi-start hyperparameter search
+_pool_model = None
+
+def _hyperparam_search_start(args, model=None):
+    """
+    Runs one start of the multi-start hyperparameter search and returns the
+    optimum with its likelihood and the best evaluation made along the way.
+    """
+    if model is None:
+        model = _pool_model
+    optimal_theta = model._local_hyperparam_search(*args)
+    rlf_value = model._reduced_likelihood_function(theta=optimal_theta)[0]
+    return optimal_theta, rlf_value, model.best_iteration_fail, model._thetaMemory
+
+
 class KrgBased(SurrogateModel):
 
     _regression_types = {
@@ -43,16 +67,21 @@ class KrgBased(SurrogateModel):
 
     _correlation_types = {
         'abs_exp': abs_exp,
-        'squar_exp': squar_exp        
+        'squar_exp': squar_exp,
+        'wendland_c2': wendland_c2,
+        'wendland_c4': wendland_c4
         }
 
+    # Correlation functions with a compact support, for which [R] is sparse
+    _compact_correlation_types = ['wendland_c2', 'wendland_c4']
+
     def _initialize(self):
         super(KrgBased, self)._initialize()
         declare = self.options.declare
         supports = self.supports
         declare('poly', 'constant',types=FunctionType,values=('constant', 'linear', 'quadratic'),
                 desc='regr. term')
-        declare('corr', 'squar_exp', types=FunctionType,values=('abs_exp', 'squar_exp'),
+        declare('corr', 'squar_exp', types=FunctionType, values=('abs_exp', 'squar_exp'),
                 desc='type of corr. func.')
         declare('data_dir', values=None, types=str,
                 desc='Directory for loading / saving cached data; None means do not save or load')
@@ -60,7 +89,42 @@ class KrgBased(SurrogateModel):
                 values = (True, False), desc ='noise evaluation flag')
         declare('noise0', 1e-6, types = float, \
                 desc ='Initial noise hyperparameter')
+        declare('hyper_opt', 'Cobyla', values=('Cobyla', 'L-BFGS-B'),
+                desc='Optimizer used for the hyperparameters: COBYLA or L-BFGS-B '
+                'using the analytic gradient of the likelihood')
+        declare('n_start', 1, types=int,
+                desc='Number of starting points of the hyperparameter optimization, '
+                'the additional ones being drawn from a LHS design')
+        declare('n_jobs', 1, types=int,
+                desc='Number of processes running the starts of the hyperparameter '
+                'optimization; -1 means all the processors')
+        declare('seed', 0, types=int,
+                desc='Seed of the random numbers drawn by the training, such as the '
+                'starting points of the hyperparameter optimization')
+        declare('low_memory', False, types=bool, values=(True, False),
+                desc='Build the correlation matrix by blocks from the training points '
+                'instead of storing their componentwise cross-distances')
+        declare('shared_theta', True, types=bool, values=(True, False),
+                desc='With several outputs, share the hyperparameters and one factorization '
+                'of the correlation matrix between the outputs; otherwise each output '
+                'has its own hyperparameters')
+        declare('hyperparameters', None, types=dict,
+                desc='Hyperparameters of a trained model, as returned by get_hyperparameters, '
+                'used as starting point of the optimization instead of theta0 and noise0')
+        declare('optimize_theta', True, types=bool, values=(True, False),
+                desc='Whether the hyperparameters are optimized; otherwise the model is '
+                'trained with the hyperparameters of the starting point')
+        declare('precision', 'double', types=str, values=('double', 'mixed'),
+                desc='Precision of the likelihood evaluations of the hyperparameter search: '
+                'double, or single with a larger nugget polished in double precision '
+                '(mixed), the model being always computed in double precision')
         self.best_iteration_fail = None
+        # Whether the failed factorizations of the correlation matrix are printed
+        self._print_failures = True
+        # Whether each output has its own hyperparameters, optimal_par being then
+        # the list of the parameters of the outputs
+        self.output_hyperparameters = False
+        self._likelihood_dtype = np.double
         self.nb_ill_matrix = 5
         supports['derivatives'] = True
         supports['variances'] = True
@@ -89,9 +153,21 @@ class KrgBased(SurrogateModel):
             self.y_std = standardization(X,y)
             
         # Calculate matrix of distances D between samples
-        D, self.ij = l1_cross_distances(self.X_norma)
-        if (np.min(np.sum(D, axis=1)) == 0.):
-            raise Exception("Multiple input features cannot have the same value.")
+        if self.name in ['SGP', 'GridKRG']:
+            # The inducing points approximation and the Kronecker factorization
+            # of the grids never form the nt x nt matrix R
+            D, self.ij = None, None
+        elif self.options['low_memory'] or self._compact_correlation():
+            # R is built from X_norma at each likelihood evaluation, as a sparse
+            # matrix for the compactly supported correlation functions
+            D, self.ij = None, None
+            X_sorted = self.X_norma[np.lexsort(self.X_norma.T)]
+            if np.any(np.all(X_sorted[1:] == X_sorted[:-1], axis=1)):
+                raise Exception("Multiple input features cannot have the same value.")
+        else:
+            D, self.ij = l1_cross_distances(self.X_norma)
+            if (np.min(np.sum(D, axis=1)) == 0.):
+                raise Exception("Multiple input features cannot have the same value.")
 
         # Regression matrix and parameters
         self.F = self.options['poly'](self.X_norma)
@@ -103,11 +179,54 @@ class KrgBased(SurrogateModel):
         self._check_F(n_samples_F,p)
 
         # Optimization
-        self.optimal_rlf_value, self.optimal_par, self.optimal_theta = \
-                self._optimize_hyperparam(D)
+        self.output_hyperparameters = not self.options['shared_theta'] and self.ny > 1
+        if not self.output_hyperparameters:
+            # All the outputs are solved as a block right-hand side
+            self.optimal_rlf_value, self.optimal_par, self.optimal_theta = \
+                    self._optimize_hyperparam(D)
+        else:
+            # One set of hyperparameters per output, the distances and the
+            # regression matrix being shared
+            y_norma, y_std = self.y_norma, self.y_std
+            hyperparameters = self.options['hyperparameters']
+            outputs = []
+            try:
+                for k in range(self.ny):
+                    self.y_norma, self.y_std = y_norma[:, [k]], y_std[[k]]
+                    if hyperparameters is not None:
+                        noise = hyperparameters['noise']
+                        self.options['hyperparameters'] = dict(hyperparameters,
+                            theta=hyperparameters['theta'][k],
+                            noise=noise[k] if noise is not None else None)
+                    outputs.append(self._optimize_hyperparam(D))
+            finally:
+                self.y_norma, self.y_std = y_norma, y_std
+                if hyperparameters is not None:
+                    self.options['hyperparameters'] = hyperparameters
+            self.optimal_rlf_value = np.array([output[0] for output in outputs])
+            self.optimal_par = [output[1] for output in outputs]
+            self.optimal_theta = np.array([output[2] for output in outputs])
+        self.optimal_noise = 0.
         if self.options['eval_noise']:
-            self.optimal_theta = self.optimal_theta[:-1]
+            self.optimal_noise = self.optimal_theta[..., -1]
+            self.optimal_theta = self.optimal_theta[..., :-1]
         del self.y_norma, self.D
+        self._r_pairs = None
+
+        if self.output_hyperparameters:
+            # A single output model per output, sharing the training data,
+            # evaluates the predictions of this output
+            output_models = []
+            for k in range(self.ny):
+                output_model = copy.copy(self)
+                output_model.output_hyperparameters = False
+                output_model.y_mean, output_model.y_std = self.y_mean[[k]], self.y_std[[k]]
+                output_model.optimal_par = self.optimal_par[k]
+                output_model.optimal_theta = self.optimal_theta[k]
+                if self.options['eval_noise']:
+                    output_model.optimal_noise = self.optimal_noise[k]
+                output_models.append(output_model)
+            self._output_models = output_models
 
     def _train(self):
         """
@@ -124,6 +243,189 @@ class KrgBased(SurrogateModel):
         """
         self._new_train()
 
+    def add_training_points(self, x_new, y_new, reoptimize=False):
+        """
+        Add training points to a trained model.
+
+        With the hyperparameters kept fixed, the Cholesky decomposition of [R] and
+        the QR decomposition of Ft are extended by blocks, in O(nt^2 k) operations
+        for k new points. The normalization of the inputs and outputs is kept.
+
+        Parameters
+        ----------
+        x_new : np.ndarray[k, nx] or np.ndarray[k]
+            The input values of the new training points.
+        y_new : np.ndarray[k, ny] or np.ndarray[k]
+            The output values of the new training points.
+        reoptimize : bool
+            If True, the model is retrained from scratch on all the training points,
+            hyperparameters included.
+        """
+        if self.name in ['GEKPLS', 'GEK', 'SGP', 'LocalKRG', 'GridKRG']:
+            raise ValueError('add_training_points is not available for %s' % self.name)
+        if self._compact_correlation():
+            raise ValueError('add_training_points is not available for the compactly '
+                             'supported correlation functions')
+        if self.output_hyperparameters:
+            raise ValueError('add_training_points is not available for outputs '
+                             'with their own hyperparameters')
+
+        x_new = check_2d_array(x_new, 'x_new')
+        y_new = check_2d_array(y_new, 'y_new')
+        check_nx(self.nx, x_new)
+        if x_new.shape[0] != y_new.shape[0]:
+            raise ValueError('the first dimension of x_new and y_new must have the same length')
+
+        xt, yt = self.training_points[None][0]
+        xt = np.vstack((xt, x_new))
+        yt = np.vstack((yt, y_new))
+
+        if reoptimize:
+            self.set_training_values(xt, yt)
+            self.train()
+            return
+
+        X2 = (x_new - self.X_mean) / self.X_std
+        y2 = (y_new - self.y_mean) / self.y_std
+        F2 = self.options['poly'](X2)
+
+        self.nt += x_new.shape[0]
+        self.optimal_rlf_value, self.optimal_par = self._extend_factorization(
+            self.optimal_par, self.X_norma, X2, F2, y2, self.optimal_theta, self.optimal_noise)
+
+        self.X_norma = np.vstack((self.X_norma, X2))
+        self.F = np.vstack((self.F, F2))
+        self.training_points[None][0] = [xt, yt]
+
+    def _extend_factorization(self, par, X, X_new, F_new, y_new, theta, noise=0.):
+        """
+        Extend the parameters par of _reduced_likelihood_function to new training
+        points, the hyperparameters being kept: the Cholesky decomposition of [R] and
+        the QR decomposition of Ft are extended by blocks, in O(nt^2 k) operations for
+        k new points.
+
+        Parameters
+        ----------
+        par : dict
+            The parameters of the training points X.
+        X : np.ndarray[nt, nx]
+            The normalized input values of the training points.
+        X_new : np.ndarray[k, nx]
+            The normalized input values of the new training points.
+        F_new : np.ndarray[k, p]
+            The regression matrix of the new training points.
+        y_new : np.ndarray[k, ny]
+            The normalized output values of the new training points.
+        theta : np.ndarray
+            The autocorrelation parameters.
+        noise : float
+            The noise variance.
+
+        Returns
+        -------
+        reduced_likelihood_function_value : float
+            The value of the reduced likelihood function, self.nt being the number of
+            training points including the new ones.
+        par : dict
+            The parameters of all the training points.
+        """
+        nt, k = X.shape[0], X_new.shape[0]
+        C11, Ft1, G, beta = par['C'], par['Ft'], par['G'], par['beta']
+
+        # Correlation blocks between the old and the new points, with the nugget
+        # of _reduced_likelihood_function
+        nugget = 10. * np.finfo(np.double).eps
+        if self.name == 'MFK':
+            nugget *= 10.
+        R21 = self._correlation_vector(X_new, X, theta)
+        R22 = self._correlation_vector(X_new, X_new, theta) + np.eye(k) * (nugget + noise)
+
+        # Block Cholesky decomposition: C21 = R21 C11^-T, C22 C22^T = R22 - C21 C21^T
+        C21 = linalg.solve_triangular(C11, R21.T, lower=True).T
+        C22 = linalg.cholesky(R22 - np.dot(C21, C21.T), lower=True)
+
+        # Solutions of C Ft = F and C Yt = y on the new rows
+        Yt1 = np.dot(Ft1, beta) + np.dot(C11.T, par['gamma'])
+        Ft2 = linalg.solve_triangular(C22, F_new - np.dot(C21, Ft1), lower=True)
+        Yt2 = linalg.solve_triangular(C22, y_new - np.dot(C21, Yt1), lower=True)
+
+        # QR update: Q1^T Yt1 = G beta since the residual is orthogonal to Ft1
+        p = G.shape[1]
+        M = np.vstack((np.hstack((G, np.dot(G, beta))), np.hstack((Ft2, Yt2))))
+        M = linalg.qr(M, mode='r')[0]
+        G = M[:p, :p]
+        beta = linalg.solve_triangular(G, M[:p, p:])
+
+        C = np.zeros((nt + k, nt + k))
+        C[:nt, :nt] = C11
+        C[nt:, :nt] = C21
+        C[nt:, nt:] = C22
+        Ft = np.vstack((Ft1, Ft2))
+        Yt = np.vstack((Yt1, Yt2))
+        rho = Yt - np.dot(Ft, beta)
+
+        detR = (np.diag(C) ** (2. / self.nt)).prod()
+        sigma2, reduced_likelihood_function_value = self._concentrated_likelihood(rho, detR)
+        par = {
+            'sigma2': sigma2 * self.y_std ** 2.,
+            'beta': beta,
+            'gamma': linalg.solve_triangular(C.T, rho),
+            'C': C,
+            'Ft': Ft,
+            'G': G,
+        }
+        return reduced_likelihood_function_value, par
+
+    def compute_loo_errors(self):
+        """
+        Compute the leave-one-out cross-validation errors at the training points.
+
+        The error at the i-th training point is the difference between its output
+        and the prediction of the model trained without it, the hyperparameters
+        being kept. With Q = [R]^-1 - [R]^-1 F (F^T [R]^-1 F)^-1 F^T [R]^-1, it is
+        (Q y)_i / Q_ii (Dubrule formula), computed from the factorization of [R]
+        without retraining. The diagonal of [R]^-1 requires the inverse of its
+        Cholesky factor: the cost is O(nt^3) operations, as for one training
+        factorization, and O(nt^2) memory.
+
+        Returns
+        -------
+        errors : np.ndarray[nt, ny]
+            The leave-one-out errors y_i - y_-i(x_i).
+        """
+        if self.name in ['GEKPLS', 'GEK', 'MFK', 'MFKPLS', 'MFKPLSK', 'SGP', 'LocalKRG']:
+            raise ValueError('compute_loo_errors is not available for %s' % self.name)
+
+        if self.output_hyperparameters:
+            errors = np.hstack([self._loo_errors(par) for par in self.optimal_par])
+        else:
+            errors = self._loo_errors(self.optimal_par)
+        return errors * self.y_std
+
+    def _loo_errors(self, par):
+        """
+        Leave-one-out errors of the normalized outputs for the parameters par
+        of _reduced_likelihood_function.
+        """
+        nt = self.F.shape[0]
+        if self._compact_correlation():
+            Rinv = par['C'].solve(np.eye(nt))
+            diag_Rinv = np.diag(Rinv)
+            FtRinv = self.F.T.dot(Rinv)
+        else:
+            # [R]^-1 = C^-T C^-1 and F^T [R]^-1 = Ft^T C^-1, the inverse of C
+            # costing O(nt^3) operations
+            Cinv = linalg.solve_triangular(par['C'], np.eye(nt), lower=True)
+            diag_Rinv = (Cinv ** 2.).sum(axis=0)
+            FtRinv = par['Ft'].T.dot(Cinv)
+
+        # G^T G = F^T [R]^-1 F for both factorizations
+        W = linalg.solve_triangular(par['G'], FtRinv, trans='T')
+        Q_diag = diag_Rinv - (W ** 2.).sum(axis=0)
+
+        # gamma = Q y = [R]^-1 (y - F beta)
+        return par['gamma'] / Q_diag[:, np.newaxis]
+
     def _reduced_likelihood_function(self, theta):
 
         """
@@ -165,12 +467,19 @@ class KrgBased(SurrogateModel):
             G
             QR decomposition of the matrix Ft.
         """
+        if self._compact_correlation():
+            return self._sparse_reduced_likelihood_function(theta)
+
         # Initialize output
         reduced_likelihood_function_value = - np.inf
         par = {}
-        # Set up R
-        MACHINE_EPSILON = np.finfo(np.double).eps
+        # Set up R, in single precision during the search of the mixed precision
+        dtype = self._likelihood_dtype
+        MACHINE_EPSILON = np.finfo(dtype).eps
         nugget = 10.*MACHINE_EPSILON
+        if dtype != np.double:
+            # Single precision can only factorize better conditioned matrices
+            nugget = 100.*MACHINE_EPSILON
         if self.name == 'MFK':
             if self._lvl != self.nlvl:
                 # in the case of multi-fidelity optimization
@@ -183,21 +492,28 @@ class KrgBased(SurrogateModel):
             theta = tmp_var[:-1]
             noise = tmp_var[-1]
     
-        r = self.options['corr'](theta, self.D).reshape(-1,1)
-        
-        R = np.eye(self.nt) * (1. + nugget+ noise)
-        R[self.ij[:, 0], self.ij[:, 1]] = r[:,0]
-        R[self.ij[:, 1], self.ij[:, 0]] = r[:,0]
+        if self.D is None:
+            # Lower triangle of R built by blocks, factorized in place
+            R = lower_correlation_matrix(self.X_norma, self._corr_map.dot(theta),
+                self.options['corr'].__name__, 1. + nugget + noise)
+        else:
+            r = self._pair_correlation(theta)
+
+            R = np.eye(self.nt, dtype=dtype)
+            R *= 1. + nugget + noise
+            R[self.ij[:, 0], self.ij[:, 1]] = r[:,0]
+            R[self.ij[:, 1], self.ij[:, 0]] = r[:,0]
         
         # Cholesky decomposition of R
         try:            
-            C = linalg.cholesky(R, lower=True)
+            C = linalg.cholesky(R, lower=True, overwrite_a=self.D is None)
         except (linalg.LinAlgError, ValueError) as e:
-            print "exception : ", e
+            if dtype == np.double and self._print_failures:
+                print "exception : ", e
             return reduced_likelihood_function_value, par
         
         # Get generalized least squares solution
-        Ft = linalg.solve_triangular(C, self.F, lower=True)
+        Ft = linalg.solve_triangular(C, self.F.astype(dtype, copy=False), lower=True)
         Q, G = linalg.qr(Ft, mode='economic')
         sv = linalg.svd(G, compute_uv=False)
         rcondG = sv[-1] / sv[0]
@@ -213,170 +529,919 @@ class KrgBased(SurrogateModel):
                 # Ft is too ill conditioned, get out (try different theta)
                 return reduced_likelihood_function_value, par
         
-        Yt = linalg.solve_triangular(C, self.y_norma, lower=True)
+        Yt = linalg.solve_triangular(C, self.y_norma.astype(dtype, copy=False), lower=True)
         beta = linalg.solve_triangular(G, np.dot(Q.T, Yt))
         rho = Yt - np.dot(Ft, beta)        
 
         # The determinant of R is equal to the squared product of the diagonal
         # elements of its Cholesky decomposition C
-        detR = (np.diag(C) ** (2. / self.nt)).prod()
+        detR = (np.diag(C).astype(np.double) ** (2. / self.nt)).prod()
 
         # Compute/Organize output
+        sigma2, reduced_likelihood_function_value = self._concentrated_likelihood(rho, detR)
+        par['sigma2'] = sigma2 * self.y_std ** 2.
+        par['beta'] = beta
+        par['gamma'] = linalg.solve_triangular(C.T, rho)
+        par['C'] = C
+        par['Ft'] = Ft
+        par['G'] = G
+
+        # A particular case when f_min_cobyla fail, the single precision values
+        # of the mixed precision search being not comparable to the others
+        if dtype == np.double:
+            self._update_best_iteration(reduced_likelihood_function_value, tmp_var)
+
+        return reduced_likelihood_function_value, par
+
+    def _concentrated_likelihood(self, rho, detR):
+        """
+        Process variance and value of the reduced likelihood function for the
+        residuals rho = C^-1 (y - F beta), detR being det([R])^(1/nt).
+        """
         if self.name in ['MFK', 'MFKPLS']:
             n_samples = self.nt
             p = self.p
             q = self.q
-            sigma2 = (rho ** 2.).sum(axis=0) /(n_samples - p - q)
+            sigma2 = (rho.astype(np.double) ** 2.).sum(axis=0) /(n_samples - p - q)
             reduced_likelihood_function_value = -(n_samples - p - q)*np.log10(sigma2) \
                     - n_samples*np.log10(detR)
         else:
-            sigma2 = (rho ** 2.).sum(axis=0) / (self.nt)
-            reduced_likelihood_function_value = - sigma2.sum() * detR
+            # Concentrated likelihood of the outputs, which share [R]
+            sigma2 = (rho.astype(np.double) ** 2.).sum(axis=0) / (self.nt)
+            reduced_likelihood_function_value = - self._shared_variance(sigma2) * detR
+        return sigma2, reduced_likelihood_function_value
+
+    def _shared_variance(self, sigma2):
+        """
+        Geometric mean of the variances sigma2 of the outputs sharing [R], used in
+        the concentrated likelihood. The outputs fitted exactly, such as constant
+        outputs, are excluded: their zero variances would cancel the likelihood
+        whatever the hyperparameters.
+        """
+        varying = self._varying_outputs(sigma2)
+        return np.exp(np.log(sigma2[varying]).mean())
+
+    def _shared_variance_weights(self, sigma2):
+        """
+        Derivatives of _shared_variance with respect to the variances sigma2, zero
+        for the excluded outputs.
+        """
+        varying = self._varying_outputs(sigma2)
+        weights = np.zeros(sigma2.shape)
+        weights[varying] = self._shared_variance(sigma2) / (varying.sum() * sigma2[varying])
+        return weights
+
+    def _varying_outputs(self, sigma2):
+        """
+        Mask of the outputs whose variance is above the machine precision, all the
+        outputs being kept when none of them is.
+        """
+        varying = sigma2 > np.finfo(np.double).eps
+        if not varying.any():
+            varying[:] = True
+        return varying
+
+    def _sparse_reduced_likelihood_function(self, theta):
+
+        """
+        This function determines the BLUP parameters and evaluates the reduced
+        likelihood function for the given autocorrelation parameters theta,
+        with a compactly supported correlation function: [R] is assembled as a
+        sparse matrix from the pairs of training points within the support and
+        factorized by a sparse LU decomposition, so that the cost scales with
+        the number of nonzero terms of [R] instead of nt^2.
+
+        Parameters
+        ----------
+        theta: list(n_comp), optional
+            - An array containing the autocorrelation parameters at which the
+              Gaussian Process model parameters should be determined.
+
+        Returns
+        -------
+        reduced_likelihood_function_value: real
+            - The value of the reduced likelihood function associated to the
+              given autocorrelation parameters theta.
+
+        par: dict()
+            - A dictionary containing the requested Gaussian Process model
+              parameters:
+
+            sigma2
+            Gaussian Process variance.
+            beta
+            Generalized least-squares regression weights.
+            gamma
+            Gaussian Process weights.
+            C
+            Sparse LU decomposition of the correlation matrix [R].
+            G
+            Cholesky decomposition of F^T [R]^-1 F.
+        """
+        # Initialize output
+        reduced_likelihood_function_value = - np.inf
+        par = {}
+        MACHINE_EPSILON = np.finfo(np.double).eps
+        nugget = 10.*MACHINE_EPSILON
+        noise = 0.
+        tmp_var = theta
+        if self.options['eval_noise']:
+            theta = tmp_var[:-1]
+            noise = tmp_var[-1]
+
+        R = self._sparse_correlation_matrix(self.X_norma, None, theta, 1. + nugget + noise)
+
+        # Symmetric ordering and diagonal pivots: the pivots are positive if
+        # and only if [R] is positive definite
+        try:
+            C = splu(R, permc_spec='MMD_AT_PLUS_A', diag_pivot_thresh=0.,
+                     options=dict(Equil=False, SymmetricMode=True))
+        except RuntimeError as e:
+            if self._print_failures:
+                print "exception : ", e
+            return reduced_likelihood_function_value, par
+        pivots = C.U.diagonal()
+        if np.any(pivots <= 0.):
+            return reduced_likelihood_function_value, par
+
+        # Get generalized least squares solution
+        RinvF = C.solve(self.F)
+        try:
+            G = linalg.cholesky(np.dot(self.F.T, RinvF))
+        except (linalg.LinAlgError, ValueError):
+            return reduced_likelihood_function_value, par
+        sv = linalg.svd(G, compute_uv=False)
+        rcondG = sv[-1] / sv[0]
+        if rcondG < 1e-10:
+            # Check F
+            sv = linalg.svd(self.F, compute_uv=False)
+            condF = sv[0] / sv[-1]
+            if condF > 1e15:
+                raise Exception("F is too ill conditioned. Poor combination "
+                                "of regression model and observations.")
+
+            else:
+                # Ft is too ill conditioned, get out (try different theta)
+                return reduced_likelihood_function_value, par
+
+        beta = linalg.cho_solve((G, False), np.dot(RinvF.T, self.y_norma))
+        rho = self.y_norma - np.dot(self.F, beta)
+        gamma = C.solve(rho)
+
+        # The determinant of R is the product of the pivots
+        detR = np.exp(np.log(pivots).sum() / self.nt)
+
+        # Compute/Organize output
+        sigma2 = (rho * gamma).sum(axis=0) / self.nt
+        reduced_likelihood_function_value = - self._shared_variance(sigma2) * detR
         par['sigma2'] = sigma2 * self.y_std ** 2.
         par['beta'] = beta
-        par['gamma'] = linalg.solve_triangular(C.T, rho)
+        par['gamma'] = gamma
         par['C'] = C
-        par['Ft'] = Ft
         par['G'] = G
 
         # A particular case when f_min_cobyla fail
+        self._update_best_iteration(reduced_likelihood_function_value, tmp_var)
+
+        return reduced_likelihood_function_value, par
+
+    def _update_best_iteration(self, reduced_likelihood_function_value, theta):
+
+        """
+        Keeps track of the best likelihood evaluated by the hyperparameter
+        optimization and of its hyperparameters.
+        """
         if (self.best_iteration_fail is not None) and \
             (not np.isinf(reduced_likelihood_function_value)):
 
             if (reduced_likelihood_function_value >  self.best_iteration_fail):
                  self.best_iteration_fail = reduced_likelihood_function_value
-                 self._thetaMemory = np.array(tmp_var)
+                 self._thetaMemory = np.array(theta)
 
         elif (self.best_iteration_fail is None) and \
             (not np.isinf(reduced_likelihood_function_value)):
              self.best_iteration_fail = reduced_likelihood_function_value
-             self._thetaMemory = np.array(tmp_var)
+             self._thetaMemory = np.array(theta)
+
+    def _pair_correlation(self, theta):
 
-        return reduced_likelihood_function_value, par
-    
-    def _predict_values(self, x):
         """
-        Evaluates the model at a set of points.
+        Correlation of the pairs of training points self.ij from the
+        componentwise distances self.D, written into a buffer reused between
+        the likelihood evaluations.
+        """
+        if getattr(self, '_r_pairs', None) is None or \
+                self._r_pairs.shape[0] != self.D.shape[0]:
+            self._r_pairs = np.empty((self.D.shape[0], 1))
+        return self.options['corr'](theta, self.D, out=self._r_pairs)
+
+    def _compact_correlation(self):
+        """
+        Whether the correlation function has a compact support.
+        """
+        corr = self.options['corr']
+        if callable(corr):
+            corr = corr.__name__
+        return corr in self._compact_correlation_types
+
+    def _sparse_correlation_matrix(self, x, xt, theta, diag=None):
+        """
+        Evaluates the correlation between two sets of points with a compactly
+        supported correlation function, as a sparse matrix.
 
         Arguments
         ---------
         x : np.ndarray [n_evals, dim]
-            Evaluation point input variable values
+            Normalized evaluation point input variable values
+        xt : np.ndarray [nt, dim] or None
+            Normalized training point input variable values. The correlation
+            matrix of x is computed if None.
+        theta : np.ndarray
+            Hyperparameters of the correlation function
+        diag : real
+            The value of the diagonal terms of the correlation matrix of x
+            (1 + nugget + noise), only used if xt is None.
 
         Returns
         -------
-        y : np.ndarray
-            Evaluation point output variable values
+        r : scipy.sparse.csc_matrix [n_evals, nt or n_evals]
+            Correlation between the points
         """
-        # Initialization
-        n_eval, n_features_x = x.shape
-        x = (x - self.X_mean) / self.X_std
-        # Get pairwise componentwise L1-distances to the input training set
-        dx = manhattan_distances(x, Y=self.X_norma.copy(), sum_over_features=
-                                 False)
-        d = self._componentwise_distance(dx)
-        # Compute the correlation function
-        r = self.options['corr'](self.optimal_theta, d).reshape(n_eval,self.nt)
-        y = np.zeros(n_eval)
-        # Compute the regression function
-        f = self.options['poly'](x)
-        # Scaled predictor
-        y_ = np.dot(f, self.optimal_par['beta']) + np.dot(r,
-                    self.optimal_par['gamma'])
-        # Predictor
-        y = (self.y_mean + self.y_std * y_).ravel()
+        ij = compact_correlation_pairs(x, self._corr_map.dot(theta), xt)
+        i, j = ij[:, 0], ij[:, 1]
+        if xt is None:
+            d = self._componentwise_distance(np.abs(x[i] - x[j]))
+        else:
+            d = self._componentwise_distance(np.abs(x[i] - xt[j]))
+        r = self.options['corr'](theta, d)[:, 0]
+
+        if xt is None:
+            n = x.shape[0]
+            data = np.concatenate([r, r, np.ones(n) * diag])
+            i, j = np.concatenate([i, j, np.arange(n)]), np.concatenate([j, i, np.arange(n)])
+            shape = (n, n)
+        else:
+            data = r
+            shape = (x.shape[0], xt.shape[0])
 
-        return y
+        return sparse.csc_matrix((data, (i, j)), shape=shape)
 
-    def _predict_derivatives(self, x, kx):
+    def _training_correlation(self, x):
         """
-        Evaluates the derivatives at a set of points.
+        Evaluates the correlation between a set of normalized points and the
+        training points, as a sparse matrix for the compactly supported
+        correlation functions.
+        """
+        if self._compact_correlation():
+            return self._sparse_correlation_matrix(x, self.X_norma, self.optimal_theta).tocsr()
+        return self._correlation_vector(x, self.X_norma, self.optimal_theta)
+
+    def _reduced_likelihood_gradient(self, theta):
+
+        """
+        This function evaluates the reduced likelihood function and its
+        gradient with respect to log10(theta), the last component being the
+        noise hyperparameter when eval_noise is used.
+
+        The gradient reuses the Cholesky decomposition of [R] computed by
+        _reduced_likelihood_function: only the inverse of [R] and sums over the
+        pairs of training points are needed.
+
+        Parameters
+        ----------
+        theta: list(n_comp), optional
+            - An array containing the autocorrelation parameters at which the
+              Gaussian Process model parameters should be determined.
+
+        Returns
+        -------
+        reduced_likelihood_function_value: real
+            - The value of the reduced likelihood function associated to the
+              given autocorrelation parameters theta.
+
+        grad: np.ndarray[len(theta)]
+            - The gradient of the reduced likelihood function with respect to
+              log10(theta).
+
+        par: dict()
+            - A dictionary containing the requested Gaussian Process model
+              parameters (see _reduced_likelihood_function).
+        """
+        reduced_likelihood_function_value, par = \
+            self._reduced_likelihood_function(theta)
+        grad = np.zeros(len(theta))
+        if not par:
+            return reduced_likelihood_function_value, grad, par
+
+        theta = np.array(theta, dtype=float)
+        noise = 0.
+        if self.options['eval_noise']:
+            noise = theta[-1]
+            theta = theta[:-1]
+
+        C = par['C']
+        gamma = par['gamma']
+        sigma2 = par['sigma2'] / self.y_std ** 2.
+        Rinv = linalg.cho_solve((C, True), np.eye(self.nt))
+
+        # dR_ij / dlog10(theta_k) = - ln(10) * theta_k * D_ijk * R_ij only has
+        # off-diagonal terms: tr(R^-1 dR) and gamma^T dR gamma are sums over
+        # the pairs (i, j) of training points
+        if self.name in ['MFK', 'MFKPLS']:
+            gamma_w = gamma / sigma2
+        else:
+            # sigma2_mean is the geometric mean of the output variances
+            sigma2_mean = self._shared_variance(sigma2)
+            gamma_w = gamma * self._shared_variance_weights(sigma2)
+        dr = - 2. * np.log(10.) * theta
+        if self.D is None:
+            sums = correlation_pair_sums(self.X_norma, self._corr_map.dot(theta),
+                self.options['corr'].__name__, [Rinv, gamma_w.dot(gamma.T)])
+            trace = dr * self._corr_map.T.dot(sums[0])
+            quad = dr * self._corr_map.T.dot(sums[1])
+        else:
+            i, j = self.ij[:, 0], self.ij[:, 1]
+            r = self._pair_correlation(theta)[:, 0]
+            trace = dr * self.D.T.dot(r * Rinv[i, j])
+            quad = dr * self.D.T.dot(r * (gamma_w[i] * gamma[j]).sum(axis=1))
+        if self.options['eval_noise']:
+            # dR / dlog10(noise) = ln(10) * noise * I
+            trace = np.append(trace, np.log(10.) * noise * np.trace(Rinv))
+            quad = np.append(quad, np.log(10.) * noise * (gamma_w * gamma).sum())
+
+        if self.name in ['MFK', 'MFKPLS']:
+            grad = (quad - trace) / np.log(10.)
+        else:
+            detR = (np.diag(C) ** (2. / self.nt)).prod()
+            grad = detR / self.nt * (quad - sigma2_mean * trace)
+
+        return reduced_likelihood_function_value, grad, par
+
+    def predict_all(self, x, variances=True, gradients=True):
+        """
+        Predict the output values and, optionally, the variances and the gradients
+        at a set of points, evaluating the correlation with the training points once.
+
+        Parameters
+        ----------
+        x : np.ndarray[n, nx] or np.ndarray[n]
+            Input values for the prediction points.
+        variances : bool
+            Whether the variances are returned.
+        gradients : bool
+            Whether the derivatives with respect to all the input variables are returned.
+
+        Returns
+        -------
+        y : np.ndarray[n, ny]
+            Output values at the prediction points.
+        s2 : np.ndarray[n, ny]
+            Variances, only returned if variances is True.
+        dy_dx : np.ndarray[n, nx, ny]
+            Derivatives, only returned if gradients is True.
+            dy_dx[:, kx, :] is the output of predict_derivatives(x, kx).
+        """
+        if variances:
+            check_support(self, 'variances')
+        if gradients:
+            check_support(self, 'derivatives')
+        x = check_2d_array(x, 'x')
+        check_nx(self.nx, x)
+        y, s2, dy_dx = self._predict_chunked(
+            lambda x_chunk: self._predict_all(x_chunk, variances, gradients), x,
+            [(self.ny,), (self.ny,) if variances else None,
+             (self.nx, self.ny) if gradients else None])
+
+        outputs = (y,)
+        if variances:
+            outputs += (s2,)
+        if gradients:
+            outputs += (dy_dx,)
+
+        if len(outputs) == 1:
+            return outputs[0]
+        return outputs
+
+    def _predict_chunked(self, func, x, shapes):
+        """
+        Evaluates a prediction method returning several outputs over chunks of
+        at most chunk_size points, with the printing and the timing of the
+        prediction.
+
+        Parameters
+        ----------
+        func : callable
+            Prediction method, called as func(x_chunk) and returning a tuple of
+            outputs, the ones with a None shape being ignored.
+        x : np.ndarray[n, nx]
+            Input values for the prediction points.
+        shapes : list of tuple or None
+            Shape of each output at a single point, or None if it is not computed.
+
+        Returns
+        -------
+        outputs : list of np.ndarray[n, ...] or None
+            Outputs of func, filled chunk by chunk.
+        """
+        n = x.shape[0]
+        self.printer.active = self.options['print_global'] and self.options['print_prediction']
+
+        self.printer._title('Evaluation')
+        self.printer('   %-12s : %i' % ('# eval points.', n))
+        self.printer()
+
+        #Evaluate the unknown points using the specified model-method
+        with self.printer._timed_context('Predicting', key='prediction'):
+            outputs = [None if shape is None else np.empty((n,) + shape)
+                       for shape in shapes]
+            for chunk in self._chunk_slices(n):
+                n_chunk = x[chunk].shape[0]
+                for output, output_chunk, shape in zip(outputs, func(x[chunk]), shapes):
+                    if shape is not None:
+                        output[chunk] = output_chunk.reshape((n_chunk,) + shape)
+
+        time_pt = self.printer._time('prediction')[-1] / n
+        self.printer()
+        self.printer('Prediction time/pt. (sec) : %10.7f' %  time_pt)
+        self.printer()
+
+        return outputs
+
+    def predict_hessians(self, x):
+        """
+        Predict the second derivatives of the outputs with respect to the inputs
+        at a set of points, for the square exponential correlation function and
+        a constant or linear regression term.
+
+        Parameters
+        ----------
+        x : np.ndarray[n, nx] or np.ndarray[n]
+            Input values for the prediction points.
+
+        Returns
+        -------
+        d2y_dx2 : np.ndarray[n, nx, nx, ny]
+            Second derivatives, d2y_dx2[:, kx, lx, :] being the derivative of
+            predict_derivatives(x, kx) with respect to the lx-th input variable.
+        """
+        check_support(self, 'derivatives')
+        if self.name in ['GEK', 'MFK', 'MFKPLS', 'MFKPLSK', 'SGP', 'LocalKRG', 'GridKRG']:
+            raise ValueError('predict_hessians is not available for %s' % self.name)
+        x = check_2d_array(x, 'x')
+        check_nx(self.nx, x)
+        d2y_dx2, = self._predict_chunked(
+            lambda x_chunk: (self._predict_hessians(x_chunk),), x,
+            [(self.nx, self.nx, self.ny)])
+        return d2y_dx2
+
+    def predict_variance_derivatives(self, x):
+        """
+        Predict the derivatives of the variances with respect to the inputs at a
+        set of points, for the square exponential correlation function and a
+        constant or linear regression term.
+
+        Parameters
+        ----------
+        x : np.ndarray[n, nx] or np.ndarray[n]
+            Input values for the prediction points.
+
+        Returns
+        -------
+        ds2_dx : np.ndarray[n, nx, ny]
+            Derivatives of the output of predict_variances(x), ds2_dx[:, kx, :]
+            being the derivative with respect to the kx-th input variable.
+        """
+        check_support(self, 'variances')
+        check_support(self, 'derivatives')
+        if self.name in ['GEK', 'SGP', 'LocalKRG', 'GridKRG']:
+            raise ValueError('predict_variance_derivatives is not available for %s'
+                             % self.name)
+        x = check_2d_array(x, 'x')
+        check_nx(self.nx, x)
+        ds2_dx, = self._predict_chunked(
+            lambda x_chunk: (self._predict_variance_derivatives(x_chunk),), x,
+            [(self.nx, self.ny)])
+        return ds2_dx
+
+    def _correlation_vector(self, x, xt, theta):
+        """
+        Evaluates the correlation between a set of points and the training points.
 
         Arguments
         ---------
         x : np.ndarray [n_evals, dim]
-            Evaluation point input variable values
-        kx : int
-            The 0-based index of the input variable with respect to which derivatives are desired.
+            Normalized evaluation point input variable values
+        xt : np.ndarray [nt, dim]
+            Normalized training point input variable values
+        theta : np.ndarray
+            Hyperparameters of the correlation function
 
         Returns
         -------
-        y : np.ndarray
-            Derivative values.
+        r : np.ndarray [n_evals, nt]
+            Correlation between the evaluation points and the training points
         """
-        kx += 1
-
-        # Initialization
-        n_eval, n_features_x = x.shape
-        x = (x - self.X_mean) / self.X_std
         # Get pairwise componentwise L1-distances to the input training set
-        dx = manhattan_distances(x, Y=self.X_norma.copy(), sum_over_features=
-                                 False)
+        dx = manhattan_distances(x, Y=xt, sum_over_features=False)
         d = self._componentwise_distance(dx)
         # Compute the correlation function
-        r = self.options['corr'](self.optimal_theta, d).reshape(n_eval,self.nt)
+        return self.options['corr'](theta, d).reshape(x.shape[0], xt.shape[0])
 
+    def _correlation_derivatives(self, x, r, gamma, xt, theta, kx=None):
+        """
+        Evaluates the derivatives of r(x).gamma with respect to the input variables.
+
+        Arguments
+        ---------
+        x : np.ndarray [n_evals, dim]
+            Normalized evaluation point input variable values
+        r : np.ndarray [n_evals, nt]
+            Correlation between the evaluation points and the training points
+        gamma : np.ndarray [nt, ny]
+            Weights of the correlation vector
+        xt : np.ndarray [nt, dim]
+            Normalized training point input variable values
+        theta : np.ndarray
+            Hyperparameters of the correlation function
+        kx : int or None
+            The 0-based index of the input variable with respect to which derivatives are desired.
+            All the input variables are considered if None.
+
+        Returns
+        -------
+        dr_dx : np.ndarray [n_evals, dim or 1, ny]
+            Derivative values.
+        """
         if self.options['corr'].__name__ != 'squar_exp':
             raise ValueError(
             'The derivative is only available for square exponential kernel')
+
+        # Length-scale of each input variable, accounting for the PLS projection
+        weights = self._componentwise_distance(np.eye(self.nx)).dot(theta)
+        if kx is not None:
+            x, xt, weights = x[:, [kx]], xt[:, [kx]], weights[[kx]]
+
+        ny = gamma.shape[1]
+        rg = np.dot(r, gamma)
+        dr_dx = np.empty((x.shape[0], x.shape[1], ny))
+        for i in range(ny):
+            # sum_j (x - xt_j) r_j gamma_j
+            dr_dx[:, :, i] = x * rg[:, [i]] - np.dot(r * gamma[:, i], xt)
+        dr_dx *= -2. * weights[:, np.newaxis]
+
+        return dr_dx
+
+    def _trend_derivatives(self, beta, kx=None):
+        """
+        Evaluates the derivatives of the regression term with respect to the input variables.
+
+        Arguments
+        ---------
+        beta : np.ndarray [p, ny]
+            Regression weights
+        kx : int or None
+            The 0-based index of the input variable with respect to which derivatives are desired.
+            All the input variables are considered if None.
+
+        Returns
+        -------
+        df_dx : np.ndarray [dim or 1, ny]
+            Derivative values.
+        """
         if self.options['poly'].__name__ == 'constant':
-            df = np.array([0])
+            df_dx = np.zeros((self.nx, beta.shape[1]))
         elif self.options['poly'].__name__ == 'linear':
-            df = np.zeros((self.nx + 1, self.nx))
-            df[1:,:] = 1
+            df_dx = beta[-self.nx:]
         else:
             raise ValueError(
                 'The derivative is only available for ordinary kriging or '+
                 'universal kriging using a linear trend')
 
-        # Beta and gamma = R^-1(y-FBeta)
-        beta = self.optimal_par['beta']
-        gamma = self.optimal_par['gamma']
-        df_dx = np.dot(df.T, beta)
-        d_dx=x[:,kx-1].reshape((n_eval,1))-self.X_norma[:,kx-1].reshape((1,self.nt))
-        if self.name != 'Kriging' and 'KPLSK' not in self.name:
-            theta = np.sum(self.optimal_theta * self.coeff_pls**2,axis=1)
-        else:
-            theta = self.optimal_theta
-        y = (df_dx[0]-2*theta[kx-1]*np.dot(d_dx*r,gamma))*self.y_std/self.X_std[kx-1]
+        if kx is not None:
+            df_dx = df_dx[[kx]]
 
-        return y
+        return df_dx
 
-    def _predict_variances(self, x):
+    def _correlation_hessians(self, x, r, gamma, xt, theta):
+        """
+        Evaluates the second derivatives of r(x).gamma with respect to the input variables.
+
+        Arguments
+        ---------
+        x : np.ndarray [n_evals, dim]
+            Normalized evaluation point input variable values
+        r : np.ndarray [n_evals, nt]
+            Correlation between the evaluation points and the training points
+        gamma : np.ndarray [nt, ny]
+            Weights of the correlation vector
+        xt : np.ndarray [nt, dim]
+            Normalized training point input variable values
+        theta : np.ndarray
+            Hyperparameters of the correlation function
+
+        Returns
+        -------
+        d2r_dx2 : np.ndarray [n_evals, dim, dim, ny]
+            Second derivative values.
+        """
+        if self.options['corr'].__name__ != 'squar_exp':
+            raise ValueError(
+            'The derivative is only available for square exponential kernel')
+
+        # Length-scale of each input variable, accounting for the PLS projection
+        weights = self._componentwise_distance(np.eye(self.nx)).dot(theta)
+
+        n, nx = x.shape
+        ny = gamma.shape[1]
+        # Products of the components of the training points, for the sums
+        # sum_j (x - xt_j)_k (x - xt_j)_l r_j gamma_j
+        xt_xt = (xt[:, :, np.newaxis] * xt[:, np.newaxis, :]).reshape((xt.shape[0], -1))
+        rg = np.dot(r, gamma)
+        d2r_dx2 = np.empty((n, nx, nx, ny))
+        for i in range(ny):
+            r_gamma = r * gamma[:, i]
+            rg_xt = np.dot(r_gamma, xt)
+            x_x = x[:, :, np.newaxis] * x[:, np.newaxis, :]
+            x_rg_xt = x[:, :, np.newaxis] * rg_xt[:, np.newaxis, :]
+            d2r_dx2[:, :, :, i] = x_x * rg[:, [i], np.newaxis] - x_rg_xt - \
+                x_rg_xt.transpose(0, 2, 1) + np.dot(r_gamma, xt_xt).reshape((n, nx, nx))
+        # d2r_j / dx_k dx_l = (4 w_k w_l (x - xt_j)_k (x - xt_j)_l - 2 w_k delta_kl) r_j
+        d2r_dx2 *= 4. * np.outer(weights, weights)[:, :, np.newaxis]
+        d2r_dx2[:, np.arange(nx), np.arange(nx), :] -= 2. * weights[:, np.newaxis] * \
+            rg[:, np.newaxis, :]
+
+        return d2r_dx2
+
+    def _predict_all(self, x, variances, gradients):
+        """
+        Evaluates the model, and optionally its variances and derivatives, at a set of points.
+
+        Arguments
+        ---------
+        x : np.ndarray [n_evals, dim]
+            Evaluation point input variable values
+        variances : bool
+            Whether the variances are computed.
+        gradients : bool
+            Whether the derivatives are computed.
+
+        Returns
+        -------
+        y : np.ndarray
+            Evaluation point output variable values
+        s2 : np.ndarray or None
+            Variances
+        dy_dx : np.ndarray [n_evals, dim, ny] or None
+            Derivative values.
+        """
+        if self.output_hyperparameters:
+            return self._predict_outputs(self._predict_all, x, variances, gradients)
 
         # Initialization
-        n_eval, n_features_x = x.shape
         x = (x - self.X_mean) / self.X_std
-        # Get pairwise componentwise L1-distances to the input training set
-        dx = manhattan_distances(x, Y=self.X_norma.copy(), sum_over_features=
-                                 False)
-        d = self._componentwise_distance(dx)
+        r = self._training_correlation(x)
 
-        # Compute the correlation function
-        r = self.options['corr'](self.optimal_theta, d).reshape(n_eval,self.nt)
+        y = self._values_from_correlation(x, r)
+        s2 = dy_dx = None
+        if variances:
+            s2 = self._variances_from_correlation(x, r)
+        if gradients:
+            dy_dx = self._derivatives_from_correlation(x, r, self.X_norma)
 
-        C = self.optimal_par['C']
-        rt = linalg.solve_triangular(C, r.T, lower=True)
+        return y, s2, dy_dx
 
-        u = linalg.solve_triangular(self.optimal_par['G'].T,np.dot(self.optimal_par['Ft'].T, rt) -
-                             self.options['poly'](x).T)
+    def _values_from_correlation(self, x, r, par=None):
+        if par is None:
+            par = self.optimal_par
+        # Scaled predictor
+        y_ = np.dot(self.options['poly'](x), par['beta']) + r.dot(par['gamma'])
+        # Predictor
+        return (self.y_mean + self.y_std * y_).ravel()
+
+    def _variances_from_correlation(self, x, r, par=None):
+        if par is None:
+            par = self.optimal_par
+        if sparse.issparse(r):
+            # Sparse LU decomposition of R: r R^-1 r^T and F^T R^-1 r^T are
+            # computed from R^-1 r^T
+            Rinv_rt = par['C'].solve(r.T.toarray())
+            rRr = np.asarray(r.multiply(Rinv_rt.T).sum(axis=1)).ravel()
+            u = linalg.solve_triangular(par['G'].T, np.dot(self.F.T, Rinv_rt) -
+                                        self.options['poly'](x).T, lower=True)
+        else:
+            C = par['C']
+            rt = linalg.solve_triangular(C, r.T, lower=True)
+            rRr = (rt ** 2.).sum(axis=0)
 
-        MSE = self.optimal_par['sigma2']*(1.-(rt ** 2.).sum(axis=0)+(u ** 2.).sum(axis=0))
+            u = linalg.solve_triangular(par['G'].T,np.dot(par['Ft'].T, rt) -
+                                 self.options['poly'](x).T, lower=True)
+
+        MSE = np.outer(1.-rRr+(u ** 2.).sum(axis=0), par['sigma2'])
         # Mean Squared Error might be slightly negative depending on
         # machine precision: force to zero!
         MSE[MSE < 0.] = 0.
         return MSE
 
-    def _optimize_hyperparam(self,D):
+    def _variance_derivatives_from_correlation(self, x, r, par=None):
+        # C is not a dense triangular factor for the compactly supported kernels
+        if self.options['corr'].__name__ != 'squar_exp':
+            raise ValueError(
+            'The derivative is only available for square exponential kernel')
+        if par is None:
+            par = self.optimal_par
+        C = par['C']
+        rt = linalg.solve_triangular(C, r.T, lower=True)
+        u = linalg.solve_triangular(par['G'].T, np.dot(par['Ft'].T, rt) -
+                                    self.options['poly'](x).T, lower=True)
+        # With v = G^-1 u, d(u^T u) = 2 (R^-1 F v)^T dr^T - 2 v^T df^T and
+        # d(r R^-1 r^T) = 2 (R^-1 r^T)^T dr^T: one more solve for all the inputs
+        v = linalg.solve_triangular(par['G'], u)
+        c = linalg.solve_triangular(C.T, rt - np.dot(par['Ft'], v))
+        # sum_j c_j dr_j / dx, the weights c being those of each point
+        dr_dx = self._correlation_derivatives(x, r * c.T, np.ones((r.shape[1], 1)),
+                                              self.X_norma, self.optimal_theta)[:, :, 0]
+        dMSE = -2. * (dr_dx + self._trend_derivatives(v).T)
+
+        # The variances forced to zero are kept constant
+        dMSE[1. - (rt ** 2.).sum(axis=0) + (u ** 2.).sum(axis=0) < 0.] = 0.
+        return (dMSE / self.X_std)[:, :, np.newaxis] * par['sigma2']
+
+    def _derivatives_from_correlation(self, x, r, xt, kx=None, par=None):
+        if par is None:
+            par = self.optimal_par
+        # Beta and gamma = R^-1(y-FBeta)
+        df_dx = self._trend_derivatives(par['beta'], kx)
+        dr_dx = self._correlation_derivatives(x, r, par['gamma'],
+                                              xt, self.optimal_theta, kx)
+        X_std = np.reshape(self.X_std, (-1, 1)) if kx is None else self.X_std[kx]
+        return (df_dx + dr_dx) * self.y_std / X_std
+
+    def _predict_hessians(self, x):
+        """
+        Evaluates the second derivatives at a set of points, the ones of the
+        constant or linear regression term being zero.
+
+        Arguments
+        ---------
+        x : np.ndarray [n_evals, dim]
+            Evaluation point input variable values
+
+        Returns
+        -------
+        d2y_dx2 : np.ndarray [n_evals, dim, dim, ny]
+            Second derivative values.
+        """
+        if self.output_hyperparameters:
+            return self._predict_outputs(self._predict_hessians, x)
+
+        if self.options['poly'].__name__ not in ['constant', 'linear']:
+            raise ValueError(
+                'The derivative is only available for ordinary kriging or '+
+                'universal kriging using a linear trend')
+
+        # Initialization
+        x = (x - self.X_mean) / self.X_std
+        r = self._training_correlation(x)
+
+        d2r_dx2 = self._correlation_hessians(x, r, self.optimal_par['gamma'],
+                                             self.X_norma, self.optimal_theta)
+        X_std = np.outer(self.X_std, self.X_std)[:, :, np.newaxis]
+        return d2r_dx2 * self.y_std / X_std
+
+    def _predict_variance_derivatives(self, x):
+        """
+        Evaluates the derivatives of the variances at a set of points.
+
+        Arguments
+        ---------
+        x : np.ndarray [n_evals, dim]
+            Evaluation point input variable values
+
+        Returns
+        -------
+        ds2_dx : np.ndarray [n_evals, dim, ny]
+            Derivative values.
+        """
+        if self.output_hyperparameters:
+            return self._predict_outputs(self._predict_variance_derivatives, x)
+
+        # Initialization
+        x = (x - self.X_mean) / self.X_std
+        r = self._training_correlation(x)
+
+        return self._variance_derivatives_from_correlation(x, r)
+
+    def _predict_values(self, x):
+        """
+        Evaluates the model at a set of points.
+
+        Arguments
+        ---------
+        x : np.ndarray [n_evals, dim]
+            Evaluation point input variable values
+
+        Returns
+        -------
+        y : np.ndarray
+            Evaluation point output variable values
+        """
+        if self.output_hyperparameters:
+            return self._predict_outputs(self._predict_values, x)
+
+        # Initialization
+        x = (x - self.X_mean) / self.X_std
+        r = self._training_correlation(x)
+
+        return self._values_from_correlation(x, r)
+
+    def _predict_derivatives(self, x, kx):
+        """
+        Evaluates the derivatives at a set of points.
+
+        Arguments
+        ---------
+        x : np.ndarray [n_evals, dim]
+            Evaluation point input variable values
+        kx : int
+            The 0-based index of the input variable with respect to which derivatives are desired.
+
+        Returns
+        -------
+        y : np.ndarray
+            Derivative values.
+        """
+        if self.output_hyperparameters:
+            return self._predict_outputs(self._predict_derivatives, x, kx)
+
+        # Initialization
+        x = (x - self.X_mean) / self.X_std
+        r = self._training_correlation(x)
+
+        return self._derivatives_from_correlation(x, r, self.X_norma, kx)[:, 0, :]
+
+    def _predict_variances(self, x):
+
+        if self.output_hyperparameters:
+            return self._predict_outputs(self._predict_variances, x)
+
+        # Initialization
+        x = (x - self.X_mean) / self.X_std
+        r = self._training_correlation(x)
+
+        return self._variances_from_correlation(x, r)
+
+    def _predict_outputs(self, func, x, *args):
+        """
+        Evaluates a prediction function for each output with its own hyperparameters,
+        through the single output models built by the training.
+
+        Arguments
+        ---------
+        func : method
+            Prediction method, evaluated on the single output model of each output
+        x : np.ndarray [n_evals, dim]
+            Evaluation point input variable values
+        *args
+            Other arguments of func
+
+        Returns
+        -------
+        outputs : np.ndarray or tuple
+            Results of func for all the outputs, stacked along the last axis.
+        """
+        results = []
+        for output_model in self._output_models:
+            result = func.__func__(output_model, x, *args)
+            if not isinstance(result, tuple):
+                result = (result,)
+            # The values are returned flattened: [n_evals] -> [n_evals, 1]
+            results.append([res.reshape((x.shape[0], -1)) if res is not None and
+                            res.ndim < 3 else res for res in result])
+
+        outputs = tuple(None if res[0] is None else np.concatenate(res, axis=-1)
+                        for res in zip(*results))
+        if len(outputs) == 1:
+            return outputs[0]
+        return outputs
+
+    def _optimize_hyperparam(self, D, refit=False):
 
         """
         This function evaluates the Gaussian Process model at x.
 
         Parameters
         ----------
-        D: np.ndarray [n_obs * (n_obs - 1) / 2, dim]
+        D: np.ndarray [n_obs * (n_obs - 1) / 2, dim] or None
             - The componentwise cross-spatial-correlation-distance between the
-              vectors in X.
+              vectors in X. None means that the correlation matrix is built
+              from self.X_norma (low_memory option).
+
+        refit: bool
+            - Whether the model is fitted again from the hyperparameters option,
+              found with a noise term that is now removed: the optimization is
+              limited to 2 * (n + 1) likelihood evaluations, and starts from
+              correlation lengths shortened until the correlation matrix is
+              positive definite.
 
         Returns
         -------
@@ -397,40 +1462,66 @@ class KrgBased(SurrogateModel):
         self.best_iteration_fail = None
         self._thetaMemory = None
         # Initialize the hyperparameter-optimization
-        def minus_reduced_likelihood_function(log10t):
-            return - self._reduced_likelihood_function(theta=10.**log10t)[0]
         limit, _rhobeg = 10*len(self.options['theta0']), 0.5
-        exit_function = False
-        if 'KPLSK' in self.name:
+        warm_start = self.options['hyperparameters'] is not None
+        if warm_start:
+            # Hyperparameters of a model trained on similar data: smaller
+            # initial trust region, and only the second step of KPLSK
+            _rhobeg = 0.05
+        exit_function = 'KPLSK' in self.name and warm_start
+        if 'KPLSK' in self.name and not warm_start:
             n_iter = 1
         else:
             n_iter = 0
 
         for ii in range(n_iter,-1,-1):
             best_optimal_theta, best_optimal_rlf_value, best_optimal_par, \
-                constraints = [], [], [], []
-
-            for i in range(len(self.options['theta0'])):
-                constraints.append(lambda log10t,i=i:log10t[i] - np.log10(1e-6))
-                constraints.append(lambda log10t,i=i:np.log10(100) - log10t[i])
+                bounds = [], [], [], []
+
+            theta0 = self._starting_hyperparameters()
+            if refit:
+                limit = 2 * (len(theta0) + 1)
+            for i in range(len(theta0) - self.options['eval_noise']):
+                bounds.append((np.log10(1e-6), np.log10(100)))
+            if self.options['eval_noise']:
+                bounds.append((-16, 10))
     
-            self.D = self._componentwise_distance(D,opt=ii)
+            if D is None:
+                # Componentwise distances of the unit vectors: the correlation
+                # weights of the input features are self._corr_map.dot(theta)
+                self.D = None
+                self._corr_map = self._componentwise_distance(np.eye(self.nx),opt=ii)
+            else:
+                self.D = self._componentwise_distance(D,opt=ii)
+            if refit and self.options['optimize_theta']:
+                # Hyperparameters fitted with a noise term may give a correlation
+                # matrix that is not positive definite: the correlation lengths
+                # are shortened until it is
+                n_theta = len(theta0) - self.options['eval_noise']
+                self._print_failures = False
+                try:
+                    while np.isinf(self._reduced_likelihood_function(theta0)[0]) and \
+                            np.min(theta0[:n_theta]) < 100.:
+                        theta0[:n_theta] = np.minimum(10. * theta0[:n_theta], 100.)
+                finally:
+                    self._print_failures = True
+                self.best_iteration_fail = None
+                self._thetaMemory = None
             # Initialization
             k, incr, stop, best_optimal_rlf_value = 0, 0, 1, -1e20
             while (k < stop):
-                # Use specified starting point as first guess
-                theta0 = self.options['theta0']
-                if self.options['eval_noise']:
-                    theta0 = np.concatenate([theta0, np.array([self.options['noise0']])])
-                    constraints.append(lambda log10t:log10t[-1] + 16)
-                    constraints.append(lambda log10t:10 - log10t[-1])
                 try:
 #                 if True:
-                    optimal_theta = 10. ** optimize.fmin_cobyla( \
-                    minus_reduced_likelihood_function,np.log10(theta0), \
-                    constraints,rhobeg=_rhobeg,rhoend = 1e-4,maxfun=limit)
+                    if self.options['optimize_theta']:
+                        optimal_theta = self._multistart_hyperparam_search(
+                            np.log10(theta0), bounds, limit, _rhobeg)
+                    else:
+                        optimal_theta = theta0
                     optimal_rlf_value, optimal_par = \
                     self._reduced_likelihood_function(theta=optimal_theta)
+                    if np.isinf(optimal_rlf_value) and not self.options['optimize_theta']:
+                        raise linalg.LinAlgError('The correlation matrix is not positive '
+                                                 'definite for the given hyperparameters')
                     # Compare the new optimizer to the best previous one
                     if k > 0:
                         if np.isinf(optimal_rlf_value):
@@ -506,6 +1597,191 @@ class KrgBased(SurrogateModel):
         
         return best_optimal_rlf_value, best_optimal_par, best_optimal_theta
 
+    def _starting_hyperparameters(self):
+
+        """
+        Returns the starting point of the hyperparameter optimization: the
+        hyperparameters option if given, theta0 otherwise, followed by the
+        initial noise when eval_noise is used.
+        """
+        hyperparameters = self.options['hyperparameters']
+        if hyperparameters is None:
+            theta0, noise0 = self.options['theta0'], self.options['noise0']
+        else:
+            theta0, noise0 = hyperparameters['theta'], hyperparameters['noise']
+            if noise0 is None:
+                noise0 = self.options['noise0']
+
+        theta0 = np.array(theta0, dtype=float)
+        if self.options['eval_noise']:
+            theta0 = np.append(theta0, noise0)
+        return theta0
+
+    def get_hyperparameters(self):
+        """
+        Get the hyperparameters of the trained model.
+
+        The returned record can be saved, e.g. as JSON, and given to the hyperparameters
+        option of a new model: its training then starts from these hyperparameters with a
+        smaller trust region, or only evaluates
+        them when optimize_theta is False.
+
+        Returns
+        -------
+        hyperparameters : dict
+            The name of the model and of the correlation function, the autocorrelation
+            parameters 'theta' (one row per output if shared_theta is False) and the
+            noise variance 'noise' (None if eval_noise is False).
+        """
+        noise = None
+        if self.options['eval_noise']:
+            noise = np.asarray(self.optimal_noise).tolist()
+        return {'name': self.name, 'corr': self.options['corr'].__name__,
+                'theta': np.asarray(self.optimal_theta).tolist(), 'noise': noise}
+
+    def _local_hyperparam_search(self, log10t0, bounds, limit, rhobeg):
+
+        """
+        This function runs one local optimization of the reduced likelihood
+        function from a given starting point.
+
+        Parameters
+        ----------
+        log10t0: np.ndarray [n_hyper]
+            - The starting point in log10 scale.
+
+        bounds: list(n_hyper)
+            - The (lower, upper) bounds of each hyperparameter in log10 scale.
+
+        limit: int
+            - The maximum number of likelihood evaluations.
+
+        rhobeg: real
+            - The initial trust region of COBYLA.
+
+        Returns
+        -------
+        optimal_theta: np.ndarray [n_hyper]
+            - The hyperparameters found by the optimization.
+        """
+        if self.options['hyper_opt'] == 'Cobyla':
+            def minus_reduced_likelihood_function(log10t):
+                reduced_likelihood_function_value = \
+                    self._reduced_likelihood_function(theta=10.**log10t)[0]
+                if np.isinf(reduced_likelihood_function_value) and \
+                        self._likelihood_dtype != np.double:
+                    # Too ill-conditioned for single precision
+                    self._likelihood_dtype = np.double
+                    try:
+                        reduced_likelihood_function_value = \
+                            self._reduced_likelihood_function(theta=10.**log10t)[0]
+                    finally:
+                        self._likelihood_dtype = np.single
+                return - reduced_likelihood_function_value
+
+            constraints = []
+            for i, (lower, upper) in enumerate(bounds):
+                constraints.append(lambda log10t,i=i,lower=lower:log10t[i] - lower)
+                constraints.append(lambda log10t,i=i,upper=upper:upper - log10t[i])
+
+            if self.options['precision'] == 'mixed':
+                # Search in single precision, whose larger nugget moves the
+                # optimum, then polish in double precision from its result
+                self._likelihood_dtype = np.single
+                try:
+                    log10t0 = optimize.fmin_cobyla( \
+                        minus_reduced_likelihood_function,log10t0, \
+                        constraints,rhobeg=rhobeg,rhoend = 1e-2,maxfun=limit)
+                finally:
+                    self._likelihood_dtype = np.double
+                rhobeg = 0.1
+            optimal_theta = 10. ** optimize.fmin_cobyla( \
+                minus_reduced_likelihood_function,log10t0, \
+                constraints,rhobeg=rhobeg,rhoend = 1e-4,maxfun=limit)
+        else:
+            def minus_reduced_likelihood_and_gradient(log10t):
+                rlf_value, grad, _ = self._reduced_likelihood_gradient(theta=10.**log10t)
+                return - np.sum(rlf_value), - grad
+
+            optimal_theta = 10. ** optimize.minimize( \
+                minus_reduced_likelihood_and_gradient,log10t0, \
+                jac=True,method='L-BFGS-B',bounds=bounds, \
+                options={'maxfun':limit}).x
+
+        return optimal_theta
+
+    def _multistart_hyperparam_search(self, log10t0, bounds, limit, rhobeg):
+
+        """
+        This function runs the local optimization of the hyperparameters from
+        n_start starting points and returns the one with the best likelihood.
+
+        The first starting point is log10t0; the others are drawn from a LHS
+        design in the bounds of the autocorrelation parameters, seeded by the
+        seed option. When n_jobs > 1,
+        the local optimizations run in a pool of forked processes which read the
+        distances self.D of the parent process.
+
+        Parameters
+        ----------
+        log10t0: np.ndarray [n_hyper]
+            - The first starting point in log10 scale.
+
+        bounds: list(n_hyper)
+            - The (lower, upper) bounds of each hyperparameter in log10 scale.
+
+        limit: int
+            - The maximum number of likelihood evaluations per start.
+
+        rhobeg: real
+            - The initial trust region of COBYLA.
+
+        Returns
+        -------
+        optimal_theta: np.ndarray [n_hyper]
+            - The best hyperparameters found by the optimizations.
+        """
+        n_start = self.options['n_start']
+        if n_start == 1:
+            return self._local_hyperparam_search(log10t0, bounds, limit, rhobeg)
+
+        # Space-filling starting points for theta; the noise keeps its
+        # initial value
+        n_theta = len(log10t0) - self.options['eval_noise']
+        log10t0s = np.tile(np.array(log10t0, dtype=float), (n_start, 1))
+        sampling = LHS(xlimits=np.array(bounds[:n_theta], dtype=float),
+                       random_state=self.options['seed'])
+        log10t0s[1:, :n_theta] = sampling(n_start - 1)
+
+        n_jobs = self.options['n_jobs']
+        if n_jobs < 0:
+            n_jobs = multiprocessing.cpu_count()
+        args = [(log10t0s[i], bounds, limit, rhobeg) for i in range(n_start)]
+        if n_jobs == 1 or sys.platform.startswith('win'):
+            results = [_hyperparam_search_start(arg, self) for arg in args]
+        else:
+            global _pool_model
+            _pool_model = self
+            pool = multiprocessing.Pool(min(n_jobs, n_start))
+            try:
+                results = pool.map(_hyperparam_search_start, args)
+            finally:
+                pool.close()
+                pool.join()
+                _pool_model = None
+
+        optimal_theta, best_rlf_value = None, - np.inf
+        for theta, rlf_value, best_iteration_fail, theta_memory in results:
+            if optimal_theta is None or np.sum(rlf_value) > best_rlf_value:
+                optimal_theta, best_rlf_value = theta, np.sum(rlf_value)
+            # Keep track of the best evaluation made in the worker processes
+            if best_iteration_fail is not None and (self.best_iteration_fail
+                    is None or best_iteration_fail > self.best_iteration_fail):
+                self.best_iteration_fail = best_iteration_fail
+                self._thetaMemory = theta_memory
+
+        return optimal_theta
+
     def _check_param(self):
 
         """
@@ -529,7 +1805,8 @@ class KrgBased(SurrogateModel):
                                  "%s was given." % (self._regression_types.keys(),
                                 self.options['rho_regr']))
 
-        if self.name == 'Kriging' or self.name == 'MFK':
+        if self.name in ['Kriging', 'MFK', 'SGP', 'LocalKRG', 'GridKRG'] or \
+                (self.name == 'GEK' and self.options['n_comp'] is None):
             d = self.nx
         else:
             d = self.options['n_comp']
@@ -545,9 +1822,57 @@ class KrgBased(SurrogateModel):
                                  "%s was given."% (self._correlation_types.keys(),
                                 self.options['corr']))
 
+        if self.options['n_start'] < 1:
+            raise ValueError("n_start should be at least 1, %s was given."
+                             % self.options['n_start'])
+        if self.options['n_jobs'] == 0 or self.options['n_jobs'] < -1:
+            raise ValueError("n_jobs should be a positive number of processes or -1, "
+                             "%s was given." % self.options['n_jobs'])
+
+        if self.options['hyper_opt'] != 'Cobyla' and \
+                self.options['corr'].__name__ not in ['abs_exp', 'squar_exp']:
+            raise ValueError("The likelihood gradient is only available for "
+                             "the correlation functions %s."
+                             % ['abs_exp', 'squar_exp'])
+
+        # The product of the one-dimensional Wendland functions is only positive
+        # definite for the componentwise distances of the input variables
+        if self._compact_correlation() and self.name not in ['Kriging', 'GridKRG']:
+            raise ValueError("The compactly supported correlation functions are not "
+                             "available for %s." % self.name)
+
+        if not self.options['shared_theta'] and self.name not in ['Kriging', 'KPLS']:
+            raise ValueError("The outputs can only have their own hyperparameters "
+                             "for KRG and KPLS.")
+
+        if self.options['precision'] == 'mixed' and (self.name in ['SGP', 'GridKRG', 'GEK'] or
+                self.options['low_memory'] or self._compact_correlation() or
+                self.options['hyper_opt'] != 'Cobyla'):
+            raise ValueError("The mixed precision is only available with COBYLA for the "
+                             "correlation matrices built from the stored distances.")
+
+        hyperparameters = self.options['hyperparameters']
+        if hyperparameters is not None:
+            if 'MFK' in self.name:
+                raise ValueError("The hyperparameters option is not available for %s."
+                                 % self.name)
+            if hyperparameters['name'] != self.name or \
+                    hyperparameters['corr'] != self.options['corr'].__name__:
+                raise ValueError("The hyperparameters are those of a %s model with the "
+                                 "%s correlation function." % (hyperparameters['name'],
+                                 hyperparameters['corr']))
+            # KPLSK starts from the hyperparameters of its second step
+            shape = (self.nx,) if self.name == 'KPLSK' else (d,)
+            if not self.options['shared_theta'] and self.ny > 1:
+                shape = (self.ny,) + shape
+            if np.shape(hyperparameters['theta']) != shape:
+                raise ValueError("The shape of the theta hyperparameters should be %s."
+                                 % (shape,))
+
         if self.supports['training_derivatives']:
             if not(1 in self.training_points[None]):
-                raise Exception('Derivative values are needed for using the GEKPLS model.')
+                raise Exception('Derivative values are needed for using the %s model.'
+                                % self.name)
 
     def _check_F(self,n_samples_F,p):
 
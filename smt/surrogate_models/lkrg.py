@@ -0,0 +1,207 @@
+'''
+This package is distributed under New BSD license.
+'''
+
+from __future__ import division
+import numpy as np
+from scipy import linalg
+from scipy.spatial import cKDTree
+
+from smt.surrogate_models.krg_based import KrgBased
+from smt.utils.kriging_utils import componentwise_distance
+
+"""
+The local kriging class.
+"""
+
+class LocalKRG(KrgBased):
+
+    """
+    - LocalKRG
+    """
+    def _initialize(self):
+        super(LocalKRG, self)._initialize()
+        declare = self.options.declare
+        declare('theta0', None, types=(list, np.ndarray), desc='Initial hyperparameters')
+        declare('n_neighbors', 30, types=int,
+                desc='Number of nearest training points used by each local kriging system')
+        declare('n_subsample', 500, types=int,
+                desc='Number of training points randomly selected to fit the shared hyperparameters')
+        self.name = 'LocalKRG'
+
+    def _compute_pls(self,X,y):
+        # No PLS projection: the shared hyperparameters are fitted on a random
+        # subsample of the training points, of size self.nt during the fit
+        n_subsample = min(self.options['n_subsample'], X.shape[0])
+        random_state = np.random.RandomState(self.options['seed'])
+        subsample = np.sort(random_state.permutation(X.shape[0])[:n_subsample])
+        self.nt = n_subsample
+        return X[subsample], y[subsample]
+
+    def _componentwise_distance(self,dx,opt=0):
+        d = componentwise_distance(dx,self.options['corr'].__name__,
+                                   self.nx)
+        return d
+
+    def _new_train(self):
+        """
+        Train the model: the hyperparameters are fitted by a global kriging
+        model on a subsample, then a KD-tree is built over all the training points.
+        """
+        xt, yt = self.training_points[None][0]
+        nt = xt.shape[0]
+
+        X_sorted = xt[np.lexsort(xt.T)]
+        if np.any(np.all(X_sorted[1:] == X_sorted[:-1], axis=1)):
+            raise Exception("Multiple input features cannot have the same value.")
+
+        try:
+            super(LocalKRG, self)._new_train()
+        finally:
+            self.nt = nt
+
+        # Local systems are solved on the normalized training points
+        self.X_norma = (xt - self.X_mean) / self.X_std
+        self.y_norma = (yt - self.y_mean) / self.y_std
+        self.F = self.options['poly'](self.X_norma)
+        self.tree = cKDTree(self.X_norma)
+
+    def _local_parameters(self, neighbors):
+        """
+        Solves the kriging system on a set of training points with the shared hyperparameters.
+
+        Arguments
+        ---------
+        neighbors : np.ndarray [k]
+            Indices of the training points
+
+        Returns
+        -------
+        par : dict
+            Gaussian Process model parameters of the local system (see _reduced_likelihood_function).
+        """
+        X = self.X_norma[neighbors]
+        r = self._correlation_vector(X, X, self.optimal_theta)
+
+        # Clustered neighbors can make R numerically singular: the nugget is
+        # increased before giving up
+        for nugget in [10.*np.finfo(np.double).eps, 1e-12, 1e-10, 1e-8]:
+            R = r + np.eye(len(neighbors)) * (nugget + self.optimal_noise)
+            try:
+                C = linalg.cholesky(R, lower=True)
+                break
+            except linalg.LinAlgError:
+                pass
+        else:
+            raise linalg.LinAlgError('The correlation matrix of %i neighbors is not positive '
+                                     'definite for theta = %s: decrease n_neighbors or '
+                                     'change theta0' % (len(neighbors), self.optimal_theta))
+
+        # Get generalized least squares solution
+        Ft = linalg.solve_triangular(C, self.F[neighbors], lower=True)
+        Q, G = linalg.qr(Ft, mode='economic')
+        Yt = linalg.solve_triangular(C, self.y_norma[neighbors], lower=True)
+        beta = linalg.solve_triangular(G, np.dot(Q.T, Yt))
+        rho = Yt - np.dot(Ft, beta)
+
+        par = {}
+        par['sigma2'] = self.optimal_par['sigma2']
+        par['beta'] = beta
+        par['gamma'] = linalg.solve_triangular(C.T, rho)
+        par['C'] = C
+        par['Ft'] = Ft
+        par['G'] = G
+
+        return par
+
+    def _predict_all(self, x, variances, gradients):
+        """
+        Evaluates the model, and optionally its variances and derivatives, at a set of points.
+        The points sharing the same nearest neighbors are evaluated with one kriging system.
+
+        Arguments
+        ---------
+        x : np.ndarray [n_evals, dim]
+            Evaluation point input variable values
+        variances : bool
+            Whether the variances are computed.
+        gradients : bool
+            Whether the derivatives are computed.
+
+        Returns
+        -------
+        y : np.ndarray
+            Evaluation point output variable values
+        s2 : np.ndarray or None
+            Variances
+        dy_dx : np.ndarray [n_evals, dim, ny] or None
+            Derivative values.
+        """
+        # Initialization
+        n_eval = x.shape[0]
+        x = (x - self.X_mean) / self.X_std
+        k = min(self.options['n_neighbors'], self.nt)
+
+        _, neighbors = self.tree.query(x, k=k)
+        neighbors = np.sort(neighbors.reshape((n_eval, k)), axis=1)
+        neighbor_sets, inverse, counts = np.unique(neighbors, axis=0, return_inverse=True,
+                                                   return_counts=True)
+        order = np.argsort(inverse, kind='mergesort')
+        ends = np.cumsum(counts)
+
+        y = np.empty((n_eval, self.ny))
+        s2 = np.empty((n_eval, self.ny)) if variances else None
+        dy_dx = np.empty((n_eval, self.nx, self.ny)) if gradients else None
+        for i, neighbor_set in enumerate(neighbor_sets):
+            points = order[ends[i] - counts[i]:ends[i]]
+            par = self._local_parameters(neighbor_set)
+            r = self._correlation_vector(x[points], self.X_norma[neighbor_set],
+                                         self.optimal_theta)
+
+            y[points] = self._values_from_correlation(x[points], r, par).reshape(
+                (len(points), self.ny))
+            if variances:
+                s2[points] = self._variances_from_correlation(x[points], r, par).reshape(
+                    (len(points), self.ny))
+            if gradients:
+                dy_dx[points] = self._derivatives_from_correlation(
+                    x[points], r, self.X_norma[neighbor_set], par=par)
+
+        return y, s2, dy_dx
+
+    def _predict_values(self, x):
+        """
+        Evaluates the model at a set of points.
+
+        Arguments
+        ---------
+        x : np.ndarray [n_evals, dim]
+            Evaluation point input variable values
+
+        Returns
+        -------
+        y : np.ndarray
+            Evaluation point output variable values
+        """
+        return self._predict_all(x, False, False)[0]
+
+    def _predict_derivatives(self, x, kx):
+        """
+        Evaluates the derivatives at a set of points.
+
+        Arguments
+        ---------
+        x : np.ndarray [n_evals, dim]
+            Evaluation point input variable values
+        kx : int
+            The 0-based index of the input variable with respect to which derivatives are desired.
+
+        Returns
+        -------
+        y : np.ndarray
+            Derivative values.
+        """
+        return self._predict_all(x, False, True)[2][:, kx, :]
+
+    def _predict_variances(self, x):
+        return self._predict_all(x, True, False)[1]
@@ -65,6 +65,31 @@ class LS(SurrogateModel):
                 self._new_train()
                 #outputs['sol'] = self.sol
 
+    def compute_loo_errors(self):
+        """
+        Compute the leave-one-out cross-validation errors at the training points.
+
+        The error at the i-th training point is the difference between its output
+        and the prediction of the model trained without it. It is e_i / (1 - H_ii),
+        where e_i is the residual of the fit at this point and H = X (X^T X)^-1 X^T
+        the hat matrix, whose diagonal is computed from a QR factorization of X
+        without retraining. A ValueError is raised if a diagonal term H_ii is 1.
+
+        Returns
+        -------
+        errors : np.ndarray[nt, ny]
+            The leave-one-out errors y_i - y_-i(x_i).
+        """
+        x, y = self.training_points[None][0]
+        X = np.hstack((np.ones((x.shape[0], 1)), x))
+        Q = np.linalg.qr(X)[0]
+        h = np.sum(Q ** 2, axis=1)
+        if np.any(h > 1. - 1e-10):
+            raise ValueError('The leave-one-out errors are not defined for training points '
+                             'of leverage 1, e.g. when nt equals the number of coefficients')
+        residuals = y - self.mod.predict(x).reshape(y.shape)
+        return residuals / (1. - h)[:, np.newaxis]
+
     def _predict_values(self,x):
         """
         Evaluates the model at a set of points.
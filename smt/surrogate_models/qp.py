@@ -96,6 +96,32 @@ class QP(SurrogateModel):
         return M.T
 
 
+    def compute_loo_errors(self):
+        """
+        Compute the leave-one-out cross-validation errors at the training points.
+
+        The error at the i-th training point is the difference between its output
+        and the prediction of the model trained without it. It is e_i / (1 - H_ii),
+        where e_i is the residual of the fit at this point and H = M (M^T M)^-1 M^T
+        the hat matrix of the response surface M, whose diagonal is computed from
+        a QR factorization of M without retraining. A ValueError is raised if a
+        diagonal term H_ii is 1.
+
+        Returns
+        -------
+        errors : np.ndarray[nt, ny]
+            The leave-one-out errors y_i - y_-i(x_i).
+        """
+        x, y = self.training_points[None][0]
+        M = self._response_surface(x)
+        Q = np.linalg.qr(M)[0]
+        h = np.sum(Q ** 2, axis=1)
+        if np.any(h > 1. - 1e-10):
+            raise ValueError('The leave-one-out errors are not defined for training points '
+                             'of leverage 1, e.g. when nt equals the number of coefficients')
+        residuals = y - np.dot(M, self.coef)
+        return residuals / (1. - h)[:, np.newaxis]
+
     def _predict_derivatives(self, x, kx):
         """
         Evaluates the derivatives at a set of points.
@@ -7,6 +7,7 @@ This package is distributed under New BSD license.
 from __future__ import division
 
 import numpy as np
+import scipy.linalg
 from scipy.sparse import csc_matrix
 from smt.surrogate_models.surrogate_model import SurrogateModel
 
@@ -106,6 +107,7 @@ class RBF(SurrogateModel):
                 solver._solve(rhs[:, ind_y], sol[:, ind_y], ind_y=ind_y)
 
         self.sol = sol
+        self.mtx_fact = solver.fact
 
     def _train(self):
         """
@@ -126,6 +128,31 @@ class RBF(SurrogateModel):
                 self._new_train()
                 outputs['sol'] = self.sol
 
+    def compute_loo_errors(self):
+        """
+        Compute the leave-one-out cross-validation errors at the training points.
+
+        The error at the i-th training point is the difference between its output
+        and the prediction of the model trained without it. It is sol_i / (A^-1)_ii
+        (Rippa formula), where A is the matrix of the linear system including the
+        polynomial terms, computed from the LU factorization of A without retraining.
+        The diagonal of A^-1 is obtained by solving nt right-hand sides with these
+        factors: the cost is O(nt^3) operations, as for the factorization, and O(nt^2)
+        memory.
+
+        Returns
+        -------
+        errors : np.ndarray[nt, ny]
+            The leave-one-out errors y_i - y_-i(x_i).
+        """
+        if not hasattr(self, 'mtx_fact'):
+            # The solution was loaded from data_dir
+            self._new_train()
+
+        nt = self.num['radial']
+        Ainv = scipy.linalg.lu_solve(self.mtx_fact, np.eye(self.num['dof'], nt))
+        return self.sol[:nt, :] / np.diag(Ainv)[:, np.newaxis]
+
     def _predict_values(self, x):
         """
         Evaluates the model at a set of points.
@@ -0,0 +1,272 @@
+'''
+This package is distributed under New BSD license.
+'''
+
+from __future__ import division
+import numpy as np
+from scipy import linalg
+
+from smt.surrogate_models.krg_based import KrgBased
+from smt.utils.kriging_utils import componentwise_distance, cross_correlation_matrix
+from smt.utils.checks import check_2d_array, check_nx
+
+"""
+The sparse kriging class.
+"""
+
+class SGP(KrgBased):
+
+    """
+    - SGP
+    """
+    def _initialize(self):
+        super(SGP, self)._initialize()
+        declare = self.options.declare
+        declare('theta0', None, types=(list, np.ndarray), desc='Initial hyperparameters')
+        declare('n_inducing', 10, types=int, desc='Number of inducing points')
+        declare('inducing', None, types=np.ndarray,
+                desc='Inducing inputs [n_inducing, nx]; a random subset of the training inputs if None')
+        declare('method', 'FITC', values=('FITC', 'VFE'),
+                desc='Sparse approximation: fully independent training conditional or '
+                     'variational free energy')
+        declare('eval_noise', True, types = bool, \
+                values = (True, False), desc ='noise evaluation flag')
+        declare('noise0', 1e-2, types = float, \
+                desc ='Initial noise hyperparameter')
+        self.name = 'SGP'
+
+    def _compute_pls(self,X,y):
+        # No PLS projection: the inducing inputs are chosen in the original space
+        if self.options['inducing'] is None:
+            n_inducing = min(self.options['n_inducing'], X.shape[0])
+            random_state = np.random.RandomState(self.options['seed'])
+            self.Z = X[random_state.permutation(X.shape[0])[:n_inducing]].copy()
+        else:
+            self.Z = check_2d_array(self.options['inducing'], 'inducing')
+            check_nx(self.nx, self.Z)
+
+        return X,y
+
+    def _componentwise_distance(self,dx,opt=0):
+        d = componentwise_distance(dx,self.options['corr'].__name__,
+                                   self.nx)
+        return d
+
+    def _check_param(self):
+        super(SGP, self)._check_param()
+
+        if self.options['hyper_opt'] != 'Cobyla':
+            raise ValueError("The likelihood gradient is not available for SGP, "
+                             "%s was given." % self.options['hyper_opt'])
+
+    def _reduced_likelihood_function(self, theta):
+
+        """
+        This function determines the BLUP parameters and evaluates the reduced
+        likelihood function for the given autocorrelation parameters theta,
+        the covariance of the training outputs being approximated through the
+        m inducing points by Q_nn + Lambda, with Q_nn = K_nm K_mm^-1 K_mn.
+        The cost is O(nt m^2).
+
+        Parameters
+        ----------
+        theta: list(dim + 1)
+            - An array containing the autocorrelation parameters at which the
+              Gaussian Process model parameters should be determined, the
+              last one being the noise when eval_noise is used.
+
+        Returns
+        -------
+        reduced_likelihood_function_value: real
+            - The value of the reduced likelihood function associated to the
+              given autocorrelation parameters theta.
+
+        par: dict()
+            - A dictionary containing the requested Gaussian Process model
+              parameters:
+
+            sigma2
+            Gaussian Process variance.
+            beta
+            Generalized least-squares regression weights.
+            gamma
+            Weights of the correlation with the inducing points.
+            C
+            Cholesky decomposition of the correlation matrix K_mm of the inducing points.
+            LB
+            Cholesky decomposition of I + C^-1 K_mn Lambda^-1 K_nm C^-T.
+            Ft
+            Solution of the linear equation system : LB^T x Ft = LB^-1 C^-1 K_mn Lambda^-1 F
+            G
+            Cholesky decomposition of F^T (Q_nn + Lambda)^-1 F.
+        """
+        # Initialize output
+        reduced_likelihood_function_value = - np.inf
+        par = {}
+        # Jitter of the correlation matrix of the inducing points
+        MACHINE_EPSILON = np.finfo(np.double).eps
+        nugget = 1e6*MACHINE_EPSILON
+        noise = 0.
+        tmp_var = theta
+        if self.options['eval_noise']:
+            theta = tmp_var[:-1]
+            noise = tmp_var[-1]
+
+        weights = self._corr_map.dot(theta)
+        corr = self.options['corr'].__name__
+        Z = (self.Z - self.X_mean) / self.X_std
+        Kmm = cross_correlation_matrix(Z, Z, weights, corr) + nugget * np.eye(Z.shape[0])
+        Kmn = cross_correlation_matrix(Z, self.X_norma, weights, corr)
+
+        try:
+            C = linalg.cholesky(Kmm, lower=True)
+        except (linalg.LinAlgError, ValueError):
+            return reduced_likelihood_function_value, par
+
+        # Q_nn = V^T V and diag(K_nn - Q_nn)
+        V = linalg.solve_triangular(C, Kmn, lower=True)
+        diag_err = np.maximum(1. - (V ** 2).sum(axis=0), 0.)
+        if self.options['method'] == 'FITC':
+            Lambda = diag_err + noise + MACHINE_EPSILON
+            trace_term = 0.
+        else:
+            # VFE
+            Lambda = np.ones(self.nt) * (noise + MACHINE_EPSILON)
+            trace_term = diag_err.sum() / Lambda[0]
+
+        # Woodbury identity: (Q_nn + Lambda)^-1 = Lambda^-1 - Lambda^-1 V^T B^-1 V Lambda^-1
+        A = V / np.sqrt(Lambda)
+        B = np.eye(Z.shape[0]) + np.dot(A, A.T)
+        try:
+            LB = linalg.cholesky(B, lower=True)
+        except (linalg.LinAlgError, ValueError):
+            return reduced_likelihood_function_value, par
+
+        cF = linalg.solve_triangular(LB, np.dot(V, self.F / Lambda[:, np.newaxis]), lower=True)
+        cy = linalg.solve_triangular(LB, np.dot(V, self.y_norma / Lambda[:, np.newaxis]), lower=True)
+
+        # Get generalized least squares solution
+        FSF = np.dot(self.F.T, self.F / Lambda[:, np.newaxis]) - np.dot(cF.T, cF)
+        FSy = np.dot(self.F.T, self.y_norma / Lambda[:, np.newaxis]) - np.dot(cF.T, cy)
+        try:
+            G = linalg.cholesky(FSF)
+        except (linalg.LinAlgError, ValueError):
+            return reduced_likelihood_function_value, par
+        sv = linalg.svd(G, compute_uv=False)
+        rcondG = sv[-1] / sv[0]
+        if rcondG < 1e-10:
+            # Check F
+            sv = linalg.svd(self.F, compute_uv=False)
+            condF = sv[0] / sv[-1]
+            if condF > 1e15:
+                raise Exception("F is too ill conditioned. Poor combination "
+                                "of regression model and observations.")
+
+            else:
+                # Ft is too ill conditioned, get out (try different theta)
+                return reduced_likelihood_function_value, par
+
+        beta = linalg.cho_solve((G, False), FSy)
+        rho = self.y_norma - np.dot(self.F, beta)
+        c_rho = cy - np.dot(cF, beta)
+        Sinv_rho = (rho - np.dot(V.T, linalg.solve_triangular(LB.T, c_rho))) / Lambda[:, np.newaxis]
+
+        # The determinant of Q_nn + Lambda from the one of B
+        detR = np.exp((np.log(Lambda).sum() + 2. * np.log(np.diag(LB)).sum()) / self.nt)
+
+        # Compute/Organize output
+        sigma2 = ((rho * Sinv_rho).sum(axis=0) + trace_term) / self.nt
+        reduced_likelihood_function_value = - self._shared_variance(sigma2) * detR
+        par['sigma2'] = sigma2 * self.y_std ** 2.
+        par['beta'] = beta
+        par['gamma'] = linalg.solve_triangular(C.T, np.dot(V, Sinv_rho))
+        par['C'] = C
+        par['LB'] = LB
+        par['Ft'] = linalg.solve_triangular(LB.T, cF)
+        par['G'] = G
+
+        # A particular case when f_min_cobyla fail
+        self._update_best_iteration(reduced_likelihood_function_value, tmp_var)
+
+        return reduced_likelihood_function_value, par
+
+    def _inducing_correlation(self, x):
+        """
+        Evaluates the correlation between normalized points and the inducing points.
+        """
+        Z = (self.Z - self.X_mean) / self.X_std
+        return cross_correlation_matrix(x, Z, self._corr_map.dot(self.optimal_theta),
+                                        self.options['corr'].__name__)
+
+    def _predict_all(self, x, variances, gradients):
+        # Initialization
+        x = (x - self.X_mean) / self.X_std
+        r = self._inducing_correlation(x)
+
+        y = self._values_from_correlation(x, r)
+        s2 = dy_dx = None
+        if variances:
+            s2 = self._variances_from_correlation(x, r)
+        if gradients:
+            dy_dx = self._derivatives_from_correlation(
+                x, r, (self.Z - self.X_mean) / self.X_std)
+
+        return y, s2, dy_dx
+
+    def _variances_from_correlation(self, x, r, par=None):
+        if par is None:
+            par = self.optimal_par
+        v = linalg.solve_triangular(par['C'], r.T, lower=True)
+        vB = linalg.solve_triangular(par['LB'], v, lower=True)
+
+        u = linalg.solve_triangular(par['G'].T,np.dot(par['Ft'].T, v) -
+                             self.options['poly'](x).T, lower=True)
+
+        MSE = np.outer(1.-(v ** 2.).sum(axis=0)+(vB ** 2.).sum(axis=0)+(u ** 2.).sum(axis=0),
+                       par['sigma2'])
+        # Mean Squared Error might be slightly negative depending on
+        # machine precision: force to zero!
+        MSE[MSE < 0.] = 0.
+        return MSE
+
+    def _predict_values(self, x):
+        """
+        Evaluates the model at a set of points, in O(m) operations per point.
+
+        Arguments
+        ---------
+        x : np.ndarray [n_evals, dim]
+            Evaluation point input variable values
+
+        Returns
+        -------
+        y : np.ndarray
+            Evaluation point output variable values
+        """
+        return self._predict_all(x, False, False)[0]
+
+    def _predict_derivatives(self, x, kx):
+        """
+        Evaluates the derivatives at a set of points.
+
+        Arguments
+        ---------
+        x : np.ndarray [n_evals, dim]
+            Evaluation point input variable values
+        kx : int
+            The 0-based index of the input variable with respect to which derivatives are desired.
+
+        Returns
+        -------
+        y : np.ndarray
+            Derivative values.
+        """
+        # Initialization
+        x = (x - self.X_mean) / self.X_std
+        r = self._inducing_correlation(x)
+
+        return self._derivatives_from_correlation(
+            x, r, (self.Z - self.X_mean) / self.X_std, kx)[:, 0, :]
+
+    def _predict_variances(self, x):
+        return self._predict_all(x, True, False)[1]
@@ -73,6 +73,9 @@ class SurrogateModel(object):
                 desc='Whether to print problem information')
         declare('print_solver', True, types=bool,
                 desc='Whether to print solver information')
+        declare('chunk_size', None, types=int,
+                desc='Maximum number of points evaluated at once during prediction; '
+                     'all the points are evaluated at once if None')
 
         self._initialize()
         self.options.update(kwargs)
@@ -249,7 +252,7 @@ class SurrogateModel(object):
 
         #Evaluate the unknown points using the specified model-method
         with self.printer._timed_context('Predicting', key='prediction'):
-            y = self._predict_values(x)
+            y = self._predict_chunks(self._predict_values, x)
 
         time_pt = self.printer._time('prediction')[-1] / n
         self.printer()
@@ -289,7 +292,7 @@ class SurrogateModel(object):
 
         #Evaluate the unknown points using the specified model-method
         with self.printer._timed_context('Predicting', key='prediction'):
-            y = self._predict_derivatives(x, kx)
+            y = self._predict_chunks(self._predict_derivatives, x, kx)
 
         time_pt = self.printer._time('prediction')[-1] / n
         self.printer()
@@ -334,11 +337,65 @@ class SurrogateModel(object):
             Variances.
         """
         check_support(self, 'variances')
+        x = check_2d_array(x, 'x')
         check_nx(self.nx, x)
         n = x.shape[0]
-        s2 = self._predict_variances(x)
+        s2 = self._predict_chunks(self._predict_variances, x)
         return s2.reshape((n, self.ny))
 
+    def _predict_chunks(self, func, x, *args):
+        """
+        Evaluates a prediction method over chunks of at most chunk_size points.
+
+        Parameters
+        ----------
+        func : callable
+            Prediction method, called as func(x_chunk, *args).
+        x : np.ndarray[n, nx]
+            Input values for the prediction points.
+        *args
+            Additional arguments passed to func.
+
+        Returns
+        -------
+        y : np.ndarray[n, m]
+            Concatenated outputs of func, filled chunk by chunk.
+        """
+        n = x.shape[0]
+        chunks = self._chunk_slices(n)
+        if len(chunks) <= 1:
+            return func(x, *args).reshape((n, -1))
+
+        y = None
+        for chunk in chunks:
+            x_chunk = x[chunk]
+            y_chunk = func(x_chunk, *args).reshape((x_chunk.shape[0], -1))
+            if y is None:
+                y = np.empty((n, y_chunk.shape[1]), dtype=y_chunk.dtype)
+            y[chunk] = y_chunk
+        return y
+
+    def _chunk_slices(self, n):
+        """
+        Splits n prediction points into chunks of at most chunk_size points.
+
+        Parameters
+        ----------
+        n : int
+            Number of prediction points.
+
+        Returns
+        -------
+        chunks : list of slice
+            Slices of the consecutive chunks, a single one if chunk_size is None.
+        """
+        chunk_size = self.options['chunk_size']
+        if chunk_size is not None and chunk_size < 1:
+            raise ValueError("chunk_size should be at least 1, %s was given." % chunk_size)
+        if chunk_size is None or n <= chunk_size:
+            return [slice(0, n)]
+        return [slice(i, i + chunk_size) for i in range(0, n, chunk_size)]
+
     def _initialize(self):
         """
         Implemented by surrogate models to declare options and declare what they support (optional).
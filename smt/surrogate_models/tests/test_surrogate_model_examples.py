@@ -242,6 +242,117 @@ class Test(unittest.TestCase):
         plt.legend(['Training data', 'Prediction'])
         plt.show()
 
+    def test_sgp(self):
+        import numpy as np
+        import matplotlib.pyplot as plt
+
+        from smt.surrogate_models import SGP
+
+        np.random.seed(0)
+        xt = np.random.rand(200) * 4.
+        yt = np.sin(2. * xt) + 0.1 * np.random.randn(200)
+
+        sm = SGP(theta0=[1e-2], n_inducing=10, method='VFE')
+        sm.set_training_values(xt, yt)
+        sm.train()
+
+        num = 100
+        x = np.linspace(0., 4., num)
+        y = sm.predict_values(x)
+        s2 = sm.predict_variances(x)
+
+        plt.plot(xt, yt, '.')
+        plt.plot(x, y)
+        plt.fill_between(x, y[:, 0] - 3 * np.sqrt(s2[:, 0]), y[:, 0] + 3 * np.sqrt(s2[:, 0]),
+                         alpha=0.3)
+        plt.xlabel('x')
+        plt.ylabel('y')
+        plt.legend(['Training data', 'Prediction', 'Confidence interval 99%'])
+        plt.show()
+
+    def test_local_krg(self):
+        import numpy as np
+        import matplotlib.pyplot as plt
+
+        from smt.surrogate_models import LocalKRG
+
+        np.random.seed(0)
+        xt = np.random.rand(2000) * 4.
+        yt = np.sin(2. * xt) * np.exp(-0.2 * xt)
+
+        sm = LocalKRG(theta0=[1e-2], n_neighbors=10, n_subsample=50)
+        sm.set_training_values(xt, yt)
+        sm.train()
+
+        num = 100
+        x = np.linspace(0., 4., num)
+        y = sm.predict_values(x)
+
+        plt.plot(xt, yt, '.')
+        plt.plot(x, y)
+        plt.xlabel('x')
+        plt.ylabel('y')
+        plt.legend(['Training data', 'Prediction'])
+        plt.show()
+
+    def test_grid_krg(self):
+        import numpy as np
+        import matplotlib.pyplot as plt
+
+        from smt.surrogate_models import GridKRG
+        from smt.sampling_methods import FullFactorial
+
+        xlimits = np.array([[0., 4.], [0., 3.]])
+        sampling = FullFactorial(xlimits=xlimits, clip=True)
+        xt = sampling(300)
+        yt = np.sin(2. * xt[:, 0]) * np.cos(xt[:, 1])
+
+        sm = GridKRG(theta0=[1e-2, 1e-2])
+        sm.set_training_values(xt, yt)
+        sm.train()
+
+        num = 100
+        x1, x2 = np.meshgrid(np.linspace(0., 4., num), np.linspace(0., 3., num))
+        x = np.vstack([x1.ravel(), x2.ravel()]).T
+        y = sm.predict_values(x)
+
+        plt.contourf(x1, x2, y.reshape(x1.shape), 20)
+        plt.colorbar()
+        plt.plot(xt[:, 0], xt[:, 1], 'k.')
+        plt.xlabel('x1')
+        plt.ylabel('x2')
+        plt.show()
+
+    def test_gek(self):
+        import numpy as np
+        import matplotlib.pyplot as plt
+
+        from smt.surrogate_models import GEK
+
+        xt = np.array([0., 1.5, 3., 4.])
+        yt = xt * np.sin(xt)
+        dyt = np.sin(xt) + xt * np.cos(xt)
+
+        sm = GEK(theta0=[1e-2])
+        sm.set_training_values(xt, yt)
+        sm.set_training_derivatives(xt, dyt, 0)
+        sm.train()
+
+        num = 100
+        x = np.linspace(0., 4., num)
+        y = sm.predict_values(x)
+        s2 = sm.predict_variances(x)
+
+        plt.plot(xt, yt, 'o')
+        plt.plot(x, y)
+        plt.plot(x, x * np.sin(x), '--')
+        plt.fill_between(x, y[:, 0] - 3 * np.sqrt(s2[:, 0]), y[:, 0] + 3 * np.sqrt(s2[:, 0]),
+                         alpha=0.3)
+        plt.xlabel('x')
+        plt.ylabel('y')
+        plt.legend(['Training data', 'Prediction', 'x sin(x)', 'Confidence interval 99%'])
+        plt.show()
+
     def test_gekpls(self):
         import numpy as np
         from mpl_toolkits.mplot3d import Axes3D
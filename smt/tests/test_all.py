@@ -19,7 +19,7 @@ from smt.sampling_methods import LHS, FullFactorial
 from smt.utils.sm_test_case import SMTestCase
 from smt.utils.silence import Silence
 from smt.utils import compute_rms_error
-from smt.surrogate_models import LS, QP, KPLS, KRG, KPLSK, GEKPLS
+from smt.surrogate_models import LS, QP, KPLS, KRG, KPLSK, GEKPLS, SGP, LocalKRG
 from smt.extensions import MFK
 from copy import deepcopy
 try:
@@ -51,6 +51,8 @@ class Test(SMTestCase):
         sms['MFK'] = MFK(theta0=[1e-2]*ndim)
         sms['KPLS'] = KPLS(theta0=[1e-2]*ncomp,n_comp=ncomp)
         sms['KPLSK'] = KPLSK(theta0=[1]*ncomp,n_comp=ncomp)
+        sms['SGP'] = SGP(theta0=[1e-2]*ndim, n_inducing=30)
+        sms['LocalKRG'] = LocalKRG(theta0=[1e-2]*ndim, n_neighbors=30)
         sms['GEKPLS'] = GEKPLS(theta0=[1e-2]*ncomp,n_comp=ncomp,delta_x=1e-1)
         if compiled_available:
             sms['IDW'] = IDW()
@@ -66,6 +68,8 @@ class Test(SMTestCase):
         t_errors['KPLS'] = 1e-5
         t_errors['KPLSK'] = 1e-5
         t_errors['GEKPLS'] = 1e-5
+        t_errors['SGP'] = 1e-2
+        t_errors['LocalKRG'] = 1e-5
         if compiled_available:
             t_errors['IDW'] = 1e-15
             t_errors['RBF'] = 1e-2
@@ -80,6 +84,8 @@ class Test(SMTestCase):
         e_errors['KPLS'] = 1e-2
         e_errors['KPLSK'] = 1e-2
         e_errors['GEKPLS'] = 1e-2
+        e_errors['SGP'] = 1e-1
+        e_errors['LocalKRG'] = 1e-1
         if compiled_available:
             e_errors['IDW'] = 1e0
             e_errors['RBF'] = 1e0
@@ -189,6 +195,12 @@ class Test(SMTestCase):
     def test_exp_KPLSK(self):
         self.run_test()
 
+    def test_exp_SGP(self):
+        self.run_test()
+
+    def test_exp_LocalKRG(self):
+        self.run_test()
+
     def test_exp_GEKPLS(self):
         self.run_test()
 
@@ -230,6 +242,12 @@ class Test(SMTestCase):
     def test_tanh_KPLSK(self):
         self.run_test()
 
+    def test_tanh_SGP(self):
+        self.run_test()
+
+    def test_tanh_LocalKRG(self):
+        self.run_test()
+
     def test_tanh_GEKPLS(self):
         self.run_test()
 
@@ -270,6 +288,12 @@ class Test(SMTestCase):
     def test_cos_KPLSK(self):
         self.run_test()
 
+    def test_cos_SGP(self):
+        self.run_test()
+
+    def test_cos_LocalKRG(self):
+        self.run_test()
+
     def test_cos_GEKPLS(self):
         self.run_test()
 
@@ -0,0 +1,117 @@
+'''
+This package is distributed under New BSD license.
+'''
+
+from __future__ import print_function, division
+import numpy as np
+import unittest
+import inspect
+
+from collections import OrderedDict
+
+from smt.problems import Sphere
+from smt.sampling_methods import LHS
+from smt.utils.sm_test_case import SMTestCase
+from smt.utils.silence import Silence
+from smt.surrogate_models import LS, QP, KRG
+try:
+    from smt.surrogate_models import IDW, RBF, RMTC, RMTB
+    compiled_available = True
+except:
+    compiled_available = False
+
+
+class Test(SMTestCase):
+
+    def setUp(self):
+        ndim = 2
+        self.nt = 50
+        self.ne = 103
+
+        self.problem = Sphere(ndim=ndim)
+
+        self.sms = sms = OrderedDict()
+        sms['LS'] = LS()
+        sms['QP'] = QP()
+        if compiled_available:
+            sms['IDW'] = IDW()
+            sms['RBF'] = RBF()
+            sms['RMTB'] = RMTB()
+            sms['RMTC'] = RMTC()
+
+    def run_test(self):
+        method_name = inspect.stack()[1][3]
+        sname = method_name.split('_')[1]
+
+        prob = self.problem
+        sampling = LHS(xlimits=prob.xlimits)
+
+        np.random.seed(0)
+        xt = sampling(self.nt)
+        yt = prob(xt)
+
+        np.random.seed(1)
+        xe = sampling(self.ne)
+
+        sm0 = self.sms[sname]
+
+        sm = sm0.__class__()
+        sm.options = sm0.options.clone()
+        if sm.options.is_declared('xlimits'):
+            sm.options['xlimits'] = prob.xlimits
+        sm.options['print_global'] = False
+
+        sm.set_training_values(xt, yt)
+        with Silence():
+            sm.train()
+
+        ye = sm.predict_values(xe)
+        dye = sm.predict_derivatives(xe, 1)
+
+        sm.options['chunk_size'] = 10
+        self.assert_error(sm.predict_values(xe), ye, atol=1e-12, rtol=1e-10)
+        self.assert_error(sm.predict_derivatives(xe, 1), dye, atol=1e-12, rtol=1e-10)
+
+    def test_invalid_chunk_size(self):
+        sm = LS(print_global=False)
+        sm.set_training_values(np.zeros((3, 1)), np.zeros(3))
+        with Silence():
+            sm.train()
+        for chunk_size in [0, -1]:
+            sm.options['chunk_size'] = chunk_size
+            self.assertRaises(ValueError, sm.predict_values, np.zeros((5, 1)))
+
+        sm = KRG(theta0=[1e-2], print_global=False)
+        xt = np.linspace(0., 1., 4).reshape((-1, 1))
+        sm.set_training_values(xt, xt ** 2)
+        with Silence():
+            sm.train()
+        for chunk_size in [0, -1]:
+            sm.options['chunk_size'] = chunk_size
+            self.assertRaises(ValueError, sm.predict_all, np.zeros((5, 1)))
+
+    def test_LS(self):
+        self.run_test()
+
+    def test_QP(self):
+        self.run_test()
+
+    @unittest.skipIf(not compiled_available, 'Compiled Fortran libraries not available')
+    def test_IDW(self):
+        self.run_test()
+
+    @unittest.skipIf(not compiled_available, 'Compiled Fortran libraries not available')
+    def test_RBF(self):
+        self.run_test()
+
+    @unittest.skipIf(not compiled_available, 'Compiled Fortran libraries not available')
+    def test_RMTB(self):
+        self.run_test()
+
+    @unittest.skipIf(not compiled_available, 'Compiled Fortran libraries not available')
+    def test_RMTC(self):
+        self.run_test()
+
+
+if __name__ == '__main__':
+    unittest.main()
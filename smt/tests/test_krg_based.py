@@ -0,0 +1,805 @@
+'''
+Author: Dr. Mohamed A. Bouhlel <mbouhlel@umich.edu>
+
+This package is distributed under New BSD license.
+'''
+
+from __future__ import print_function, division
+import numpy as np
+import unittest
+import json
+from scipy import linalg
+from copy import deepcopy
+
+from smt.problems import TensorProduct
+from smt.sampling_methods import LHS, FullFactorial, NestedLHS
+
+from smt.utils.sm_test_case import SMTestCase
+from smt.utils.silence import Silence
+from smt.utils import compute_rms_error
+from smt.utils.kriging_utils import l1_cross_distances, componentwise_distance, \
+    componentwise_distance_PLS, abs_exp, squar_exp, wendland_c2, ge_compute_pls
+from smt.surrogate_models import KRG, KPLS, KPLSK, SGP, LocalKRG, GridKRG, GEK, GEKPLS
+from smt.extensions import MFK, MFKPLS, MFKPLSK
+
+
+class Test(SMTestCase):
+
+    def setUp(self):
+        ndim = 3
+        nt = 40
+        ne = 100
+
+        prob = TensorProduct(ndim=ndim, func='exp')
+        sampling = LHS(xlimits=prob.xlimits)
+
+        np.random.seed(0)
+        self.xt = sampling(nt)
+        self.yt = prob(self.xt)
+
+        np.random.seed(1)
+        self.xe = sampling(ne)
+        self.ye = prob(self.xe)
+
+        self.ndim = ndim
+
+    def train(self, sm):
+        sm.options['print_global'] = False
+        sm.set_training_values(self.xt, self.yt)
+        with Silence():
+            sm.train()
+        return sm
+
+    def setup_likelihood(self, sm):
+        # restore the training data used by _reduced_likelihood_function
+        sm.y_norma = (sm.training_points[None][0][1] - sm.y_mean) / sm.y_std
+        if sm.options['low_memory']:
+            sm.D = None
+            sm._corr_map = sm._componentwise_distance(np.eye(self.ndim))
+        else:
+            D, sm.ij = l1_cross_distances(sm.X_norma)
+            sm.D = sm._componentwise_distance(D)
+
+    def check_likelihood_gradient(self, sm, theta):
+        self.setup_likelihood(sm)
+
+        _, grad, _ = sm._reduced_likelihood_gradient(theta)
+
+        h = 1e-6
+        log10t = np.log10(theta)
+        grad_fd = np.zeros(len(theta))
+        for k in range(len(theta)):
+            dlog10t = np.zeros(len(theta))
+            dlog10t[k] = h
+            grad_fd[k] = (sm._reduced_likelihood_function(10. ** (log10t + dlog10t))[0]
+                          - sm._reduced_likelihood_function(10. ** (log10t - dlog10t))[0]) / (2 * h)
+
+        self.assert_error(grad, grad_fd, atol=1e-8, rtol=1e-5)
+
+    def test_correlation_kernels(self):
+        D, _ = l1_cross_distances(self.xt)
+        D = D * np.sign(self.xt[0] - self.xt[1])
+        coeff_pls = np.array([[1.], [-2.], [0.5]])
+        theta = np.array([3., 2., 1.])
+        for corr, func in [(abs_exp, np.abs), (squar_exp, np.square)]:
+            # the block size does not divide the number of pairs
+            d = componentwise_distance(D, corr.__name__, self.ndim, block_size=97)
+            self.assert_error(d, func(D), atol=1e-15, rtol=1e-15)
+            d_pls = componentwise_distance_PLS(D, corr.__name__, 1, coeff_pls, block_size=97)
+            self.assert_error(d_pls, func(D).dot(func(coeff_pls)), atol=1e-12, rtol=1e-12)
+
+            out = np.empty((d.shape[0], 1))
+            r = corr(theta, d, out=out, block_size=97)
+            self.assertIs(r, out)
+            self.assert_error(r[:, 0], np.exp(-np.sum(theta * d, axis=1)), atol=1e-15, rtol=1e-12)
+
+    def test_likelihood_gradient_KRG(self):
+        sm = self.train(KRG(theta0=[1e-2] * self.ndim))
+        self.check_likelihood_gradient(sm, np.array([3., 2., 1.]))
+
+    def test_likelihood_gradient_KRG_abs_exp_noise(self):
+        sm = self.train(KRG(theta0=[1e-2] * self.ndim, corr='abs_exp', eval_noise=True))
+        self.check_likelihood_gradient(sm, np.array([3., 2., 1., 1e-3]))
+
+    def test_likelihood_gradient_KPLS(self):
+        sm = self.train(KPLS(theta0=[1e-2], n_comp=1))
+        self.check_likelihood_gradient(sm, np.array([3.]))
+
+    def test_likelihood_gradient_low_memory(self):
+        sm = self.train(KRG(theta0=[1e-2] * self.ndim, low_memory=True))
+        self.check_likelihood_gradient(sm, np.array([3., 2., 1.]))
+
+        sm = self.train(KPLS(theta0=[1e-2], n_comp=1, corr='abs_exp', low_memory=True))
+        self.check_likelihood_gradient(sm, np.array([3.]))
+
+    def test_low_memory(self):
+        for hyper_opt in ['Cobyla', 'L-BFGS-B']:
+            for corr in ['squar_exp', 'abs_exp']:
+                sm0 = self.train(KRG(theta0=[1e-2] * self.ndim, corr=corr,
+                                     hyper_opt=hyper_opt))
+                sm = self.train(KRG(theta0=[1e-2] * self.ndim, corr=corr,
+                                    hyper_opt=hyper_opt, low_memory=True))
+
+                self.assert_error(sm.optimal_theta, sm0.optimal_theta, rtol=1e-6)
+                self.assert_error(sm.predict_values(self.xe), sm0.predict_values(self.xe),
+                                  atol=1e-8, rtol=1e-6)
+
+    def test_compact_correlation(self):
+        theta = np.array([3., 2., 1.])
+        nugget = 10. * np.finfo(np.double).eps
+        for corr in ['wendland_c2', 'wendland_c4']:
+            sm = self.train(KRG(theta0=[1e-2] * self.ndim, corr=corr))
+            self.setup_likelihood(sm)
+            rlf_value, par = sm._reduced_likelihood_function(theta)
+
+            # dense kriging system with the same correlation function
+            R = sm._correlation_vector(sm.X_norma, sm.X_norma, theta) + nugget * np.eye(sm.nt)
+            Rinv = np.linalg.inv(R)
+            beta = np.linalg.solve(sm.F.T.dot(Rinv).dot(sm.F), sm.F.T.dot(Rinv).dot(sm.y_norma))
+            rho = sm.y_norma - sm.F.dot(beta)
+            sigma2 = rho.T.dot(Rinv).dot(rho)[0, 0] / sm.nt
+            detR = np.linalg.det(R) ** (1. / sm.nt)
+            self.assertLess(np.count_nonzero(R), sm.nt ** 2)
+            self.assert_error(rlf_value, - sigma2 * detR, atol=1e-12, rtol=1e-8)
+            self.assert_error(par['gamma'], Rinv.dot(rho), atol=1e-8, rtol=1e-8)
+
+            y, s2 = sm.predict_values(self.xt), sm.predict_variances(self.xt)
+            self.assert_error(y, self.yt, atol=1e-8, rtol=1e-6)
+            self.assert_error(s2, np.zeros(s2.shape), atol=1e-8)
+            self.assert_error(compute_rms_error(sm, self.xe, self.ye), 0., 2e-1)
+            self.assertRaises(ValueError, sm.predict_variance_derivatives, self.xe)
+
+        for sm in [KRG(theta0=[1e-2] * self.ndim, corr='wendland_c2', hyper_opt='L-BFGS-B'),
+                   KPLS(theta0=[1e-2], n_comp=1, corr=wendland_c2)]:
+            self.assertRaises(ValueError, self.train, sm)
+        for sm_class in [KPLS, KPLSK, GEK, SGP, LocalKRG, MFK]:
+            self.assertRaises(AssertionError, sm_class, corr='wendland_c2')
+
+    def test_predict_all(self):
+        sm_mfk = MFK(theta0=[1e-2] * self.ndim, poly='linear', print_global=False)
+        sm_mfk.set_training_values(self.xt, 0.8 * self.yt + 1., name=0)
+        sm_mfk.set_training_values(self.xt[::3], self.yt[::3])
+        with Silence():
+            sm_mfk.train()
+
+        for sm in [self.train(KRG(theta0=[1e-2] * self.ndim, poly='linear')),
+                   self.train(KPLS(theta0=[1e-2] * 2, n_comp=2)),
+                   sm_mfk]:
+            y, s2, dy_dx = sm.predict_all(self.xe)
+
+            self.assert_error(y, sm.predict_values(self.xe), atol=1e-12, rtol=1e-12)
+            self.assert_error(s2, sm.predict_variances(self.xe), atol=1e-12, rtol=1e-12)
+            for kx in range(self.ndim):
+                self.assert_error(dy_dx[:, kx, :], sm.predict_derivatives(self.xe, kx),
+                                  atol=1e-12, rtol=1e-10)
+
+            # linear trend derivative and correlation derivative, by finite differences
+            h = 1e-6
+            for kx in range(self.ndim):
+                dx = np.zeros(self.ndim)
+                dx[kx] = h
+                dy_fd = (sm.predict_values(self.xe + dx) - sm.predict_values(self.xe - dx)) / (2 * h)
+                self.assert_error(dy_dx[:, kx, :], dy_fd, atol=1e-4, rtol=1e-5)
+
+            self.assert_error(sm.predict_all(self.xe, variances=False, gradients=False), y,
+                              atol=1e-12, rtol=1e-12)
+
+    def test_mfk_linear_trend_derivatives(self):
+        # each input has its own slope: the derivative with respect to kx only
+        # involves the regression weight of kx
+        slopes = np.array([1., -2., 3.])
+        sm = MFK(theta0=[1e-1] * self.ndim, poly='linear', print_global=False)
+        sm.set_training_values(self.xt, 0.8 * self.yt + self.xt.dot(slopes)[:, None], name=0)
+        sm.set_training_values(self.xt[::2], self.yt[::2])
+        with Silence():
+            sm.train()
+
+        h = 1e-6
+        for kx in range(self.ndim):
+            dx = np.zeros(self.ndim)
+            dx[kx] = h
+            dy_fd = (sm.predict_values(self.xe + dx) - sm.predict_values(self.xe - dx)) / (2 * h)
+            self.assert_error(sm.predict_derivatives(self.xe, kx), dy_fd, atol=1e-4, rtol=1e-5)
+
+    def test_predict_values_and_variances(self):
+        sm = MFK(theta0=[1e-1] * self.ndim, poly='linear', print_global=False)
+        sm.set_training_values(self.xt, 0.8 * self.yt + 1., name=0)
+        sm.set_training_values(self.xt[::2], 0.9 * self.yt[::2] + 0.5, name=1)
+        sm.set_training_values(self.xt[::4], self.yt[::4])
+        with Silence():
+            sm.train()
+
+        y, s2 = sm.predict_values_and_variances(self.xe)
+        self.assert_error(y, sm.predict_values(self.xe), atol=1e-12, rtol=1e-12)
+        self.assert_error(s2, sm.predict_all(self.xe, gradients=False)[1],
+                          atol=1e-12, rtol=1e-12)
+        self.assert_error(s2, sm.predict_variances(self.xe), atol=1e-12, rtol=1e-12)
+
+        y_all, s2_all = sm.predict_values_and_variances(self.xe, all_levels=True)
+        self.assertEqual(y_all.shape, (self.xe.shape[0], 3))
+        self.assert_error(s2_all, sm.predict_variances_all_levels(self.xe)[0],
+                          atol=1e-12, rtol=1e-12)
+        for lvl in range(3):
+            self.assert_error(y_all[:, [lvl]],
+                              sm._predict_intermediate_values(self.xe, lvl + 1),
+                              atol=1e-12, rtol=1e-12)
+
+        sm.options['chunk_size'] = 7
+        for val, val0 in zip(sm.predict_values_and_variances(self.xe, all_levels=True),
+                             [y_all, s2_all]):
+            self.assert_error(val, val0, atol=1e-12, rtol=1e-9)
+        for chunk_size in [0, -1]:
+            sm.options['chunk_size'] = chunk_size
+            self.assertRaises(ValueError, sm.predict_values_and_variances, self.xe)
+
+    def test_predict_hessians(self):
+        self.yt = np.hstack([self.yt, np.sin(self.xt[:, [0]])])
+        for sm in [self.train(KRG(theta0=[1.] * self.ndim, poly='linear', optimize_theta=False)),
+                   self.train(KPLS(theta0=[1.] * 2, n_comp=2, optimize_theta=False)),
+                   self.train(KRG(theta0=[1.] * self.ndim, shared_theta=False,
+                                  optimize_theta=False))]:
+            d2y_dx2 = sm.predict_hessians(self.xe)
+            self.assertEqual(d2y_dx2.shape, (self.xe.shape[0], self.ndim, self.ndim, 2))
+            self.assert_error(d2y_dx2, d2y_dx2.transpose(0, 2, 1, 3), atol=1e-12, rtol=1e-10)
+
+            # derivatives of the gradients, by finite differences
+            h = 1e-6
+            for kx in range(self.ndim):
+                dx = np.zeros(self.ndim)
+                dx[kx] = h
+                d2y_fd = (sm.predict_all(self.xe + dx, variances=False)[1] -
+                          sm.predict_all(self.xe - dx, variances=False)[1]) / (2 * h)
+                self.assert_error(d2y_dx2[:, :, kx, :], d2y_fd, atol=1e-4, rtol=1e-5)
+
+    def test_predict_variance_derivatives(self):
+        sm_mfk = MFK(theta0=[1e-1] * self.ndim, poly='linear', print_global=False)
+        sm_mfk.set_training_values(self.xt, 0.8 * self.yt + 1., name=0)
+        sm_mfk.set_training_values(self.xt[::2], 0.9 * self.yt[::2] + 0.5, name=1)
+        sm_mfk.set_training_values(self.xt[::4], self.yt[::4])
+        with Silence():
+            sm_mfk.train()
+        sms_mfk = [sm_mfk]
+        for sm_class in [MFKPLS, MFKPLSK]:
+            sm_mfkpls = sm_class(theta0=[1e-1] * 2, n_comp=2, poly='linear', print_global=False)
+            sm_mfkpls.set_training_values(self.xt, 0.8 * self.yt + 1., name=0)
+            sm_mfkpls.set_training_values(self.xt[::2], self.yt[::2])
+            with Silence():
+                sm_mfkpls.train()
+            sms_mfk.append(sm_mfkpls)
+
+        sm = self.train(KRG(theta0=[1.] * self.ndim, poly='linear', optimize_theta=False))
+        # universal kriging variance: sigma2 (1 - r R^-1 r^T + u^T (F^T R^-1 F)^-1 u),
+        # with u = F^T R^-1 r^T - f
+        x = (self.xe - sm.X_mean) / sm.X_std
+        r = sm._correlation_vector(x, sm.X_norma, sm.optimal_theta)
+        R = np.dot(sm.optimal_par['C'], sm.optimal_par['C'].T)
+        Rinv_rt = np.linalg.solve(R, r.T)
+        u = np.dot(sm.F.T, Rinv_rt) - sm.options['poly'](x).T
+        FRF = np.dot(sm.F.T, np.linalg.solve(R, sm.F))
+        s2 = sm.optimal_par['sigma2'] * (1. - (r.T * Rinv_rt).sum(axis=0) +
+                                         (u * np.linalg.solve(FRF, u)).sum(axis=0))
+        self.assert_error(sm.predict_variances(self.xe)[:, 0], s2, atol=1e-12, rtol=1e-8)
+
+        self.yt = np.hstack([self.yt, np.sin(self.xt[:, [0]])])
+        for sm in [self.train(KRG(theta0=[1.] * self.ndim, poly='linear', optimize_theta=False)),
+                   self.train(KPLS(theta0=[1.] * 2, n_comp=2, optimize_theta=False)),
+                   self.train(KRG(theta0=[1.] * self.ndim, shared_theta=False,
+                                  optimize_theta=False))] + sms_mfk:
+            ds2_dx = sm.predict_variance_derivatives(self.xe)
+            self.assertEqual(ds2_dx.shape, (self.xe.shape[0], self.ndim, sm.ny))
+
+            h = 1e-4
+            for kx in range(self.ndim):
+                dx = np.zeros(self.ndim)
+                dx[kx] = h
+                ds2_fd = (sm.predict_variances(self.xe + dx) -
+                          sm.predict_variances(self.xe - dx)) / (2 * h)
+                self.assert_error(ds2_dx[:, kx, :], ds2_fd, atol=1e-6, rtol=1e-5)
+
+    def test_chunk_size(self):
+        sm = self.train(KRG(theta0=[1e-2] * self.ndim, poly='linear'))
+        y, s2, dy_dx = sm.predict_all(self.xe)
+        dy_dx0 = sm.predict_derivatives(self.xe, 0)
+
+        sm.options['chunk_size'] = 7
+        self.assert_error(sm.predict_values(self.xe), y, atol=1e-12, rtol=1e-12)
+        self.assert_error(sm.predict_variances(self.xe), s2, atol=1e-12, rtol=1e-12)
+        self.assert_error(sm.predict_derivatives(self.xe, 0), dy_dx0, atol=1e-12, rtol=1e-12)
+        for val, val0 in zip(sm.predict_all(self.xe), [y, s2, dy_dx]):
+            self.assert_error(val, val0, atol=1e-12, rtol=1e-12)
+
+    def test_add_training_points(self):
+        for sm in [KRG(theta0=[1e-2] * self.ndim, poly='linear'),
+                   KPLS(theta0=[1e-2], n_comp=1, corr='abs_exp', eval_noise=True, low_memory=True)]:
+            sm.options['print_global'] = False
+            sm.set_training_values(self.xt[:30], self.yt[:30])
+            with Silence():
+                sm.train()
+            sm.add_training_points(self.xt[30:35], self.yt[30:35])
+            sm.add_training_points(self.xt[35:], self.yt[35:])
+
+            # same decompositions as the ones computed from scratch with the same hyperparameters
+            self.setup_likelihood(sm)
+            theta = sm.optimal_theta
+            if sm.options['eval_noise']:
+                theta = np.append(theta, sm.optimal_noise)
+            rlf_value, par = sm._reduced_likelihood_function(theta)
+            self.assertEqual(sm.nt, self.xt.shape[0])
+            self.assert_error(sm.optimal_rlf_value, rlf_value, atol=1e-12, rtol=1e-8)
+            for key in ['sigma2', 'beta', 'gamma', 'C', 'Ft']:
+                self.assert_error(sm.optimal_par[key], par[key], atol=1e-10, rtol=1e-8)
+
+            sm.add_training_points(self.xe[:5], self.ye[:5], reoptimize=True)
+            self.assertEqual(sm.nt, self.xt.shape[0] + 5)
+
+    def test_sgp(self):
+        # with the training inputs as inducing inputs, FITC is the noisy kriging model
+        theta = np.array([3., 2., 1., 1e-4])
+        sm0 = self.train(KRG(theta0=[1e-2] * self.ndim, eval_noise=True))
+        sm = self.train(SGP(theta0=[1e-2] * self.ndim, inducing=self.xt))
+        self.setup_likelihood(sm0)
+        sm.y_norma = (self.yt - sm.y_mean) / sm.y_std
+
+        rlf_value0, par0 = sm0._reduced_likelihood_function(theta)
+        rlf_value, par = sm._reduced_likelihood_function(theta)
+        self.assert_error(rlf_value, rlf_value0, atol=1e-12, rtol=1e-8)
+        for key in ['sigma2', 'beta']:
+            self.assert_error(par[key], par0[key], atol=1e-12, rtol=1e-8)
+
+        for method in ['FITC', 'VFE']:
+            sm = self.train(SGP(theta0=[1e-2] * self.ndim, n_inducing=20, method=method))
+            self.assertEqual(sm.optimal_par['gamma'].shape, (20, 1))
+            self.assert_error(compute_rms_error(sm, self.xe, self.ye), 0., 2e-1)
+
+            y, s2, dy_dx = sm.predict_all(self.xe)
+            self.assertTrue(np.all(s2 >= 0.))
+            for kx in range(self.ndim):
+                self.assert_error(dy_dx[:, kx, :], sm.predict_derivatives(self.xe, kx),
+                                  atol=1e-12, rtol=1e-10)
+
+    def test_sgp_seed(self):
+        # the inducing inputs, hence the training, only depend on the seed
+        sm = self.train(SGP(theta0=[1e-2] * self.ndim, n_inducing=20))
+        np.random.seed(1)
+        sm1 = self.train(SGP(theta0=[1e-2] * self.ndim, n_inducing=20))
+        sm2 = self.train(SGP(theta0=[1e-2] * self.ndim, n_inducing=20, seed=1))
+        self.assertTrue(np.array_equal(sm.Z, sm1.Z))
+        self.assertFalse(np.array_equal(sm.Z, sm2.Z))
+        self.assertTrue(np.array_equal(sm.optimal_theta, sm1.optimal_theta))
+        self.assertTrue(np.array_equal(sm.predict_values(self.xe), sm1.predict_values(self.xe)))
+
+    def test_local_krg(self):
+        # with all the training points as neighbors, LocalKRG is the kriging model
+        nt = self.xt.shape[0]
+        sm0 = self.train(KRG(theta0=[1e-2] * self.ndim))
+        sm = self.train(LocalKRG(theta0=[1e-2] * self.ndim, n_neighbors=nt, n_subsample=nt))
+        self.assert_error(sm.optimal_theta, sm0.optimal_theta, atol=1e-12, rtol=1e-10)
+        for res, res0 in zip(sm.predict_all(self.xe), sm0.predict_all(self.xe)):
+            self.assert_error(res, res0, atol=1e-10, rtol=1e-8)
+
+        sm = self.train(LocalKRG(theta0=[1e-2] * self.ndim, n_neighbors=10, n_subsample=20))
+        self.assert_error(compute_rms_error(sm, self.xe, self.ye), 0., 2e-1)
+        self.assertEqual(sm.nt, nt)
+        self.assertTrue(np.array_equal(sm.training_points[None][0][0], self.xt))
+
+        # the subsample only depends on the seed option
+        np.random.seed(1)
+        sm1 = self.train(LocalKRG(theta0=[1e-2] * self.ndim, n_neighbors=10, n_subsample=20))
+        self.assertTrue(np.array_equal(sm.optimal_theta, sm1.optimal_theta))
+
+        y, s2, dy_dx = sm.predict_all(self.xe)
+        self.assertTrue(np.all(s2 >= 0.))
+        for kx in range(self.ndim):
+            self.assert_error(dy_dx[:, kx, :], sm.predict_derivatives(self.xe, kx),
+                              atol=1e-12, rtol=1e-10)
+
+        # local systems made indefinite by round-off are regularized by a larger
+        # nugget, an indefinite one raises a LinAlgError
+        sm.optimal_theta = np.array([1e-9] * self.ndim)
+        sm.optimal_noise = -1e-14
+        self.assertTrue(np.all(np.isfinite(sm.predict_values(self.xe))))
+        sm.optimal_noise = -1.
+        self.assertRaises(linalg.LinAlgError, sm.predict_values, self.xe)
+
+    def test_grid_krg(self):
+        # on a full-factorial grid given in any order, GridKRG is the kriging model
+        prob = TensorProduct(ndim=self.ndim, func='exp')
+        np.random.seed(0)
+        xt = FullFactorial(xlimits=prob.xlimits, clip=True)(60)
+        self.xt = xt[np.random.permutation(xt.shape[0])]
+        self.yt = np.hstack([prob(self.xt), np.sin(self.xt[:, [0]])])
+        self.assertEqual(self.xt.shape[0], 64)
+
+        theta = np.array([3., 2., 1., 1e-4])
+        sm0 = self.train(KRG(theta0=[1e-2] * self.ndim, eval_noise=True))
+        sm = self.train(GridKRG(theta0=[1e-2] * self.ndim, eval_noise=True))
+        self.setup_likelihood(sm0)
+        sm.y_norma = (self.yt[np.argsort(sm._grid_index)] - sm.y_mean) / sm.y_std
+
+        rlf_value0, grad0, par0 = sm0._reduced_likelihood_gradient(theta)
+        rlf_value, grad, par = sm._reduced_likelihood_gradient(theta)
+        self.assert_error(rlf_value, rlf_value0, atol=1e-12, rtol=1e-10)
+        self.assert_error(grad, grad0, atol=1e-12, rtol=1e-8)
+
+        for model, par_ in [(sm0, par0), (sm, par)]:
+            model.optimal_theta, model.optimal_noise, model.optimal_par = \
+                theta[:-1], theta[-1], par_
+        for res, res0 in zip(sm.predict_all(self.xe), sm0.predict_all(self.xe)):
+            self.assert_error(res, res0, atol=1e-10, rtol=1e-8)
+        self.assert_error(sm.compute_loo_errors(), sm0.compute_loo_errors(),
+                          atol=1e-10, rtol=1e-8)
+
+        # the nodes of the axes are recovered from perturbed inputs
+        sm = self.train(GridKRG(theta0=[1e-2] * self.ndim))
+        self.xt = self.xt + 1e-8 * np.random.rand(*self.xt.shape)
+        sm1 = self.train(GridKRG(theta0=[1e-2] * self.ndim))
+        for axis, axis1 in zip(sm.axes, sm1.axes):
+            self.assert_error(axis1, axis, atol=1e-8, rtol=1e-8)
+
+        self.xt = self.xt[1:]
+        self.yt = self.yt[1:]
+        self.assertRaises(ValueError, self.train, GridKRG(theta0=[1e-2] * self.ndim))
+
+    def test_gek(self):
+        # GEK interpolates the training values and derivatives
+        prob = TensorProduct(ndim=self.ndim, func='exp')
+        dyt = np.hstack([prob(self.xt, kx=kx) for kx in range(self.ndim)])
+        for n_comp, poly in [(None, 'constant'), (2, 'linear')]:
+            sm = GEK(theta0=[1e-2] * (n_comp or self.ndim), poly=poly)
+            if n_comp is not None:
+                sm.options['n_comp'] = n_comp
+            for kx in range(self.ndim):
+                sm.set_training_derivatives(self.xt, dyt[:, [kx]], kx)
+            sm = self.train(sm)
+
+            y, s2, dy_dx = sm.predict_all(self.xt)
+            self.assert_error(y, self.yt, atol=1e-4, rtol=1e-4)
+            self.assert_error(dy_dx[:, :, 0], dyt, atol=1e-4, rtol=1e-4)
+            self.assert_error(s2, 0., atol=1e-4)
+            self.assert_error(compute_rms_error(sm, self.xe, self.ye), 0., 1e-2)
+
+            # the correlation with the training points gives the rows of [R] of
+            # the training values, and its derivatives the correlation with the
+            # derivatives at the points
+            sm._dx_pairs = sm.X_norma[sm.ij[:, 0]] - sm.X_norma[sm.ij[:, 1]]
+            weights = sm._componentwise_distance(np.eye(self.ndim)).dot(sm.optimal_theta)
+            R = sm._gek_correlation_matrix(weights, 1., 0.)
+            nt = self.xt.shape[0]
+            r_obs = sm._observation_correlation(sm.X_norma)[2]
+            self.assert_error(r_obs, R[:nt], atol=1e-12, rtol=1e-10)
+            h = 1e-6
+            for kx in range(self.ndim):
+                dx = h * np.eye(self.ndim)[kx]
+                dr_fd = (sm._observation_correlation(sm.X_norma + dx)[2] -
+                         sm._observation_correlation(sm.X_norma - dx)[2]) / (2 * h)
+                self.assert_error(dr_fd, R[(kx + 1) * nt:(kx + 2) * nt], atol=1e-6, rtol=1e-5)
+
+                self.assert_error(dy_dx[:, kx, :], sm.predict_derivatives(self.xt, kx),
+                                  atol=1e-12, rtol=1e-10)
+
+    def test_multi_output(self):
+        yt1 = self.yt
+        self.yt = np.hstack([yt1, 10. * np.sin(self.xt[:, [0]])])
+        ye = np.hstack([self.ye, 10. * np.sin(self.xe[:, [0]])])
+
+        sm = self.train(KRG(theta0=[1e-2] * self.ndim))
+        self.check_likelihood_gradient(sm, np.array([3., 2., 1.]))
+        y, s2, dy_dx = sm.predict_all(self.xe)
+        self.assertEqual(s2.shape, (self.xe.shape[0], 2))
+        self.assert_error(s2, sm.predict_variances(self.xe), atol=1e-12, rtol=1e-10)
+        self.assert_error(y, ye, atol=1e-1, rtol=1e-1)
+
+        # each output gets the hyperparameters of its own single-output model, up
+        # to the rounding of the likelihood: COBYLA amplifies it along its iterations
+        # and, with the rounding of the BLAS products of the correlation kernel,
+        # takes a different step near the flat maximum
+        sm = self.train(KRG(theta0=[1e-2] * self.ndim, shared_theta=False))
+        self.assertEqual(sm.optimal_theta.shape, (2, self.ndim))
+        state = dict(vars(sm))
+        self.assert_error(sm.predict_derivatives(self.xe, 0), dy_dx[:, 0, :],
+                          atol=1e-1, rtol=1e-1)
+        # predicting does not change the model
+        self.assertEqual(set(vars(sm)), set(state))
+        for key in state:
+            self.assertIs(vars(sm)[key], state[key])
+        self.yt = yt1
+        sm0 = self.train(KRG(theta0=[1e-2] * self.ndim))
+        self.assert_error(sm.optimal_rlf_value[0], sm0.optimal_rlf_value, atol=1e-8, rtol=1e-4)
+        self.assert_error(sm.optimal_theta[0], sm0.optimal_theta, atol=1e-8, rtol=2e-2)
+        for res, res0 in zip(sm.predict_all(self.xe), sm0.predict_all(self.xe)):
+            self.assert_error(res[..., :1], res0, atol=1e-6, rtol=2e-2)
+        y, s2, dy_dx = sm.predict_all(self.xe)
+        self.assert_error(s2, sm.predict_variances(self.xe), atol=1e-12, rtol=1e-10)
+        self.assert_error(dy_dx[:, 0, :], sm.predict_derivatives(self.xe, 0),
+                          atol=1e-12, rtol=1e-10)
+
+        # a constant output, of zero variance, does not change the hyperparameters
+        # shared with the other output
+        self.yt = np.hstack([yt1, np.ones(yt1.shape)])
+        for hyper_opt in ['Cobyla', 'L-BFGS-B']:
+            sm = self.train(KRG(theta0=[1e-2] * self.ndim, hyper_opt=hyper_opt))
+            sm0 = KRG(theta0=[1e-2] * self.ndim, hyper_opt=hyper_opt, print_global=False)
+            sm0.set_training_values(self.xt, yt1)
+            with Silence():
+                sm0.train()
+            y = sm.predict_values(self.xe)
+            self.assert_error(y[:, 1:], np.ones((self.xe.shape[0], 1)), atol=1e-12)
+            self.assert_error(sm.optimal_rlf_value, sm0.optimal_rlf_value, atol=1e-8, rtol=1e-4)
+            if hyper_opt == 'L-BFGS-B':
+                self.assert_error(sm.optimal_theta, sm0.optimal_theta, atol=1e-8, rtol=1e-6)
+                self.assert_error(y[:, :1], sm0.predict_values(self.xe), atol=1e-6, rtol=1e-6)
+            else:
+                # The likelihood is flat near its maximum, where the rounding errors
+                # of the two-column solves move the end point of COBYLA
+                self.assert_error(sm.optimal_theta, sm0.optimal_theta, atol=1e-8, rtol=5e-2)
+                self.assertLess(np.linalg.norm(y[:, :1] - self.ye),
+                                1.05 * np.linalg.norm(sm0.predict_values(self.xe) - self.ye))
+        self.check_likelihood_gradient(sm, np.array([3., 2., 1.]))
+
+    def test_loo_errors(self):
+        for sm in [KRG(theta0=[1e-2] * self.ndim, poly='linear'),
+                   KRG(theta0=[1e-2] * self.ndim, eval_noise=True),
+                   KRG(theta0=[1.] * self.ndim, corr='wendland_c4'),
+                   KPLS(theta0=[1e-2] * 2, n_comp=2, corr='abs_exp')]:
+            self.train(sm)
+            errors = sm.compute_loo_errors()
+
+            # retrain the regression and the interpolation without each point,
+            # the hyperparameters being kept
+            X, F, nt = sm.X_norma, sm.F, self.xt.shape[0]
+            y = (self.yt - sm.y_mean) / sm.y_std
+            R = sm._training_correlation(X)
+            R = R.toarray() if hasattr(R, 'toarray') else R
+            R += np.eye(nt) * (10. * np.finfo(np.double).eps + sm.optimal_noise)
+            errors_ref = np.zeros(y.shape)
+            for i in range(nt):
+                mask = np.arange(nt) != i
+                Rinv = np.linalg.inv(R[mask][:, mask])
+                beta = np.linalg.solve(F[mask].T.dot(Rinv).dot(F[mask]),
+                                       F[mask].T.dot(Rinv).dot(y[mask]))
+                errors_ref[i] = y[i] - F[i].dot(beta) - \
+                    R[i, mask].dot(Rinv).dot(y[mask] - F[mask].dot(beta))
+            self.assert_error(errors, errors_ref * sm.y_std, atol=1e-8, rtol=1e-5)
+
+    def test_warm_start(self):
+        for sm_class, options in [(KRG, dict(theta0=[1e-2] * self.ndim, eval_noise=True)),
+                                  (KPLSK, dict(theta0=[1e-2], n_comp=1))]:
+            sm0 = self.train(sm_class(**options))
+            # the record can be saved as JSON
+            hyperparameters = json.loads(json.dumps(sm0.get_hyperparameters()))
+
+            sm = self.train(sm_class(hyperparameters=hyperparameters, optimize_theta=False,
+                                     **options))
+            self.assert_error(sm.optimal_theta, sm0.optimal_theta, atol=1e-15, rtol=1e-12)
+            self.assert_error(sm.predict_values(self.xe), sm0.predict_values(self.xe),
+                              atol=1e-12, rtol=1e-10)
+
+            sm = self.train(sm_class(hyperparameters=hyperparameters, **options))
+            self.assertGreaterEqual(sm.optimal_rlf_value, sm0.optimal_rlf_value * (1. + 1e-8))
+
+        sm = KPLS(theta0=[1e-2], n_comp=1, hyperparameters=hyperparameters)
+        self.assertRaises(ValueError, self.train, sm)
+
+        # the correlation matrix is not positive definite at the starting point
+        hyperparameters = {'name': 'Kriging', 'corr': 'squar_exp', 'theta': [1e-6] * self.ndim,
+                           'noise': None}
+        sm = self.train(KRG(theta0=[1e-2] * self.ndim, hyperparameters=hyperparameters))
+        self.assertTrue(np.isfinite(sm.optimal_rlf_value))
+
+    def test_mfk_optim_var(self):
+        np.random.seed(2)
+        sm = MFK(theta0=[1e-1] * self.ndim, eval_noise=True, optim_var=True,
+                 print_global=False)
+        sm.set_training_values(self.xt, 0.8 * self.yt + 1. + 0.1 * np.random.randn(*self.yt.shape),
+                               name=0)
+        sm.set_training_values(self.xt[::3], self.yt[::3])
+        with Silence():
+            sm.train()
+
+        # the refit interpolates the predictions of the first training, reusing
+        # its distances between the training points
+        self.assertIsNone(sm.options['hyperparameters'])
+        self.assertFalse(sm.options['eval_noise'])
+        xt, yt = sm.training_points[None][0]
+        self.assert_error(sm.predict_values(xt), yt, atol=1e-6, rtol=1e-6)
+        self.assert_error(sm.D_all[0][0], l1_cross_distances(sm.X_norma_all[0])[0],
+                          atol=1e-15, rtol=1e-15)
+
+    def test_mfk_add_training_points(self):
+        sm = MFK(theta0=[1e-2] * self.ndim, print_global=False)
+        sm.set_training_values(self.xt, 0.8 * self.yt + 1., name=0)
+        sm.set_training_values(self.xt[::2], 0.9 * self.yt[::2] + 0.5, name=1)
+        sm.set_training_values(self.xt[::4], self.yt[::4])
+        with Silence():
+            sm.train()
+        theta = [t.copy() for t in sm.optimal_theta]
+
+        # the lower levels are kept, the levels from name on are updated
+        sm.add_training_points(self.xe[:3], 0.8 * self.ye[:3] + 1., name=0)
+        par0 = sm.optimal_par[0]
+        sm.add_training_points(self.xe[3:6], 0.9 * self.ye[3:6] + 0.5, name=1)
+        par1 = sm.optimal_par[1]
+        sm.add_training_points(self.xe[6:8], self.ye[6:8])
+        self.assertIs(sm.optimal_par[0], par0)
+        self.assertIs(sm.optimal_par[1], par1)
+        self.assertEqual(list(sm.nt_all), [43, 23, 12])
+        self.assert_error(sm.predict_values(self.xe[6:8]), self.ye[6:8], atol=1e-6, rtol=1e-6)
+        for lvl in range(3):
+            self.assert_error(sm.optimal_theta[lvl], theta[lvl], atol=1e-15, rtol=1e-15)
+
+        # same model as the one factorized from scratch with the same hyperparameters
+        sm0 = deepcopy(sm)
+        for lvl in range(3):
+            sm0.D_all[lvl] = l1_cross_distances(sm0.X_norma_all[lvl])
+            sm0._train_level(lvl, sm0.optimal_theta[lvl], optimize=False)
+        sm0._compute_prediction_terms()
+        for lvl in range(3):
+            for key in ['sigma2', 'beta', 'gamma', 'C', 'Ft', 'sigma2_rho']:
+                if key in sm0.optimal_par[lvl]:
+                    self.assert_error(sm.optimal_par[lvl][key], sm0.optimal_par[lvl][key],
+                                      atol=1e-10, rtol=1e-8)
+        self.assert_error(sm.predict_variances(self.xe), sm0.predict_variances(self.xe),
+                          atol=1e-10, rtol=1e-8)
+
+        with Silence():
+            sm.add_training_points(self.xe[8:10], self.ye[8:10], reoptimize=True)
+        self.assertIs(sm.optimal_par[0], par0)
+        self.assertIs(sm.optimal_par[1], par1)
+        self.assert_error(sm.predict_values(self.xe[8:10]), self.ye[8:10], atol=1e-6, rtol=1e-6)
+        self.assertRaises(ValueError, sm.add_training_points, self.xe[:1], self.ye[:1], name=2)
+
+        # the higher levels trained again after points of a lower level get the
+        # distances of all their points, including those added without them
+        sm.add_training_points(self.xe[10:12], self.ye[10:12])
+        sm.add_training_points(self.xe[12:15], 0.8 * self.ye[12:15] + 1., name=0)
+        self.assertEqual(list(sm.nt_all), [46, 23, 16])
+        self.assert_error(sm.D_all[2][0], l1_cross_distances(sm.X_norma_all[2])[0],
+                          atol=1e-15, rtol=1e-15)
+        self.assert_error(sm.predict_values(self.xe[8:12]), self.ye[8:12], atol=1e-6, rtol=1e-6)
+
+    def test_mfk_nested(self):
+        prob = TensorProduct(ndim=self.ndim, func='exp')
+        np.random.seed(0)
+        xt_lf, xt_hf = NestedLHS(nlevel=2, xlimits=prob.xlimits, criterion='m')(10)
+        self.assertEqual((xt_lf.shape, xt_hf.shape), ((20, self.ndim), (10, self.ndim)))
+        self.assertEqual(len(set(map(tuple, xt_hf))), 10)
+        self.assertTrue(set(map(tuple, xt_hf)) <= set(map(tuple, xt_lf)))
+
+        # two high fidelity points are not low fidelity points
+        xt_hf = np.vstack((xt_hf, self.xe[:2]))
+        for eval_noise in [False, True]:
+            np.random.seed(1)
+            sm = MFK(theta0=[1e-2] * self.ndim, eval_noise=eval_noise, print_global=False)
+            y_lf = 0.8 * prob(xt_lf) + 1. + 0.01 * eval_noise * np.random.randn(20, 1)
+            sm.set_training_values(xt_lf, y_lf, name=0)
+            sm.set_training_values(xt_hf, prob(xt_hf))
+            with Silence():
+                sm.train()
+
+            # exact responses of the level below at the nested points
+            X = sm.X_norma_all[1]
+            self.assert_error(sm._lower_level_values(X, 1),
+                              sm._predict_intermediate_values(X, 1, descale=False),
+                              atol=1e-8, rtol=1e-8)
+
+    def test_mixed_precision(self):
+        sm = self.train(KRG(theta0=[1e-2] * self.ndim, precision='mixed'))
+        self.assertEqual(sm.optimal_par['C'].dtype, np.double)
+        self.assert_error(compute_rms_error(sm, self.xe, self.ye), 0., 5e-2)
+
+        # the double precision polish reaches the likelihood of the double precision
+        # search, to which the single precision values are not compared
+        sm0 = self.train(KRG(theta0=[1e-2] * self.ndim))
+        self.assert_error(sm.optimal_rlf_value, sm0.optimal_rlf_value, atol=1e-8, rtol=1e-3)
+        self.assert_error(compute_rms_error(sm, self.xe, self.ye),
+                          compute_rms_error(sm0, self.xe, self.ye), atol=1e-8, rtol=5e-2)
+        self.setup_likelihood(sm)
+        rlf = sm._reduced_likelihood_function(sm._thetaMemory)[0]
+        self.assertEqual(sm.best_iteration_fail, rlf)
+
+        # the single precision likelihood only differs by the nugget and the rounding
+        self.setup_likelihood(sm)
+        theta = np.array([3., 2., 1.])
+        rlf = sm._reduced_likelihood_function(theta)[0]
+        sm._likelihood_dtype = np.single
+        rlf_single = sm._reduced_likelihood_function(theta)[0]
+        self.assert_error(rlf_single, rlf, atol=1e-8, rtol=1e-3)
+
+        sm = KRG(theta0=[1e-2] * self.ndim, precision='mixed', low_memory=True)
+        self.assertRaises(ValueError, self.train, sm)
+
+    def test_ge_compute_pls(self):
+        from pyDOE import bbdesign
+        from sklearn.cross_decomposition import PLSRegression
+
+        np.random.seed(0)
+        grad = np.random.randn(self.xt.shape[0], self.ndim)
+        grad[3] = 0.
+        pts = {None: {0: [self.xt, self.yt]}}
+        for kx in range(self.ndim):
+            pts[None][kx + 1] = [self.xt, grad[:, [kx]]]
+        xlimits = np.array([[-1., 1.]] * self.ndim)
+        coeff_pls, XX, yy = ge_compute_pls(self.xt, self.yt, 2, pts, 1e-4, xlimits, 1)
+
+        # PLS regression of each training point on its local design
+        step = 1e-4 * (xlimits[:, 1] - xlimits[:, 0]) * bbdesign(self.ndim, center=1)
+        coeff_pls0 = np.zeros((self.xt.shape[0], self.ndim, 2))
+        for i in range(self.xt.shape[0]):
+            pls = PLSRegression(2).fit(self.xt[i] + step, self.yt[i] + step.dot(grad[i]))
+            coeff_pls0[i] = pls.x_rotations_
+        self.assert_error(coeff_pls, np.abs(coeff_pls0).mean(axis=0), atol=1e-12, rtol=1e-10)
+
+        kx = np.argsort(np.abs(coeff_pls0[:, :, 0]), axis=1)[:, -1]
+        self.assert_error(XX - self.xt, 2e-4 * np.eye(self.ndim)[kx], atol=1e-15)
+        self.assert_error(yy[:, 0] - self.yt[:, 0], 2e-4 * grad[np.arange(self.xt.shape[0]), kx],
+                          atol=1e-15)
+
+    def test_ge_compute_pls_low_dim(self):
+        from sklearn.cross_decomposition import PLSRegression
+
+        # Below 3 dimensions the local design is the 3-level full-factorial design
+        for ndim in [1, 2]:
+            np.random.seed(ndim)
+            xt = np.random.rand(10, ndim)
+            yt = np.random.rand(10, 1)
+            grad = np.random.randn(10, ndim)
+            pts = {None: {0: [xt, yt]}}
+            for kx in range(ndim):
+                pts[None][kx + 1] = [xt, grad[:, [kx]]]
+            xlimits = np.array([[0., 2.]] * ndim)
+            coeff_pls, XX, yy = ge_compute_pls(xt, yt, 1, pts, 1e-2, xlimits, 1)
+
+            step = 2e-2 * (FullFactorial(xlimits=np.array([[-1., 1.]] * ndim))(3 ** ndim))
+            coeff_pls0 = np.zeros((10, ndim, 1))
+            for i in range(10):
+                pls = PLSRegression(1).fit(xt[i] + step, yt[i] + step.dot(grad[i]))
+                coeff_pls0[i] = pls.x_rotations_
+            self.assert_error(coeff_pls, np.abs(coeff_pls0).mean(axis=0), atol=1e-12, rtol=1e-10)
+
+            kx = np.argmax(np.abs(coeff_pls0[:, :, 0]), axis=1)
+            self.assert_error(XX - xt, 2e-2 * np.eye(ndim)[kx], atol=1e-15)
+
+        sm = GEKPLS(theta0=[1e-2], n_comp=1, xlimits=np.array([[-1., 1.]]), extra_points=1,
+                    print_global=False)
+        xt = np.linspace(-1., 1., 5).reshape((-1, 1))
+        sm.set_training_values(xt, xt ** 2)
+        sm.set_training_derivatives(xt, 2 * xt, 0)
+        with Silence():
+            sm.train()
+        self.assertEqual(sm.nt, 10)
+        self.assert_error(sm.predict_values(xt), xt ** 2, atol=1e-6, rtol=1e-6)
+
+    def test_hyper_opt_lbfgsb(self):
+        for sm0 in [KRG(theta0=[1e-2] * self.ndim), KPLSK(theta0=[1e-2], n_comp=1)]:
+            sm = sm0.__class__()
+            sm.options = sm0.options.clone()
+            self.train(sm0)
+
+            sm.options['hyper_opt'] = 'L-BFGS-B'
+            self.train(sm)
+
+            self.assertGreater(sm.optimal_rlf_value, sm0.optimal_rlf_value * (1. + 1e-3))
+            self.assert_error(compute_rms_error(sm, self.xe, self.ye), 0., 5e-2)
+
+    def test_multistart(self):
+        sm0 = self.train(KRG(theta0=[1e-2] * self.ndim))
+        sms = []
+        for n_jobs in [1, 1, 2]:
+            np.random.seed(len(sms))
+            sm = self.train(KRG(theta0=[1e-2] * self.ndim, n_start=3, n_jobs=n_jobs))
+
+            self.assertGreaterEqual(sm.optimal_rlf_value, sm0.optimal_rlf_value)
+            self.assert_error(compute_rms_error(sm, self.xe, self.ye), 0., 5e-2)
+            sms.append(sm)
+
+        # the starting points only depend on the seed option
+        for sm in sms[1:]:
+            self.assertTrue(np.array_equal(sm.optimal_theta, sms[0].optimal_theta))
+
+        for n_start, n_jobs in [(0, 1), (3, 0), (3, -2)]:
+            sm = KRG(theta0=[1e-2] * self.ndim, n_start=n_start, n_jobs=n_jobs)
+            self.assertRaises(ValueError, self.train, sm)
+
+
+if __name__ == '__main__':
+    unittest.main()
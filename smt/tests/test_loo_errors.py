@@ -0,0 +1,81 @@
+'''
+This package is distributed under New BSD license.
+'''
+
+from __future__ import print_function, division
+import numpy as np
+import unittest
+
+from smt.problems import TensorProduct
+from smt.sampling_methods import LHS
+from smt.utils.sm_test_case import SMTestCase
+from smt.utils.silence import Silence
+from smt.surrogate_models import LS, QP
+try:
+    from smt.surrogate_models import RBF, IDW
+    compiled_available = True
+except:
+    compiled_available = False
+
+
+class Test(SMTestCase):
+
+    def setUp(self):
+        ndim = 2
+        nt = 30
+
+        prob = TensorProduct(ndim=ndim, func='cos')
+        sampling = LHS(xlimits=prob.xlimits)
+
+        np.random.seed(0)
+        self.xt = sampling(nt)
+        self.yt = np.hstack([prob(self.xt), self.xt[:, [0]] ** 2])
+
+    def train(self, sm, xt, yt):
+        sm.options['print_global'] = False
+        sm.set_training_values(xt, yt)
+        with Silence():
+            sm.train()
+        return sm
+
+    def check_loo_errors(self, sm_class, **kwargs):
+        nt = self.xt.shape[0]
+        sm = self.train(sm_class(**kwargs), self.xt, self.yt)
+        errors = sm.compute_loo_errors()
+
+        errors_ref = np.zeros(self.yt.shape)
+        for i in range(nt):
+            mask = np.arange(nt) != i
+            sm_i = self.train(sm_class(**kwargs), self.xt[mask], self.yt[mask])
+            errors_ref[i] = self.yt[i] - sm_i.predict_values(self.xt[[i]]).reshape(-1)
+        self.assert_error(errors, errors_ref, atol=1e-9, rtol=1e-6)
+
+    def test_ls(self):
+        self.check_loo_errors(LS)
+
+    def test_qp(self):
+        self.check_loo_errors(QP)
+
+    def test_leverage_one(self):
+        # as many training points as coefficients: each point has leverage 1
+        for sm_class, nt in [(LS, 3), (QP, 6)]:
+            sm = self.train(sm_class(), self.xt[:nt], self.yt[:nt])
+            self.assertRaises(ValueError, sm.compute_loo_errors)
+
+    @unittest.skipIf(not compiled_available, 'Compiled Fortran libraries not available')
+    def test_rbf(self):
+        for poly_degree in [-1, 0, 1]:
+            self.check_loo_errors(RBF, d0=0.5, poly_degree=poly_degree)
+
+    @unittest.skipIf(not compiled_available, 'Compiled Fortran libraries not available')
+    def test_idw(self):
+        self.check_loo_errors(IDW, p=2.5)
+
+        xt = np.vstack([self.xt, self.xt[:1]])
+        yt = np.vstack([self.yt, self.yt[:1]])
+        sm = self.train(IDW(p=2.5), xt, yt)
+        self.assertRaises(ValueError, sm.compute_loo_errors)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -5,7 +5,7 @@ This package is distributed under New BSD license.
 '''
 
 import numpy as np
-from sklearn.cross_decomposition.pls_ import PLSRegression as pls
+from scipy.spatial import cKDTree
 from pyDOE import *
 
 def standardization(X,y,copy=False):
@@ -108,7 +108,77 @@ def l1_cross_distances(X):
     return D, ij.astype(np.int)
 
 
-def abs_exp(theta, d):
+def row_index(X, start=0):
+
+    """
+    Computes a hashed index of the rows of X, used to find in constant time
+    whether a point is one of the rows.
+
+    Parameters
+    ----------
+
+    X: np.ndarray [n_obs, dim]
+            - The input variables.
+
+    start: int
+            - The index of the first row.
+
+    Returns
+    -------
+
+    index: dict
+            - The index start + i of the i-th row of X, keyed by the bytes of
+              the row.
+    """
+
+    X = np.ascontiguousarray(X, dtype=np.double)
+    return dict((x.tobytes(), i) for i, x in enumerate(X, start))
+
+
+def exponential_correlation(theta, d, out=None, block_size=int(1e4)):
+
+    """
+    Computes the exponential correlation exp(-d.theta) of the weighted
+    componentwise distances by blocks of rows: the weighted sum of each block
+    is a BLAS matrix-vector product written into the output, and the
+    exponential is taken in place.
+
+    Parameters
+    ----------
+    theta : list[ncomp]
+        the autocorrelation parameter(s).
+
+    d: np.ndarray[n_obs * (n_obs - 1) / 2, n_comp]
+        The componentwise distances, squared for the squared exponential
+        correlation.
+
+    out: np.ndarray[n_obs * (n_obs - 1) / 2, 1], optional
+        C-contiguous array in which the correlation is written; allocated if None.
+
+    block_size: int
+        Number of rows of d processed at once.
+
+    Returns
+    -------
+    r : np.ndarray[n_obs * (n_obs - 1) / 2, 1]
+        An array containing the values of the autocorrelation model.
+    """
+
+    theta = np.asarray(theta, dtype=float).reshape(-1)
+    if out is None:
+        out = np.empty((d.shape[0], 1))
+    r = out.reshape(-1)
+
+    for i in range(0, d.shape[0], block_size):
+        r_block = r[i:i + block_size]
+        np.dot(d[i:i + block_size], theta, out=r_block)
+        np.negative(r_block, out=r_block)
+        np.exp(r_block, out=r_block)
+
+    return out
+
+
+def abs_exp(theta, d, out=None, block_size=int(1e4)):
 
     """
     Absolute exponential autocorrelation model.
@@ -122,27 +192,22 @@ def abs_exp(theta, d):
     d: np.ndarray[n_obs * (n_obs - 1) / 2, n_comp]
         |d_i * coeff_pls_i| if PLS is used, |d_i| otherwise
 
+    out: np.ndarray[n_obs * (n_obs - 1) / 2, 1], optional
+        Array in which the correlation is written; allocated if None.
+
+    block_size: int
+        Number of rows of d processed at once.
+
     Returns
     -------
     r : np.ndarray[n_obs * (n_obs - 1) / 2,1]
         An array containing the values of the autocorrelation model.
     """
 
-    r = np.zeros((d.shape[0],1))
-    n_components = d.shape[1]
-
-    # Construct/split the correlation matrix
-    i,nb_limit  = 0,int(1e4)
-    while True:
-        if i * nb_limit > d.shape[0]:
-            return r
-        else:
-            r[i*nb_limit:(i+1)*nb_limit,0] = np.exp(-np.sum(theta.reshape(1,
-                    n_components) * d[i*nb_limit:(i+1)*nb_limit,:], axis=1))
-            i+=1
+    return exponential_correlation(theta, d, out, block_size)
 
 
-def squar_exp(theta, d):
+def squar_exp(theta, d, out=None, block_size=int(1e4)):
 
     """
     Squared exponential correlation model.
@@ -155,25 +220,99 @@ def squar_exp(theta, d):
     d: np.ndarray[n_obs * (n_obs - 1) / 2, n_comp]
         |d_i * coeff_pls_i| if PLS is used, |d_i| otherwise
 
+    out: np.ndarray[n_obs * (n_obs - 1) / 2, 1], optional
+        Array in which the correlation is written; allocated if None.
+
+    block_size: int
+        Number of rows of d processed at once.
+
     Returns
     -------
     r: np.ndarray[n_obs * (n_obs - 1) / 2,1]
         An array containing the values of the autocorrelation model.
     """
 
-    r = np.zeros((d.shape[0],1))
-    n_components = d.shape[1]
+    return exponential_correlation(theta, d, out, block_size)
 
-    # Construct/split the correlation matrix
-    i,nb_limit  = 0,int(1e4)
 
-    while True:
-        if i * nb_limit > d.shape[0]:
-            return r
-        else:
-            r[i*nb_limit:(i+1)*nb_limit,0] = np.exp(-np.sum(theta.reshape(1,
-                    n_components) * d[i*nb_limit:(i+1)*nb_limit,:], axis=1))
-            i+=1
+def wendland_c2(theta, d, out=None, block_size=int(1e4)):
+
+    """
+    Compactly supported correlation model, product of the C2 Wendland
+    functions (1 - t)_+^3 (3t + 1) of the weighted componentwise distances.
+
+    Parameters
+    ----------
+    theta : list[ncomp]
+        the autocorrelation parameter(s): the correlation vanishes when
+        theta_i * d_i >= 1 for any i.
+
+    d: np.ndarray[n_obs * (n_obs - 1) / 2, n_comp]
+        |d_i * coeff_pls_i| if PLS is used, |d_i| otherwise
+
+    out: np.ndarray[n_obs * (n_obs - 1) / 2, 1], optional
+        Array in which the correlation is written; allocated if None.
+
+    block_size: int
+        Number of rows of d processed at once.
+
+    Returns
+    -------
+    r: np.ndarray[n_obs * (n_obs - 1) / 2,1]
+        An array containing the values of the autocorrelation model.
+    """
+
+    theta = np.asarray(theta, dtype=float).reshape(1, -1)
+    if out is None:
+        out = np.empty((d.shape[0], 1))
+    r = out.reshape(-1)
+
+    for i in range(0, d.shape[0], block_size):
+        t = np.minimum(theta * d[i:i + block_size], 1.)
+        np.prod((1. - t) ** 3 * (3. * t + 1.), axis=1, out=r[i:i + block_size])
+
+    return out
+
+
+def wendland_c4(theta, d, out=None, block_size=int(1e4)):
+
+    """
+    Compactly supported correlation model, product of the C4 Wendland
+    functions (1 - t)_+^5 (8t^2 + 5t + 1) of the weighted componentwise
+    distances.
+
+    Parameters
+    ----------
+    theta : list[ncomp]
+        the autocorrelation parameter(s): the correlation vanishes when
+        theta_i * d_i >= 1 for any i.
+
+    d: np.ndarray[n_obs * (n_obs - 1) / 2, n_comp]
+        |d_i * coeff_pls_i| if PLS is used, |d_i| otherwise
+
+    out: np.ndarray[n_obs * (n_obs - 1) / 2, 1], optional
+        Array in which the correlation is written; allocated if None.
+
+    block_size: int
+        Number of rows of d processed at once.
+
+    Returns
+    -------
+    r: np.ndarray[n_obs * (n_obs - 1) / 2,1]
+        An array containing the values of the autocorrelation model.
+    """
+
+    theta = np.asarray(theta, dtype=float).reshape(1, -1)
+    if out is None:
+        out = np.empty((d.shape[0], 1))
+    r = out.reshape(-1)
+
+    for i in range(0, d.shape[0], block_size):
+        t = np.minimum(theta * d[i:i + block_size], 1.)
+        np.prod((1. - t) ** 5 * ((8. * t + 5.) * t + 1.), axis=1,
+                out=r[i:i + block_size])
+
+    return out
 
 
 def ge_compute_pls(X,y,n_comp,pts,delta_x,xlimits,extra_points):
@@ -181,6 +320,14 @@ def ge_compute_pls(X,y,n_comp,pts,delta_x,xlimits,extra_points):
     """
     Gradient-enhanced PLS-coefficients.
 
+    The PLS regression of each training point is fitted on a local design
+    (Box-Behnken design for dim >= 3, 3-level full-factorial design otherwise)
+    around the point, with the outputs given by the first-order Taylor
+    approximation (FOTA). Once centered and scaled as by PLSRegression, the
+    local design is the same for all the training points, so that the NIPALS
+    algorithm is run for all of them at once in O(nt dim^2 n_comp) operations,
+    independently of the size of the local design.
+
     Parameters
     ----------
 
@@ -219,82 +366,67 @@ def ge_compute_pls(X,y,n_comp,pts,delta_x,xlimits,extra_points):
 
     """
     nt,dim = X.shape
+    eps = np.finfo(np.double).eps
+    step = delta_x*(xlimits[:,1]-xlimits[:,0])
+    grad = np.hstack([pts[None][j][1] for j in range(1,dim+1)])
+
+    if dim >= 3:
+        design = bbdesign(int(dim),center=1)
+    else:
+        design = fullfact([3]*dim) - 1.
+
+    # Centered and scaled local design X_s, and centered local outputs X_s b_i
+    design_std = design.std(axis=0,ddof=1)
+    X_s = (design - design.mean(axis=0)) / design_std
+    M = np.dot(X_s.T,X_s)
+    b = grad * step * design_std
+    y_std = np.sqrt((b.dot(M) * b).sum(axis=1) / (design.shape[0] - 1))
+    y_std[y_std == 0.] = 1.
+
+    # The deflated inputs and outputs of the i-th regression are X_s A_i and
+    # X_s c_i: NIPALS only needs the products with M = X_s^T X_s
+    A = np.tile(np.eye(dim),(nt,1,1))
+    c = b / y_std[:,np.newaxis]
+    W = np.zeros((nt,dim,n_comp))
+    P = np.zeros((nt,dim,n_comp))
+    active = np.ones(nt,dtype=bool)
+    for k in range(n_comp):
+        # Weights, once the outputs are constant the components vanish
+        Mc = c.dot(M)
+        c_norm = (Mc * c).sum(axis=1)
+        active &= c_norm >= eps
+        w = np.einsum('nji,nj->ni',A,Mc) / np.where(active,c_norm,1.)[:,np.newaxis]
+        w[(w ** 2).sum(axis=1) < eps] += eps
+        w /= np.sqrt((w ** 2).sum(axis=1))[:,np.newaxis] + eps
+
+        # Scores, loadings and deflation
+        Aw = np.einsum('nij,nj->ni',A,w)
+        MAw = Aw.dot(M)
+        t_norm = (Aw * MAw).sum(axis=1)
+        active &= t_norm >= eps
+        t_norm[~active] = 1.
+        p = np.einsum('nji,nj->ni',A,MAw) / t_norm[:,np.newaxis]
+        q = (c * MAw).sum(axis=1) / t_norm
+        A -= Aw[:,:,np.newaxis] * p[:,np.newaxis,:]
+        c -= Aw * q[:,np.newaxis]
+        W[active,:,k] = w[active]
+        P[active,:,k] = p[active]
+
+    # Rotations W (P^T W)^-1
+    coeff_pls = np.matmul(W,np.linalg.pinv(np.matmul(P.transpose(0,2,1),W)))
+
+    #Add additional points
     XX = np.empty(shape = (0,dim))
     yy = np.empty(shape = (0,1))
-    _pls = pls(n_comp)
-
-    coeff_pls = np.zeros((nt,dim,n_comp))
-    for i in range(nt):
-        if dim >= 3:
-            sign = np.roll(bbdesign(int(dim),center=1),1,axis=0)
-            _X = np.zeros((sign.shape[0],dim))
-            _y = np.zeros((sign.shape[0],1))
-            sign = sign * delta_x*(xlimits[:,1]-xlimits[:,0])
-            _X = X[i,:]+ sign
-            for j in range(1,dim+1):
-                sign[:,j-1] = sign[:,j-1]*pts[None][j][1][i,0]
-            _y = y[i,:]+ np.sum(sign,axis=1).reshape((sign.shape[0],1))
-        else:
-            _X = np.zeros((9,dim))
-            _y = np.zeros((9,1))
-            # center
-            _X[:,:] = X[i,:].copy()
-            _y[0,0] = y[i,0].copy()
-            # right
-            _X[1,0] +=delta_x*(xlimits[0,1]-xlimits[0,0])
-            _y[1,0] = _y[0,0].copy()+ pts[None][1][1][i,0]*delta_x*(
-                xlimits[0,1]-xlimits[0,0])
-            # up
-            _X[2,1] +=delta_x*(xlimits[1,1]-xlimits[1,0])
-            _y[2,0] = _y[0,0].copy()+ pts[None][2][1][i,0]*delta_x*(
-                xlimits[1,1]-xlimits[1,0])
-            # left
-            _X[3,0] -=delta_x*(xlimits[0,1]-xlimits[0,0])
-            _y[3,0] = _y[0,0].copy()- pts[None][1][1][i,0]*delta_x*(
-                xlimits[0,1]-xlimits[0,0])
-            # down
-            _X[4,1] -=delta_x*(xlimits[1,1]-xlimits[1,0])
-            _y[4,0] = _y[0,0].copy()-pts[None][2][1][i,0]*delta_x*(
-                xlimits[1,1]-xlimits[1,0])
-            # right up
-            _X[5,0] +=delta_x*(xlimits[0,1]-xlimits[0,0])
-            _X[5,1] +=delta_x*(xlimits[1,1]-xlimits[1,0])
-            _y[5,0] = _y[0,0].copy()+ pts[None][1][1][i,0]*delta_x*(
-                xlimits[0,1]-xlimits[0,0])+pts[None][2][1][i,0]*delta_x*(
-                xlimits[1,1]-xlimits[1,0])
-            # left up
-            _X[6,0] -=delta_x*(xlimits[0,1]-xlimits[0,0])
-            _X[6,1] +=delta_x*(xlimits[1,1]-xlimits[1,0])
-            _y[6,0] = _y[0,0].copy()- pts[None][1][1][i,0]*delta_x*(
-                xlimits[0,1]-xlimits[0,0])+pts[None][2][1][i,0]*delta_x*(
-                xlimits[1,1]-xlimits[1,0])
-            # left down
-            _X[7,0] -=delta_x*(xlimits[0,1]-xlimits[0,0])
-            _X[7,1] -=delta_x*(xlimits[1,1]-xlimits[1,0])
-            _y[7,0] = _y[0,0].copy()- pts[None][1][1][i,0]*delta_x*(
-                xlimits[0,1]-xlimits[0,0])-pts[None][2][1][i,0]*delta_x*(
-                xlimits[1,1]-xlimits[1,0])
-            # right down
-            _X[3,0] +=delta_x*(xlimits[0,1]-xlimits[0,0])
-            _X[3,1] -=delta_x*(xlimits[1,1]-xlimits[1,0])
-            _y[3,0] = _y[0,0].copy()+ pts[None][1][1][i,0]*delta_x*(
-                xlimits[0,1]-xlimits[0,0])-pts[None][2][1][i,0]*delta_x*(
-                xlimits[1,1]-xlimits[1,0])
-
-        _pls.fit(_X.copy(),_y.copy())
-        coeff_pls[i,:,:] = _pls.x_rotations_
-        #Add additional points
-        if extra_points != 0:
-            max_coeff = np.argsort(np.abs(coeff_pls[i,:,0]))[-extra_points:]
-            for ii in max_coeff:
-                XX = np.vstack((XX,X[i,:]))
-                XX[-1,ii] += delta_x*(xlimits[ii,1]-xlimits[ii,0])
-                yy = np.vstack((yy,y[i,0]))
-                yy[-1,0] += pts[None][1+ii][1][i,0]*delta_x*(
-                    xlimits[ii,1]-xlimits[ii,0])
+    if extra_points != 0:
+        max_coeff = np.argsort(np.abs(coeff_pls[:,:,0]),axis=1)[:,-extra_points:].ravel()
+        i = np.repeat(np.arange(nt),extra_points)
+        XX = X[i]
+        XX[np.arange(i.shape[0]),max_coeff] += step[max_coeff]
+        yy = (y[i,0] + grad[i,max_coeff]*step[max_coeff]).reshape((-1,1))
     return np.abs(coeff_pls).mean(axis=0), XX, yy
 
-def componentwise_distance(D,corr,dim):
+def componentwise_distance(D,corr,dim,block_size=int(1e4)):
 
     """
     Computes the nonzero componentwise cross-spatial-correlation-distance
@@ -313,6 +445,9 @@ def componentwise_distance(D,corr,dim):
     dim: int
             - Number of dimension.
 
+    block_size: int
+            - Number of rows of D processed at once.
+
     Returns
     -------
 
@@ -321,26 +456,15 @@ def componentwise_distance(D,corr,dim):
               vectors in X.
 
     """
-    # Fit the matrix iteratively: avoid some memory troubles .
-    limit=int(1e4)
+    func = _componentwise_function(corr)
 
-    D_corr = np.zeros((D.shape[0],dim))
-    i,nb_limit  = 0,int(limit)
+    D_corr = np.empty((D.shape[0],dim))
+    for i in range(0, D.shape[0], block_size):
+        func(D[i:i + block_size], out=D_corr[i:i + block_size])
 
-    while True:
-        if i * nb_limit > D_corr.shape[0]:
-            return D_corr
-        else:
-            if corr == 'squar_exp':
-                D_corr[i*nb_limit:(i+1)*nb_limit,:] = D[i*nb_limit:(i+1)*
-                                                      nb_limit,:]**2
-            else:
-                # abs_exp
-                D_corr[i*nb_limit:(i+1)*nb_limit,:] = np.abs(D[i*nb_limit:
-                                                    (i+1)*nb_limit,:])
-            i+=1
+    return D_corr
 
-def componentwise_distance_PLS(D,corr,n_comp,coeff_pls):
+def componentwise_distance_PLS(D,corr,n_comp,coeff_pls,block_size=int(1e4)):
 
     """
     Computes the nonzero componentwise cross-spatial-correlation-distance
@@ -362,6 +486,9 @@ def componentwise_distance_PLS(D,corr,n_comp,coeff_pls):
     coeff_pls: np.ndarray [dim, n_comp]
             - The PLS-coefficients.
 
+    block_size: int
+            - Number of rows of D processed at once.
+
     Returns
     -------
 
@@ -370,21 +497,280 @@ def componentwise_distance_PLS(D,corr,n_comp,coeff_pls):
               vectors in X.
 
     """
-    # Fit the matrix iteratively: avoid some memory troubles .
-    limit=int(1e4)
-
-    D_corr = np.zeros((D.shape[0],n_comp))
-    i,nb_limit  = 0,int(limit)
-
-    while True:
-        if i * nb_limit > D_corr.shape[0]:
-            return D_corr
-        else:
-            if corr == 'squar_exp':
-                D_corr[i*nb_limit:(i+1)*nb_limit,:] = np.dot(D[i*nb_limit:
-                                (i+1)*nb_limit,:]** 2,coeff_pls**2)
-            else:
-                # abs_exp
-                D_corr[i*nb_limit:(i+1)*nb_limit,:] = np.dot(np.abs(D[i*
-                                nb_limit:(i+1)*nb_limit,:]),np.abs(coeff_pls))
-            i+=1
+    func = _componentwise_function(corr)
+    coeff = func(coeff_pls)
+
+    # The componentwise distances of a block are projected on the PLS
+    # components through a buffer reused between the blocks
+    D_corr = np.empty((D.shape[0],n_comp))
+    buf = np.empty((min(block_size, D.shape[0]), D.shape[1]))
+    for i in range(0, D.shape[0], block_size):
+        D_block = buf[:min(block_size, D.shape[0] - i)]
+        func(D[i:i + block_size], out=D_block)
+        np.dot(D_block, coeff, out=D_corr[i:i + block_size])
+
+    return D_corr
+
+def _componentwise_function(corr):
+
+    """
+    Returns the function applied to the componentwise differences by the
+    correlation function corr (squar_exp or abs_exp).
+    """
+    if corr == 'squar_exp':
+        return np.square
+    else:
+        # abs_exp
+        return np.abs
+
+def lower_correlation_matrix(X, weights, corr, diag, block_size=int(2**17)):
+
+    """
+    Computes the lower triangle of the correlation matrix of the vectors in X
+    by blocks of columns, without storing the cross-distances.
+
+    Parameters
+    ----------
+
+    X: np.ndarray [n_obs, dim]
+            - The input variables.
+
+    weights: np.ndarray [dim]
+            - The weights of the componentwise distances of the input
+              variables, the correlation being
+              exp(- sum_l weights_l * |d_l| (or d_l**2 for squar_exp)).
+
+    corr: str
+            - Name of the correlation function used.
+              squar_exp or abs_exp.
+
+    diag: real
+            - The value of the diagonal terms (1 + nugget + noise).
+
+    block_size: int
+            - The maximum number of terms of R computed at once.
+
+    Returns
+    -------
+
+    R: np.ndarray [n_obs, n_obs]
+            - The Fortran-ordered correlation matrix, only the lower triangle
+              of which is set.
+    """
+    n_samples, n_features = X.shape
+    func = _componentwise_function(corr)
+
+    R = np.empty((n_samples, n_samples), order='F')
+    tmp = np.empty(block_size)
+    nb_cols = max(1, block_size // n_samples)
+    for j0 in range(0, n_samples, nb_cols):
+        j1 = min(j0 + nb_cols, n_samples)
+        R_blk = R[j0:, j0:j1]
+        R_blk[:] = 0.
+        d = tmp[:R_blk.size].reshape(R_blk.shape)
+        for l in range(n_features):
+            np.subtract.outer(X[j0:, l], X[j0:j1, l], out=d)
+            func(d, out=d)
+            d *= weights[l]
+            R_blk -= d
+        np.exp(R_blk, out=R_blk)
+    R[np.arange(n_samples), np.arange(n_samples)] = diag
+
+    return R
+
+def cross_correlation_matrix(X, Y, weights, corr):
+
+    """
+    Computes the correlation matrix between the vectors in X and the vectors
+    in Y, without storing the componentwise cross-distances.
+
+    Parameters
+    ----------
+
+    X: np.ndarray [n_obs_X, dim]
+            - The first input variables.
+
+    Y: np.ndarray [n_obs_Y, dim]
+            - The second input variables.
+
+    weights: np.ndarray [dim]
+            - The weights of the componentwise distances of the input
+              variables (see lower_correlation_matrix).
+
+    corr: str
+            - Name of the correlation function used.
+              squar_exp or abs_exp.
+
+    Returns
+    -------
+
+    R: np.ndarray [n_obs_X, n_obs_Y]
+            - The correlation matrix between X and Y.
+    """
+    func = _componentwise_function(corr)
+
+    R = np.zeros((X.shape[0], Y.shape[0]))
+    d = np.empty(R.shape)
+    for l in range(X.shape[1]):
+        np.subtract.outer(X[:, l], Y[:, l], out=d)
+        func(d, out=d)
+        d *= weights[l]
+        R -= d
+    np.exp(R, out=R)
+
+    return R
+
+def correlation_pair_sums(X, weights, corr, A_list, block_size=int(2**17)):
+
+    """
+    Computes, for each input variable l and each symmetric matrix A, the sum
+    over the pairs i > j of A_ij * R_ij * |d_ijl| (or d_ijl**2 for squar_exp),
+    by blocks of columns and without storing the cross-distances.
+
+    Parameters
+    ----------
+
+    X: np.ndarray [n_obs, dim]
+            - The input variables.
+
+    weights: np.ndarray [dim]
+            - The weights of the componentwise distances of the input
+              variables (see lower_correlation_matrix).
+
+    corr: str
+            - Name of the correlation function used.
+              squar_exp or abs_exp.
+
+    A_list: list(np.ndarray [n_obs, n_obs])
+            - The symmetric matrices weighting the pairs.
+
+    block_size: int
+            - The maximum number of terms of R computed at once.
+
+    Returns
+    -------
+
+    sums: np.ndarray [len(A_list), dim]
+            - The weighted sums over the pairs for each input variable.
+    """
+    n_samples, n_features = X.shape
+    func = _componentwise_function(corr)
+
+    sums = np.zeros((len(A_list), n_features))
+    nb_cols = max(1, block_size // n_samples)
+    for j0 in range(0, n_samples, nb_cols):
+        j1 = min(j0 + nb_cols, n_samples)
+        # Strictly lower part of the block of columns
+        mask = np.subtract.outer(np.arange(j0, n_samples), np.arange(j0, j1)) > 0
+        R_blk = np.zeros(mask.shape)
+        for l in range(n_features):
+            R_blk -= weights[l] * func(np.subtract.outer(X[j0:, l], X[j0:j1, l]))
+        np.exp(R_blk, out=R_blk)
+        R_blk *= mask
+        AR_blks = [A[j0:, j0:j1] * R_blk for A in A_list]
+        for l in range(n_features):
+            d = func(np.subtract.outer(X[j0:, l], X[j0:j1, l]))
+            for k, AR_blk in enumerate(AR_blks):
+                sums[k, l] += np.vdot(AR_blk, d)
+
+    return sums
+
+def compact_correlation_pairs(X, weights, Y=None):
+
+    """
+    Finds with KD-trees the pairs of vectors whose weighted componentwise
+    distances are all lower than 1, i.e. the pairs out of which the compactly
+    supported correlation functions vanish, without computing all the
+    cross-distances.
+
+    Parameters
+    ----------
+
+    X: np.ndarray [n_obs_X, dim]
+            - The first input variables.
+
+    weights: np.ndarray [dim]
+            - The inverse of the support radius of each input variable.
+
+    Y: np.ndarray [n_obs_Y, dim] or None
+            - The second input variables. The pairs of distinct vectors of X
+              are searched if None.
+
+    Returns
+    -------
+
+    ij: np.ndarray [n_pairs, 2]
+            - The indices i in X and j in Y (or in X, with i < j) of the pairs.
+    """
+    tree = cKDTree(X * weights)
+    if Y is None:
+        ij = tree.query_pairs(1., p=np.inf, output_type='ndarray')
+        return ij.reshape(-1, 2).astype(int)
+
+    neighbors = tree.query_ball_tree(cKDTree(Y * weights), 1., p=np.inf)
+    ij = np.empty((sum(len(j) for j in neighbors), 2), dtype=int)
+    ij[:, 0] = np.repeat(np.arange(X.shape[0]), [len(j) for j in neighbors])
+    ij[:, 1] = [j for j_list in neighbors for j in j_list]
+
+    return ij
+
+def kronecker_product_dot(matrices, v):
+
+    """
+    Computes the product of the Kronecker product A_1 x ... x A_d of the given
+    matrices with v, applying one factor at a time along its axis of v seen
+    as a tensor, in O(N sum_k m_k) operations for N rows of v.
+
+    Parameters
+    ----------
+
+    matrices: list(np.ndarray [m_k, n_k])
+            - The factors A_k of the Kronecker product, the index of the
+              first one varying the slowest.
+
+    v: np.ndarray [n_1 * ... * n_d, n_cols]
+            - The matrix to multiply.
+
+    Returns
+    -------
+
+    w: np.ndarray [m_1 * ... * m_d, n_cols]
+            - The product (A_1 x ... x A_d) v.
+    """
+    w = v.reshape(tuple(A.shape[1] for A in matrices) + (v.shape[1],))
+    for k, A in enumerate(matrices):
+        w = np.moveaxis(np.tensordot(A, w, axes=(1, k)), 0, k)
+
+    return w.reshape(-1, v.shape[1])
+
+def kronecker_rows_dot(vectors, v):
+
+    """
+    Computes the products with v of the Kronecker products of the rows of
+    the given matrices: the i-th row of the result is
+    (a_1[i] x ... x a_d[i]) v. The first factor is contracted first, so that
+    O(n N) operations and O(n N / n_1) memory are used for n rows of the
+    factors and N rows of v.
+
+    Parameters
+    ----------
+
+    vectors: list(np.ndarray [n, n_k])
+            - The factors a_k of the Kronecker products, the index of the
+              first one varying the slowest.
+
+    v: np.ndarray [n_1 * ... * n_d, n_cols]
+            - The matrix to multiply.
+
+    Returns
+    -------
+
+    w: np.ndarray [n, n_cols]
+            - The products of the Kronecker products of the rows with v.
+    """
+    w = v.reshape(tuple(a.shape[1] for a in vectors) + (v.shape[1],))
+    w = np.tensordot(vectors[0], w, axes=(1, 0))
+    for a in vectors[1:]:
+        w = np.einsum('ij...,ij->i...', w, a)
+
+    return w
@@ -58,6 +58,7 @@ class OptionsDictionary(object):
         1. If values and not types was given when declaring, value must be in values.
         2. If types and not values was given when declaring, type(value) must be in types.
         3. If values and types were given when declaring, either of the above must be true.
+        An option declared with a None default can also be set back to None.
 
         Arguments
         ---------
@@ -67,7 +68,8 @@ class OptionsDictionary(object):
             The value to set.
         """
         assert name in self._declared_entries, 'Option %s has not been declared' % name
-        self._assert_valid(name, value)
+        if value is not None or self._declared_entries[name]['default'] is not None:
+            self._assert_valid(name, value)
         self._dict[name] = value
 
     def __contains__(self, key):